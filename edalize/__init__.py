@@ -2,18 +2,61 @@
 # Licensed under the 2-Clause BSD License, see LICENSE for details.
 # SPDX-License-Identifier: BSD-2-Clause
 
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
 from importlib import import_module
 from os.path import dirname
 from pkgutil import walk_packages
 
+logger = logging.getLogger(__name__)
+
 NON_TOOL_PACKAGES = [
+    'edatool',
     'vunit_hooks',
     'reporting',
     'ise_reporting',
     'vivado_reporting',
     'quartus_reporting',
+    'sweep',
+    'trace',
+    'artifact_cache',
+    'build_graph',
+    'jobserver',
+    'server',
+    'version_probe',
+    'edam',
+    'history',
+    'batch',
+    'licenses',
+    'process',
 ]
 
+def get_cache_dir(name):
+    """ Get a directory for persistent edalize caches
+
+    The caches live in $EDALIZE_CACHE_DIR, or in $XDG_CACHE_HOME/edalize
+    (~/.cache/edalize) if unset. Setting EDALIZE_CACHE_DIR to an empty
+    string disables persistent caches. Returns None if the directory is
+    disabled or can't be created.
+    """
+    root = os.environ.get('EDALIZE_CACHE_DIR')
+    if root is None:
+        xdg_cache_home = os.environ.get('XDG_CACHE_HOME') or \
+            os.path.join(os.path.expanduser('~'), '.cache')
+        root = os.path.join(xdg_cache_home, 'edalize')
+    if not root:
+        return None
+    path = os.path.join(root, name)
+    try:
+        os.makedirs(path, exist_ok=True)
+    except OSError:
+        logger.debug("Unable to create cache directory " + path)
+        return None
+    return path
+
 def get_edatool(name):
     return getattr(import_module('{}.{}'.format(__name__, name)),
                    name.capitalize())
@@ -25,3 +68,75 @@ def walk_tool_packages():
 
 def get_edatools():
     return [get_edatool(pkg) for pkg in walk_tool_packages()]
+
+_tool_registry = None
+
+def _tool_registry_key():
+    # Any change to the installed edalize sources invalidates the registry
+    h = hashlib.sha256(dirname(__file__).encode('utf-8'))
+    for f in sorted(os.listdir(dirname(__file__))):
+        if f.endswith('.py'):
+            st = os.stat(os.path.join(dirname(__file__), f))
+            h.update('{} {} {}\n'.format(f, st.st_size, st.st_mtime_ns).encode('utf-8'))
+    return h.hexdigest()
+
+def _build_tool_registry():
+    registry = OrderedDict()
+    for pkg in walk_tool_packages():
+        try:
+            tool = get_edatool(pkg)
+            doc = tool.get_doc(0)
+        except Exception as e:
+            logger.warning("Unable to load backend '{}': {}".format(pkg, e))
+            continue
+        registry[pkg] = {'module' : tool.__module__,
+                         'class'  : tool.__name__,
+                         'doc'    : doc}
+    return registry
+
+def get_tool_registry():
+    """ Get metadata for all tool backends without importing them
+
+    Returns an ordered dict keyed on tool name. Each entry contains the
+    module and class name of the backend and the output of get_doc(0).
+    The registry is built once by importing all backends and is then
+    cached on disk until the installed edalize sources change.
+    """
+    global _tool_registry
+    if _tool_registry is not None:
+        return _tool_registry
+
+    key = _tool_registry_key()
+    cache_dir = get_cache_dir('registry')
+    cache_file = os.path.join(cache_dir, 'tools.json') if cache_dir else None
+    if cache_file:
+        try:
+            with open(cache_file) as f:
+                cached = json.load(f)
+            if cached.get('key') == key:
+                _tool_registry = OrderedDict(cached['tools'])
+                return _tool_registry
+        except (IOError, OSError, ValueError):
+            pass
+
+    _tool_registry = _build_tool_registry()
+    if cache_file:
+        try:
+            _tmp = cache_file + '.{}.tmp'.format(os.getpid())
+            with open(_tmp, 'w') as f:
+                json.dump({'key'   : key,
+                           'tools' : list(_tool_registry.items())}, f)
+            os.replace(_tmp, cache_file)
+        except (IOError, OSError):
+            logger.debug("Unable to store tool registry in " + cache_dir)
+    return _tool_registry
+
+def get_tool_names():
+    """ Get the names of all available tool backends """
+    return list(get_tool_registry().keys())
+
+def get_tool_doc(name, api_ver=0):
+    """ Get the get_doc output of a tool backend without importing it """
+    if api_ver == 0 and name in get_tool_registry():
+        return get_tool_registry()[name]['doc']
+    return get_edatool(name).get_doc(api_ver)
@@ -1,6 +1,6 @@
 import os.path
 
-from edalize.edatool import Edatool
+from edalize.edatool import Edatool, NEXTPNR_PROGRESS_PATTERNS
 from edalize.yosys import Yosys
 from importlib import import_module
 
@@ -8,6 +8,8 @@ class Apicula(Edatool):
 
     argtypes = ['vlogdefine', 'vlogparam']
 
+    progress_patterns = NEXTPNR_PROGRESS_PATTERNS
+
     @classmethod
     def get_doc(cls, api_ver):
         if api_ver == 0:
@@ -39,9 +41,7 @@ class Apicula(Edatool):
                     'members' : combined_members,
                     'lists' : combined_lists}
 
-    def configure_main(self):
-        # Write yosys script file
-        (src_files, incdirs) = self._get_fileset_files()
+    def _yosys(self):
         yosys_synth_options =  self.tool_options.get('yosys_synth_options',[])
         yosys_synth_options = ["-json " + self.name +".json"  + " " ] + yosys_synth_options  #Need to add -json after synth_gowin 
         yosys_edam = {
@@ -57,21 +57,22 @@ class Apicula(Edatool):
                                 }
                 }
 
-        yosys = getattr(import_module("edalize.yosys"), 'Yosys')(yosys_edam, self.work_root)
-        yosys.configure()
+        return getattr(import_module("edalize.yosys"), 'Yosys')(yosys_edam, self.work_root)
 
-        cst_files = []
-        for f in src_files:
-            if f.file_type == 'CST':
-                cst_files.append(f.name)
-                pass
-
-        if not cst_files:
-            cst_files = ['empty.cst']
-            with open(os.path.join(self.work_root, cst_files[0]), 'a'):
-                os.utime(os.path.join(self.work_root, cst_files[0]), None)
-        elif len(cst_files) > 1:
+    def _cst_file(self):
+        cst_files = [f.name for f in self.fileset.files_of_type('CST')]
+        if len(cst_files) > 1:
             raise RuntimeError("Apicula backend supports only one CST file. Found {}".format(', '.join(cst_files)))
+        return cst_files[0] if cst_files else 'empty.cst'
+
+    def configure_main(self):
+        # Write yosys script file
+        self._configure_subtool(self._yosys())
+
+        cst_file = self._cst_file()
+        if cst_file == 'empty.cst':
+            with open(os.path.join(self.work_root, cst_file), 'a'):
+                os.utime(os.path.join(self.work_root, cst_file), None)
 
         # Write Makefile
         nextpnr_options     = self.tool_options.get('nextpnr_options', [])
@@ -82,10 +83,26 @@ class Apicula(Edatool):
         		
         template_vars = {
             'name'                : self.name,
-            'cst_file'            : cst_files[0],
+            'cst_file'            : cst_file,
             'nextpnr_options'     : nextpnr_options,
             'device'		  : device,	
         }
-        self.render_template('apicula-makefile.j2',
-                             'Makefile',
-                             template_vars)
+        self._write_graph_makefile(self._render('apicula-makefile.j2', template_vars))
+
+    def build_graph(self):
+        graph = self._yosys().build_graph()
+        cst_file = self._cst_file()
+        device = self.tool_options.get('device', '')
+        graph.add('pnr',
+                  ['nextpnr-gowin', '-l', 'next.log', '--device', device] +
+                  self.tool_options.get('nextpnr_options', []) +
+                  ['--cst', cst_file, '--json', self.name + '.json', '--write', self.name + '.pack'],
+                  inputs = [cst_file, self.name + '.json'],
+                  outputs = [self.name + '.pack'],
+                  description = 'Place and route with nextpnr')
+        graph.add('bitstream',
+                  ['gowin_pack', '-d', device, '-o', self.name + '.fs', self.name + '.pack'],
+                  inputs = [self.name + '.pack'],
+                  outputs = [self.name + '.fs'],
+                  description = 'Generating bitstream')
+        return graph
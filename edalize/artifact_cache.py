@@ -0,0 +1,168 @@
+# Copyright edalize contributors
+# Licensed under the 2-Clause BSD License, see LICENSE for details.
+# SPDX-License-Identifier: BSD-2-Clause
+
+""" Content-addressed cache for build artifacts
+
+Backends that list their build outputs in build_artifacts() store them here
+after a successful build, keyed by a hash of everything that affects the
+build: the contents of the source files, the parameters, the tool options
+and the tool version. A later build with the same key, in any work root,
+restores the outputs instead of running the tools.
+
+The cache is disabled by default. Setting the EDALIZE_ARTIFACT_CACHE_SIZE
+environment variable to a size in bytes, optionally with a K, M or G
+suffix, enables a cache of that size in the edalize cache directory.
+When the cache grows beyond its size, the least recently used entries are
+removed.
+"""
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+from edalize import get_cache_dir
+
+logger = logging.getLogger(__name__)
+
+_SIZE_SUFFIXES = {'K' : 1 << 10, 'M' : 1 << 20, 'G' : 1 << 30, 'T' : 1 << 40}
+
+def parse_size(size):
+    """ Parse a size like '512M' to a number of bytes
+
+    Numbers and None are returned as they are
+    """
+    if size is None or isinstance(size, (int, float)):
+        return size
+    s = str(size).strip().upper().rstrip('B')
+    try:
+        if s and s[-1] in _SIZE_SUFFIXES:
+            return int(float(s[:-1]) * _SIZE_SUFFIXES[s[-1]])
+        return int(float(s))
+    except ValueError:
+        raise RuntimeError("Invalid size '{}'".format(size))
+
+def _path_size(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, f))
+                   for root, _, files in os.walk(path) for f in files)
+    return os.path.getsize(path)
+
+class ArtifactCache(object):
+    """ A directory of cache entries with a total size limit
+
+    Each entry is a directory named after its key, with the cached files
+    and directories below files/ and a manifest.json listing them. The
+    modification time of the manifest is the last time the entry was used.
+    """
+
+    def __init__(self, directory, max_size=None):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    def _entry(self, key):
+        return os.path.join(self.directory, key)
+
+    def restore(self, key, work_root):
+        """ Copy the artifacts stored under key to work_root
+
+        The files get the current time as modification time, in the order
+        they were stored, so that make treats them as up to date. Returns
+        the list of restored paths, or None on a cache miss.
+        """
+        entry = self._entry(key)
+        manifest = os.path.join(entry, 'manifest.json')
+        try:
+            with open(manifest) as f:
+                paths = json.load(f)['files']
+        except (IOError, OSError, ValueError, KeyError):
+            return None
+        try:
+            for path in paths:
+                src = os.path.join(entry, 'files', path)
+                dst = os.path.join(work_root, path)
+                if os.path.isdir(dst):
+                    shutil.rmtree(dst)
+                os.makedirs(os.path.dirname(dst) or '.', exist_ok=True)
+                if os.path.isdir(src):
+                    shutil.copytree(src, dst, copy_function=shutil.copyfile)
+                else:
+                    shutil.copyfile(src, dst)
+                    shutil.copymode(src, dst)
+            os.utime(manifest)
+        except (IOError, OSError) as e:
+            logger.warning("Unable to restore artifacts from cache: {}".format(e))
+            return None
+        return paths
+
+    def store(self, key, work_root, paths):
+        """ Store the files and directories paths, relative to work_root """
+        if os.path.exists(self._entry(key)):
+            return
+        tmp = tempfile.mkdtemp(prefix='.tmp-', dir=self.directory)
+        try:
+            size = 0
+            for path in paths:
+                src = os.path.join(work_root, path)
+                dst = os.path.join(tmp, 'files', path)
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                if os.path.isdir(src):
+                    shutil.copytree(src, dst)
+                else:
+                    shutil.copy2(src, dst)
+                size += _path_size(dst)
+            with open(os.path.join(tmp, 'manifest.json'), 'w') as f:
+                json.dump({'files' : paths, 'size' : size}, f)
+            os.rename(tmp, self._entry(key))
+        except (IOError, OSError) as e:
+            # A concurrent build may have stored the same key first
+            if not os.path.exists(self._entry(key)):
+                logger.warning("Unable to store artifacts in cache: {}".format(e))
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+        self.evict()
+
+    def entries(self):
+        """ Get a list of (last use, size, key) for all entries """
+        entries = []
+        for key in os.listdir(self.directory):
+            if key.startswith('.'):
+                continue
+            manifest = os.path.join(self._entry(key), 'manifest.json')
+            try:
+                with open(manifest) as f:
+                    size = json.load(f)['size']
+                entries.append((os.path.getmtime(manifest), size, key))
+            except (IOError, OSError, ValueError, KeyError):
+                continue
+        return entries
+
+    def evict(self):
+        """ Remove least recently used entries until the cache fits max_size """
+        if self.max_size is None:
+            return
+        entries = sorted(self.entries())
+        total = sum(e[1] for e in entries)
+        for (_, size, key) in entries:
+            if total <= self.max_size:
+                break
+            logger.debug("Evicting {} from the artifact cache".format(key))
+            shutil.rmtree(self._entry(key), ignore_errors=True)
+            total -= size
+
+def default_artifact_cache():
+    """ Get the cache configured by EDALIZE_ARTIFACT_CACHE_SIZE, or None """
+    size = os.environ.get('EDALIZE_ARTIFACT_CACHE_SIZE')
+    if not size:
+        return None
+    directory = get_cache_dir('artifacts')
+    if directory is None:
+        return None
+    try:
+        return ArtifactCache(directory, parse_size(size))
+    except RuntimeError:
+        logger.warning("Invalid EDALIZE_ARTIFACT_CACHE_SIZE '{}'".format(size))
+        return None
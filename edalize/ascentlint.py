@@ -7,6 +7,7 @@ import re
 import os
 from collections import OrderedDict
 
+from edalize.build_graph import BuildGraph
 from edalize.edatool import Edatool
 
 logger = logging.getLogger(__name__)
@@ -40,7 +41,6 @@ common coding errors or coding style violations.
 
         template_vars = {
             'name'             : self.name,
-            'ascentlint_options' : ' '.join(self.tool_options.get('ascentlint_options', [])),
             'tcl_source_files' : tcl_source_files,
             'waiver_files'     : waiver_files,
             'toplevel'         : self.toplevel,
@@ -51,6 +51,21 @@ common coding errors or coding style violations.
                              'run-ascentlint.tcl',
                              template_vars)
 
-        self.render_template('Makefile.j2',
-                             'Makefile',
-                             template_vars)
+        self._write_graph_makefile()
+
+    def build_graph(self):
+        graph = BuildGraph()
+        graph.add('ascentlint',
+                  ['ascentlint', '-i', 'run-ascentlint.tcl', '-log', 'ascentlint.log'] +
+                  self.tool_options.get('ascentlint_options', []),
+                  inputs = ['run-ascentlint.tcl', 'sources.f'],
+                  outputs = ['ascentlint.log'],
+                  description = 'Running Ascent Lint')
+        graph.add('report-violations',
+                  ['sh', '-c', '(egrep -q "(Found [0-9]+ info lint violations|No lint violations found)" '
+                   'ascentlint.log && echo "***PASSED***") || '
+                   '(echo "***ERROR*** Lint run found new errors or warnings. '
+                   'Please check ascentlint.rpt" && exit 1)'],
+                  inputs = ['ascentlint.log'],
+                  description = 'Checking for lint violations')
+        return graph
@@ -0,0 +1,405 @@
+# Copyright edalize contributors
+# Licensed under the 2-Clause BSD License, see LICENSE for details.
+# SPDX-License-Identifier: BSD-2-Clause
+
+""" Batch scheduling
+
+Runs a list of jobs, each configuring, building and/or running one EDAM
+with one backend, on a limited number of job slots. Jobs are described by
+dicts like the jobs of edalize.server::
+
+    from edalize.batch import run_batch
+    from edalize.history import History
+
+    results = run_batch([{'tool'      : 'vivado',
+                          'edam'      : soc_edam,
+                          'work_root' : 'build/soc'},
+                         {'tool'      : 'verilator',
+                          'edam'      : tb_edam,
+                          'work_root' : 'build/tb',
+                          'phases'    : ['configure', 'build', 'run'],
+                          'priority'  : 1}],
+                        max_jobs=4,
+                        history=History('history.sqlite'))
+
+With a runtime history (see edalize.history), jobs with higher priority
+start first, and among jobs with the same priority the ones that took the
+longest before start first, so that long jobs don't end up as a tail at the
+end of the batch. Jobs without history are treated as the longest.
+
+The scheduler can also keep the jobs within a memory and CPU budget. The
+memory a job needs is the memory_estimate tool option of its backend, or
+else the highest peak memory use in its history. The CPUs it needs is the
+cpu_estimate tool option, or else one. A job only starts when its needs fit
+next to the jobs already running. A job that needs more memory than the
+whole budget is rejected.
+
+On Linux, the memory use of the running jobs is also measured from /proc,
+as the total resident memory of the tool processes of each job and their
+children. The scheduler is under memory pressure when the jobs use more
+than the memory budget together, or when less than reserve bytes of memory
+are available on the host. Under pressure, no new jobs start, and the
+lowest priority job that is still running is paused (SIGSTOP) or, with
+on_pressure='reject', killed and reported as rejected. One job always keeps
+running. A paused job starts no new commands, and commands that were just
+starting are stopped at the next measurement. Paused jobs continue when
+the pressure is gone. Their timeouts keep running while they are paused.
+
+Jobs of tools with a license pool (see edalize.licenses) wait in the queue
+while the pool has no free license.
+"""
+
+import logging
+import os
+import signal
+import threading
+import time
+
+from edalize import get_edatool
+from edalize.artifact_cache import parse_size
+from edalize.history import default_history
+from edalize.process import error_message
+
+logger = logging.getLogger(__name__)
+
+PHASES = ['configure', 'build', 'run']
+
+class _BatchJob(object):
+    def __init__(self, index, job):
+        self.index = index
+        self.job = job
+        self.backend = None
+        self.estimate = None
+        # Resident memory of the processes of the job in the last sample,
+        # and the highest seen
+        self.rss = 0
+        self.peak_rss = None
+        self.paused = False
+        # Process ids of the job that were stopped since it was paused
+        self.stopped = set()
+        self.rejected = False
+        self.result = {'job'        : index,
+                       'name'       : job.get('name', index),
+                       'tool'       : job.get('tool'),
+                       'work_root'  : job.get('work_root'),
+                       'status'     : 'passed',
+                       'error'      : None,
+                       'returncode' : None,
+                       'errors'     : None,
+                       'estimate'   : None,
+                       'start'      : None,
+                       'duration'   : None,
+                       'max_rss'    : None}
+
+    @property
+    def priority(self):
+        return self.job.get('priority', 0)
+
+    @property
+    def memory(self):
+        """ Expected peak memory use in bytes, or 0 if unknown """
+        if self.backend and self.backend.memory_estimate:
+            return self.backend.memory_estimate
+        if self.estimate and self.estimate['max_rss']:
+            return self.estimate['max_rss']
+        return 0
+
+    @property
+    def cpus(self):
+        if self.backend and self.backend.cpu_estimate:
+            return self.backend.cpu_estimate
+        return 1
+
+    def sort_key(self):
+        duration = self.estimate['duration'] if self.estimate else float('inf')
+        return (-self.priority, -duration, self.index)
+
+class BatchScheduler(object):
+    """ Runs batches of jobs
+
+    At most max_jobs jobs (default: number of CPUs) run at the same time.
+    history is the History used to order jobs and to record their runtime
+    (default: the one from EDALIZE_HISTORY, if any). memory is the memory
+    budget and reserve the memory to keep available on the host, in bytes
+    or as strings like '64G', and cpus the CPU budget. None means no limit.
+    on_pressure is 'pause' or 'reject'. The memory use of the jobs is
+    measured every interval seconds
+    """
+
+    # Where the memory use of processes is read from
+    PROC = '/proc'
+
+    def __init__(self, max_jobs=None, history=None, memory=None, cpus=None,
+                 reserve=None, on_pressure='pause', interval=1.0):
+        if not on_pressure in ['pause', 'reject']:
+            raise RuntimeError("Invalid on_pressure '{}'".format(on_pressure))
+        self.max_jobs = max_jobs or os.cpu_count()
+        self.history = history or default_history()
+        self.memory = parse_size(memory)
+        self.cpus = cpus
+        self.reserve = parse_size(reserve)
+        self.on_pressure = on_pressure
+        self.interval = interval
+        self._cond = threading.Condition()
+        self._running = []
+        # Memory available on the host in the last sample, or None
+        self._available = None
+
+    def run(self, jobs):
+        """ Run all jobs and wait for them to finish
+
+        Returns a list with one result dict per job, in the order of jobs,
+        with the job index and name, tool, work root, status ('passed',
+        'failed' or 'rejected'), error message, exit code and the lines of
+        output that matched the fatal errors of the tool, the estimate
+        from the history, start time, duration in seconds and the highest
+        measured memory use in bytes (None if not measured)
+        """
+        batch = [_BatchJob(i, job) for i, job in enumerate(jobs)]
+        queue = []
+        for b in batch:
+            try:
+                self._prepare(b)
+            except Exception as e:
+                b.result.update({'status' : 'failed', 'error' : error_message(e)})
+                continue
+            if self.memory is not None and b.memory > self.memory:
+                b.result.update({'status' : 'rejected',
+                                 'error'  : "Job needs {} bytes of memory, more than the budget of {}".format(b.memory, self.memory)})
+                continue
+            queue.append(b)
+        queue.sort(key=_BatchJob.sort_key)
+
+        done = threading.Event()
+        monitor = None
+        if self._monitored():
+            monitor = threading.Thread(target=self._monitor, args=(done,))
+            monitor.daemon = True
+            monitor.start()
+        threads = []
+        try:
+            with self._cond:
+                while queue:
+                    b = self._next_job(queue)
+                    if b is None:
+                        # Licenses can be given back by other processes
+                        self._cond.wait(self.interval)
+                        continue
+                    queue.remove(b)
+                    b.result['start'] = time.time()
+                    self._running.append(b)
+                    t = threading.Thread(target=self._run_job, args=(b,))
+                    t.start()
+                    threads.append(t)
+            for t in threads:
+                t.join()
+        finally:
+            done.set()
+            if monitor:
+                monitor.join()
+        return [b.result for b in batch]
+
+    def _prepare(self, b):
+        job = b.job
+        for phase in job.get('phases', PHASES):
+            if not phase in PHASES:
+                raise RuntimeError("Invalid phase '{}'".format(phase))
+        if not 'work_root' in job:
+            raise RuntimeError("Missing required parameter 'work_root'")
+        try:
+            tool_class = get_edatool(job['tool'])
+        except (ImportError, AttributeError):
+            raise RuntimeError("Unknown tool '{}'".format(job['tool']))
+        os.makedirs(job['work_root'], exist_ok=True)
+        b.backend = tool_class(edam=job['edam'], work_root=job['work_root'],
+                               verbose=job.get('verbose', False))
+        b.backend.log_file = job.get('log_file', 'edalize.log')
+        # Cleared while the job is paused
+        b.backend.start_gate = threading.Event()
+        b.backend.start_gate.set()
+        if self.history:
+            b.backend.history = self.history
+            b.estimate = self.history.estimate(b.backend.name, job['tool'],
+                                               b.backend._history_key(),
+                                               job.get('phases', PHASES))
+        b.result['estimate'] = b.estimate
+
+    def _next_job(self, queue):
+        """ Get the first job of the queue that can start now, or None """
+        if len(self._running) >= self.max_jobs:
+            return None
+        for b in queue:
+            if self._can_start(b):
+                return b
+        return None
+
+    def _can_start(self, b):
+        if not self._running:
+            return True
+        if any(r.paused for r in self._running):
+            return False
+        # Jobs waiting for a license would only hold on to a job slot
+        pool = b.backend and b.backend._license_pool()
+        if pool is not None and not pool.available():
+            return False
+        if self.cpus is not None and sum(r.cpus for r in self._running) + b.cpus > self.cpus:
+            return False
+        if self.memory is not None:
+            used = sum(max(r.memory, r.rss) for r in self._running)
+            if used + b.memory > self.memory:
+                return False
+        if self.reserve is not None and self._available is not None:
+            # The running jobs may still grow to their expected peak
+            growth = sum(max(r.memory - r.rss, 0) for r in self._running)
+            if self._available - growth - b.memory < self.reserve:
+                return False
+        return True
+
+    def _monitored(self):
+        return (self.memory is not None or self.reserve is not None) and \
+            os.path.isdir(self.PROC)
+
+    def _monitor(self, done):
+        while not done.wait(self.interval):
+            try:
+                self._sample()
+            except OSError as e:
+                logger.warning("Unable to read memory use: {}".format(e))
+                return
+
+    def _sample(self):
+        """ Measure the memory use of the running jobs and handle pressure """
+        processes = _read_processes(self.PROC)
+        available = _read_available(self.PROC)
+        with self._cond:
+            self._available = available
+            for b in self._running:
+                b.rss = _tree_rss(processes, b.backend.processes)
+                b.peak_rss = max(b.peak_rss or 0, b.rss)
+            self._handle_pressure()
+            self._cond.notify()
+
+    def _under_pressure(self):
+        if self.memory is not None and sum(b.rss for b in self._running) > self.memory:
+            return True
+        return self.reserve is not None and self._available is not None and \
+            self._available < self.reserve
+
+    def _handle_pressure(self):
+        """ Pause or reject a job under memory pressure, or continue one without """
+        # Commands that were starting while their job was being paused
+        for b in self._running:
+            started = b.backend.processes - b.stopped
+            if b.paused and started:
+                b.stopped |= started
+                self._signal(b, signal.SIGSTOP)
+        active = [b for b in self._running if not b.paused and not b.rejected]
+        if self._under_pressure():
+            if len(active) < 2:
+                return
+            # The lowest priority job, and of those the one started last
+            b = min(active, key=lambda b: (b.priority, -b.result['start']))
+            if self.on_pressure == 'pause':
+                logger.warning("Memory pressure. Pausing job {}".format(b.result['name']))
+                b.paused = True
+                b.backend.start_gate.clear()
+                b.stopped = set(b.backend.processes)
+                self._signal(b, signal.SIGSTOP)
+            else:
+                logger.warning("Memory pressure. Rejecting job {}".format(b.result['name']))
+                b.rejected = True
+                self._signal(b, signal.SIGKILL)
+        else:
+            paused = [b for b in self._running if b.paused]
+            if paused:
+                b = max(paused, key=lambda b: (b.priority, -b.result['start']))
+                logger.info("Continuing job {}".format(b.result['name']))
+                b.paused = False
+                b.backend.start_gate.set()
+                self._signal(b, signal.SIGCONT)
+
+    def _signal(self, b, sig):
+        for pid in b.backend.processes.copy():
+            try:
+                os.killpg(pid, sig)
+            except (ProcessLookupError, PermissionError):
+                pass
+
+    def _run_job(self, b):
+        job = b.job
+        logger.info("Starting job {}".format(b.result['name']))
+        try:
+            for phase in job.get('phases', PHASES):
+                if b.rejected:
+                    raise RuntimeError("Rejected")
+                if phase == 'configure':
+                    b.backend.configure()
+                elif phase == 'build':
+                    b.backend.build()
+                else:
+                    b.backend.run(job.get('args', {}))
+        except Exception as e:
+            if b.rejected:
+                b.result.update({'status' : 'rejected',
+                                 'error'  : "Killed under memory pressure"})
+            else:
+                if not isinstance(e, RuntimeError):
+                    logger.exception("Job {} failed".format(b.result['name']))
+                b.result.update({'status'     : 'failed',
+                                 'error'      : error_message(e),
+                                 'returncode' : getattr(e, 'returncode', None),
+                                 'errors'     : getattr(e, 'errors', None)})
+        finally:
+            b.result['duration'] = time.time() - b.result['start']
+            logger.info("Job {}: {}".format(b.result['name'], b.result['status']))
+            with self._cond:
+                b.result['max_rss'] = b.peak_rss
+                self._running.remove(b)
+                self._cond.notify()
+
+def _read_processes(proc):
+    """ Get the parent process id and resident memory in bytes of all processes """
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    processes = {}
+    for name in os.listdir(proc):
+        if not name.isdigit():
+            continue
+        try:
+            with open(os.path.join(proc, name, 'stat'), 'rb') as f:
+                stat = f.read()
+        except OSError:
+            # The process has exited
+            continue
+        # The command name can contain spaces and parentheses
+        fields = stat[stat.rfind(b')')+2:].split()
+        processes[int(name)] = (int(fields[1]), int(fields[21]) * page_size)
+    return processes
+
+def _read_available(proc):
+    """ Get the memory available on the host in bytes, or None if unknown """
+    with open(os.path.join(proc, 'meminfo')) as f:
+        for line in f:
+            if line.startswith('MemAvailable:'):
+                return int(line.split()[1]) * 1024
+    return None
+
+def _tree_rss(processes, pids):
+    """ Get the total resident memory of pids and all their descendants """
+    children = {}
+    for pid, (ppid, _) in processes.items():
+        children.setdefault(ppid, []).append(pid)
+    rss = 0
+    stack = [pid for pid in pids if pid in processes]
+    seen = set()
+    while stack:
+        pid = stack.pop()
+        if pid in seen:
+            continue
+        seen.add(pid)
+        rss += processes[pid][1]
+        stack += children.get(pid, [])
+    return rss
+
+def run_batch(jobs, max_jobs=None, history=None, memory=None, **kwargs):
+    """ Run jobs with a BatchScheduler. See BatchScheduler.run """
+    return BatchScheduler(max_jobs, history, memory, **kwargs).run(jobs)
@@ -0,0 +1,370 @@
+# Copyright edalize contributors
+# Licensed under the 2-Clause BSD License, see LICENSE for details.
+# SPDX-License-Identifier: BSD-2-Clause
+
+""" Build step graphs
+
+A BuildGraph describes the build of a backend as a set of steps, each with
+a command, the files it reads and writes and its environment. Steps depend
+on the steps producing their inputs and on steps listed explicitly.
+
+The graph can be rendered as a Makefile or a Ninja build file, or run
+directly from Python with run_graph, which runs independent steps in
+parallel, skips steps whose inputs, outputs and command are unchanged
+(compared by content, not by modification time) and reports the time spent
+in each step.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shlex
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+class BuildStep(object):
+    """ One command of a build graph
+
+    inputs and outputs are paths relative to the work root. env holds
+    extra environment variables for the command
+    """
+    def __init__(self, name, cmd, inputs=[], outputs=[], depends=[], env=None,
+                 description=None):
+        self.name = name
+        self.cmd = list(cmd)
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.depends = list(depends)
+        self.env = dict(env or {})
+        self.description = description or name
+
+class BuildGraph(object):
+    """ An ordered set of BuildSteps
+
+    default lists the targets built when none are given. None means all
+    steps
+    """
+
+    def __init__(self):
+        self.steps = OrderedDict()
+        self.default = None
+
+    def add(self, name, cmd, inputs=[], outputs=[], depends=[], env=None,
+            description=None):
+        """ Add a step and return it """
+        if name in self.steps:
+            raise RuntimeError("Duplicate build step '{}'".format(name))
+        step = BuildStep(name, cmd, inputs, outputs, depends, env, description)
+        self.steps[name] = step
+        return step
+
+    def producers(self):
+        """ Map each output file to the name of the step producing it """
+        producers = {}
+        for step in self.steps.values():
+            for output in step.outputs:
+                if output in producers:
+                    raise RuntimeError("'{}' is an output of both build steps '{}' and '{}'".format(output, producers[output], step.name))
+                producers[output] = step.name
+        return producers
+
+    def dependencies(self):
+        """ Get the names of the steps that each step depends on
+
+        Raises RuntimeError for unknown step names and circular dependencies
+        """
+        producers = self.producers()
+        deps = OrderedDict()
+        for step in self.steps.values():
+            _deps = set()
+            for name in step.depends:
+                if not name in self.steps:
+                    raise RuntimeError("Build step '{}' depends on unknown step '{}'".format(step.name, name))
+                _deps.add(name)
+            for f in step.inputs:
+                if f in producers:
+                    _deps.add(producers[f])
+            deps[step.name] = _deps
+
+        resolved = set()
+        while len(resolved) < len(deps):
+            ready = [n for n in deps if not n in resolved and deps[n] <= resolved]
+            if not ready:
+                _s = ', '.join(n for n in deps if not n in resolved)
+                raise RuntimeError("Circular dependencies between build steps: " + _s)
+            resolved.update(ready)
+        return deps
+
+    def select(self, targets=None):
+        """ Get the names of the steps needed for targets, in build order
+
+        Steps come after the steps they depend on, and in graph order
+        otherwise. targets are step names or output files. None selects the
+        default targets
+        """
+        deps = self.dependencies()
+        if targets is None:
+            targets = self.default
+        if targets is None:
+            return _build_order(deps, deps)
+        producers = self.producers()
+        needed = set()
+        todo = []
+        for t in targets:
+            if t in self.steps:
+                todo.append(t)
+            elif t in producers:
+                todo.append(producers[t])
+            else:
+                raise RuntimeError("Unknown build target '{}'".format(t))
+        while todo:
+            n = todo.pop()
+            if not n in needed:
+                needed.add(n)
+                todo += deps[n]
+        return _build_order(deps, needed)
+
+    def to_makefile(self, extra=None):
+        """ Render the graph as a Makefile
+
+        Each step becomes a rule for its first output, or a phony target
+        named after the step if it has no outputs. Steps with outputs can
+        also be built through a phony target named after the step. The all
+        target builds the default targets. extra is added after the rules
+        of the steps, for targets that aren't part of the build, like
+        running a simulation
+        """
+        deps = self.dependencies()
+        producers = self.producers()
+
+        def _target(step):
+            return step.outputs[0] if step.outputs else step.name
+
+        def _quote(s):
+            return shlex.quote(s).replace('$', '$$')
+
+        phony = []
+        lines = ['#Auto generated by Edalize', '']
+        lines.append('all: ' + ' '.join(_target(self.steps[t]) if t in self.steps else t
+                                        for t in (self.default or self.steps)))
+        lines.append('')
+        for step in self.steps.values():
+            prereqs = list(OrderedDict.fromkeys(i for i in step.inputs if not i in step.outputs))
+            for name in sorted(deps[step.name]):
+                if not any(o in prereqs for o in self.steps[name].outputs):
+                    prereqs.append(_target(self.steps[name]))
+            cmd = ' '.join(_quote(c) for c in step.cmd)
+            if step.env:
+                cmd = 'env ' + ' '.join(_quote('{}={}'.format(k, v)) for k, v in step.env.items()) + ' ' + cmd
+            lines.append('{}: {}'.format(_target(step), ' '.join(prereqs)).rstrip())
+            lines.append('\t$(EDALIZE_LAUNCHER) ' + cmd)
+            if len(step.outputs) > 1:
+                lines.append('{}: {}'.format(' '.join(step.outputs[1:]), step.outputs[0]))
+            if not step.name in producers:
+                if step.outputs:
+                    lines.append('{}: {}'.format(step.name, step.outputs[0]))
+                phony.append(step.name)
+            lines.append('')
+        # Sources get an empty rule, so that make leaves reporting missing
+        # ones to the commands, like for the header dependencies of gcc -MP
+        sources = OrderedDict.fromkeys(i for s in self.steps.values() for i in s.inputs
+                                       if not i in producers)
+        if sources:
+            lines.append(' '.join(sources) + ':')
+            lines.append('')
+        lines.append('.PHONY: ' + ' '.join(['all'] + phony))
+        if extra:
+            lines += ['', extra.strip('\n')]
+        return '\n'.join(lines) + '\n'
+
+    def to_ninja(self):
+        """ Render the graph as a Ninja build file
+
+        Each step gets a rule with restat enabled, so that steps that leave
+        their outputs untouched don't trigger their dependents. Steps are
+        also available as phony targets named after the step. Steps without
+        outputs always run
+        """
+        deps = self.dependencies()
+
+        def _escape(path):
+            return path.replace('$', '$$').replace(' ', '$ ').replace(':', '$:')
+
+        # Nothing creates the stamp of a step without outputs, so it
+        # always runs
+        def _outputs(step):
+            return step.outputs or [step.name + '.stamp']
+
+        lines = ['#Auto generated by Edalize', '']
+        for step in self.steps.values():
+            cmd = ' '.join(shlex.quote(c) for c in step.cmd)
+            if step.env:
+                cmd = 'env ' + ' '.join(shlex.quote('{}={}'.format(k, v)) for k, v in step.env.items()) + ' ' + cmd
+            lines.append('rule {}'.format(_rule_name(step.name)))
+            lines.append('  command = $${EDALIZE_LAUNCHER} ' + cmd.replace('$', '$$'))
+            lines.append('  description = ' + step.description.replace('$', '$$'))
+            lines.append('  restat = 1')
+            lines.append('')
+        for step in self.steps.values():
+            inputs = list(OrderedDict.fromkeys(step.inputs))
+            implicit = []
+            for name in sorted(deps[step.name]):
+                if not any(o in inputs for o in _outputs(self.steps[name])):
+                    implicit.append(_outputs(self.steps[name])[0])
+            line = 'build {}: {}'.format(' '.join(_escape(o) for o in _outputs(step)),
+                                         _rule_name(step.name))
+            if inputs:
+                line += ' ' + ' '.join(_escape(i) for i in inputs)
+            if implicit:
+                line += ' | ' + ' '.join(_escape(i) for i in implicit)
+            lines.append(line)
+            if not step.name in _outputs(step):
+                lines.append('build {}: phony {}'.format(_escape(step.name),
+                                                         ' '.join(_escape(o) for o in _outputs(step))))
+            lines.append('')
+        lines.append('default ' + ' '.join(_escape(n) for n in (self.default or self.steps)))
+        return '\n'.join(lines) + '\n'
+
+def _build_order(deps, names):
+    # The steps in names, each after the steps it depends on
+    order = []
+    done = set()
+    while len(order) < len(names):
+        ready = [n for n in deps if n in names and not n in done and deps[n] <= done]
+        order += ready
+        done.update(ready)
+    return order
+
+def _rule_name(name):
+    return ''.join(c if c.isalnum() or c in '_-' else '_' for c in name)
+
+class _FileHasher(object):
+    """ Content hashes of files, reusing earlier hashes of unchanged files
+
+    Known hashes are kept with the size and mtime of the file. A file whose
+    size and mtime still match is not read again
+    """
+    def __init__(self, known):
+        self.known = known
+
+    def __call__(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if os.path.isdir(path):
+            h = hashlib.sha256()
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for f in sorted(files):
+                    p = os.path.join(root, f)
+                    h.update(os.path.relpath(p, path).encode('utf-8') + b'\0')
+                    h.update((self(p) or '').encode('utf-8'))
+            return h.hexdigest()
+        known = self.known.get(path)
+        if known and known[0] == st.st_size and known[1] == st.st_mtime_ns:
+            return known[2]
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        self.known[path] = [st.st_size, st.st_mtime_ns, h.hexdigest()]
+        return h.hexdigest()
+
+def _step_key(step, hash_file, work_root):
+    h = hashlib.sha256()
+    h.update(json.dumps([step.cmd, sorted(step.env.items())]).encode('utf-8'))
+    for f in step.inputs:
+        h.update(f.encode('utf-8') + b'\0')
+        h.update((hash_file(os.path.join(work_root, f)) or 'missing').encode('utf-8'))
+    return h.hexdigest()
+
+def run_graph(graph, run_step, work_root, targets=None, jobs=None, state_file=None):
+    """ Run the steps of a graph that are needed for targets
+
+    run_step is called with each BuildStep that is out of date and runs
+    its command, raising an exception on failure. Up to jobs steps
+    (default: number of CPUs) run in parallel. The content hashes of the
+    inputs and outputs of each successful step are kept in state_file
+    (relative to work_root) to decide whether it is up to date next time.
+    Steps without outputs always run.
+
+    Returns a list with a dict for each selected step with its name, its
+    status ('built', 'up-to-date', 'failed' or 'not run'), the start time
+    and the duration in seconds. After a failure, no new steps are
+    started and the first error is raised once the running steps have
+    finished
+    """
+    deps = graph.dependencies()
+    selected = graph.select(targets)
+
+    state = {'steps' : {}, 'files' : {}}
+    state_path = os.path.join(work_root, state_file) if state_file else None
+    if state_path:
+        try:
+            with open(state_path) as f:
+                state = json.load(f)
+        except (IOError, OSError, ValueError):
+            pass
+    hash_file = _FileHasher(state.setdefault('files', {}))
+    step_state = state.setdefault('steps', {})
+
+    results = OrderedDict((n, {'name'     : n,
+                               'status'   : 'not run',
+                               'start'    : None,
+                               'duration' : None}) for n in selected)
+
+    def _run(step):
+        result = results[step.name]
+        result['start'] = time.time()
+        key = _step_key(step, hash_file, work_root)
+        old = step_state.get(step.name)
+        if step.outputs and old and old['key'] == key and \
+           all(hash_file(os.path.join(work_root, o)) == old['outputs'].get(o)
+               for o in step.outputs):
+            result['status'] = 'up-to-date'
+        else:
+            step_state.pop(step.name, None)
+            run_step(step)
+            step_state[step.name] = {
+                'key'     : key,
+                'outputs' : {o : hash_file(os.path.join(work_root, o))
+                             for o in step.outputs}}
+            result['status'] = 'built'
+        result['duration'] = time.time() - result['start']
+
+    pending = set(selected)
+    finished = set()
+    running = {}
+    error = None
+    try:
+        with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+            while pending or running:
+                if error is None:
+                    for n in selected:
+                        if n in pending and (deps[n] & set(selected)) <= finished:
+                            pending.discard(n)
+                            running[executor.submit(_run, graph.steps[n])] = n
+                if not running:
+                    break
+                (done, _) = wait(running, return_when=FIRST_COMPLETED)
+                for f in done:
+                    n = running.pop(f)
+                    try:
+                        f.result()
+                        finished.add(n)
+                    except Exception as e:
+                        results[n]['status'] = 'failed'
+                        results[n]['duration'] = time.time() - results[n]['start']
+                        error = error or e
+    finally:
+        if state_path:
+            with open(state_path, 'w') as f:
+                json.dump(state, f)
+    if error:
+        raise error
+    return list(results.values())
@@ -29,7 +29,7 @@ class Diamond(Edatool):
             raise RuntimeError("Missing required option 'part' for diamond backend")
 
         (src_files, incdirs) = self._get_fileset_files()
-        has_vhdl2008 = "vhdlSource-2008" in [x.file_type for x in src_files]
+        has_vhdl2008 = self.fileset.has_file_type("vhdlSource-2008")
             
         lpf_file = None
         prj_name = self.name.replace('.','_')
@@ -40,7 +40,7 @@ class Diamond(Edatool):
                 else:
                     lpf_file = f.name
         #FIXME: Warn about pnr without lpf
-        with open(os.path.join(self.work_root, self.name+'.tcl'), 'w') as f:
+        with self._open_output(self.name+'.tcl') as f:
             TCL_TEMPLATE = """#Generated by Edalize
 prj_project new -name {} -dev {}{} -synthesis synplify
 prj_impl option top {}
@@ -77,7 +77,7 @@ prj_impl option top {}
                     f.write(_s+'\n')
             f.write('prj_project save\nexit\n')
 
-        with open(os.path.join(self.work_root, self.name+'_run.tcl'), 'w') as f:
+        with self._open_output(self.name+'_run.tcl') as f:
             f.write("""#Generated by Edalize
 prj_project open {}.ldf
 prj_run Synthesis
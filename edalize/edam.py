@@ -0,0 +1,486 @@
+# Copyright edalize contributors
+# Licensed under the 2-Clause BSD License, see LICENSE for details.
+# SPDX-License-Identifier: BSD-2-Clause
+
+""" EDAM loading and the compact file table
+
+A FileTable holds the files of an EDAM in less memory than a list of
+dicts. The table stores each attribute in its own column, with file types
+and logical names interned, so a design with 100k files takes a fraction
+of the memory of the equivalent dicts. It behaves like a sequence of file
+dicts: files can be appended, inserted, replaced and removed, and each row
+is a mapping that behaves like the original file dict, including
+assignments. It is not a list though, and not a JSON array for json.dump.
+Use dump_edam or dumps_edam to write an EDAM with a FileTable, or
+files.to_list().
+
+Backends take the files of an EDAM as they are, as a list of dicts or as
+a FileTable. Either way, Edatool.file_table has them as a table. Backends
+that run other backends as sub-tools (e.g. Yosys from Vivado) hand them
+the same files instead of copying them.
+
+load_edam reads an EDAM from a JSON or YAML file. For JSON, the file is
+read in chunks and the files are added to a table one at a time, so the
+text of the file and the full list of file dicts are never in memory::
+
+    from edalize import get_edatool
+    from edalize.edam import load_edam
+
+    edam = load_edam('design.eda.json')
+    backend = get_edatool('icarus')(edam=edam, work_root='build')
+"""
+
+import hashlib
+import io
+import json
+import re
+from array import array
+from collections.abc import MutableMapping, MutableSequence, Sequence
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+class FileEntry(MutableMapping):
+    """ View of one row of a FileTable, as an EDAM file dict
+
+    Assignments and deletions change the row in the table
+    """
+    __slots__ = ('_table', '_index')
+
+    def __init__(self, table, index):
+        self._table = table
+        self._index = index
+
+    def __getitem__(self, key):
+        return self._table._get(self._index, key)
+
+    def __setitem__(self, key, value):
+        self._table._set(self._index, key, value)
+
+    def __delitem__(self, key):
+        self._table._del(self._index, key)
+
+    def __iter__(self):
+        return iter(self._table._keys(self._index))
+
+    def __len__(self):
+        return len(self._table._keys(self._index))
+
+    def __repr__(self):
+        return repr(dict(self))
+
+class _FileSequence(Sequence):
+
+    @property
+    def cache(self):
+        """ Data derived from the files, e.g. the FilesetIndex of the
+        backends using them. It is emptied whenever the table changes
+        """
+        table = self._table()
+        if self._cache_generation != table.generation:
+            self._cache = {}
+            self._cache_generation = table.generation
+        return self._cache
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return FileTableView(self._table(), [self._row(j) for j in range(*i.indices(len(self)))])
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("File index out of range")
+        return FileEntry(self._table(), self._row(i))
+
+    def view(self, indices):
+        """ Get a FileTableView of the rows at indices, without copying them """
+        return FileTableView(self._table(), [self._row(i) for i in indices])
+
+    def select(self, predicate):
+        """ Get a FileTableView of the files for which predicate(file) is true """
+        return self.view(i for i, f in enumerate(self) if predicate(f))
+
+    def to_list(self):
+        """ Get the files as a list of new dicts """
+        return [dict(f) for f in self]
+
+    def digest(self):
+        """ Hash of all file attributes, in order. See digest_files """
+        return digest_files(self)
+
+    def __eq__(self, other):
+        if isinstance(other, (_FileSequence, list)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.to_list())
+
+class FileTable(_FileSequence, MutableSequence):
+    """ Column-oriented table of EDAM files
+
+    name, file_type, logical_name, is_include_file and include_path have
+    their own columns. Any other keys of a file are kept in a side table.
+    generation counts the changes to the table.
+    """
+
+    def __init__(self, files=()):
+        self.names = []
+        # Indices into strings. 0 means the key is missing
+        self.strings = [None]
+        self._string_ids = {}
+        self.file_types = array('I')
+        self.logical_names = array('I')
+        # 0 if missing, 1 for False and 2 for True
+        self.include_flags = bytearray()
+        self.include_paths = {}
+        self.extra = {}
+        self.generation = 0
+        self._cache = {}
+        self._cache_generation = 0
+        for f in files:
+            self.append(f)
+
+    @classmethod
+    def from_files(cls, files):
+        """ Get files as a table. Tables and views are returned as they are """
+        if isinstance(files, _FileSequence):
+            return files
+        return cls(files)
+
+    def _table(self):
+        return self
+
+    def _row(self, i):
+        return i
+
+    def _intern(self, s):
+        if s is None:
+            return 0
+        i = self._string_ids.get(s)
+        if i is None:
+            i = len(self.strings)
+            self.strings.append(s)
+            self._string_ids[s] = i
+        return i
+
+    def append(self, f):
+        """ Add a file dict to the table """
+        self.names.append(_file_name(f))
+        self.file_types.append(0)
+        self.logical_names.append(0)
+        self.include_flags.append(0)
+        self._set_row(len(self.names) - 1, f)
+
+    def _set_row(self, i, f):
+        self.names[i] = _file_name(f)
+        self.file_types[i] = self._intern(f.get('file_type'))
+        self.logical_names[i] = self._intern(f.get('logical_name'))
+        if 'is_include_file' in f:
+            self.include_flags[i] = 2 if f['is_include_file'] else 1
+        else:
+            self.include_flags[i] = 0
+        self.include_paths.pop(i, None)
+        if 'include_path' in f:
+            self.include_paths[i] = f['include_path']
+        self.extra.pop(i, None)
+        if not _COLUMNS.issuperset(f):
+            self.extra[i] = {k : v for k, v in f.items() if not k in _COLUMNS}
+        self.generation += 1
+
+    def __setitem__(self, i, f):
+        if isinstance(i, slice):
+            files = self.to_list()
+            files[i] = [dict(x) for x in f]
+            self._rebuild(files)
+            return
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("File index out of range")
+        self._set_row(i, f)
+
+    def __delitem__(self, i):
+        files = self.to_list()
+        del files[i]
+        self._rebuild(files)
+
+    def insert(self, i, f):
+        """ Insert a file dict before index i """
+        files = self.to_list()
+        files.insert(i, dict(f))
+        self._rebuild(files)
+
+    def _rebuild(self, files):
+        # Inserted and removed rows shift the rows after them, so the
+        # columns are rebuilt. Views of the table keep their row numbers
+        generation = self.generation
+        FileTable.__init__(self, files)
+        self.generation = generation + 1
+
+    def __len__(self):
+        return len(self.names)
+
+    def _get(self, i, key):
+        if key == 'name':
+            return self.names[i]
+        if key == 'file_type' or key == 'logical_name':
+            column = self.file_types if key == 'file_type' else self.logical_names
+            if not column[i]:
+                raise KeyError(key)
+            return self.strings[column[i]]
+        if key == 'is_include_file':
+            if not self.include_flags[i]:
+                raise KeyError(key)
+            return self.include_flags[i] == 2
+        if key == 'include_path':
+            return self.include_paths[i]
+        return self.extra.get(i, {})[key]
+
+    def _set(self, i, key, value):
+        if key == 'name':
+            self.names[i] = value
+        elif key == 'file_type':
+            self.file_types[i] = self._intern(value)
+        elif key == 'logical_name':
+            self.logical_names[i] = self._intern(value)
+        elif key == 'is_include_file':
+            self.include_flags[i] = 2 if value else 1
+        elif key == 'include_path':
+            self.include_paths[i] = value
+        else:
+            self.extra.setdefault(i, {})[key] = value
+        self.generation += 1
+
+    def _del(self, i, key):
+        if key == 'name':
+            raise RuntimeError("Files must have a name")
+        self._get(i, key)
+        if key == 'file_type':
+            self.file_types[i] = 0
+        elif key == 'logical_name':
+            self.logical_names[i] = 0
+        elif key == 'is_include_file':
+            self.include_flags[i] = 0
+        elif key == 'include_path':
+            del self.include_paths[i]
+        else:
+            del self.extra[i][key]
+            if not self.extra[i]:
+                del self.extra[i]
+        self.generation += 1
+
+    def _keys(self, i):
+        keys = ['name']
+        if self.file_types[i]:
+            keys.append('file_type')
+        if self.logical_names[i]:
+            keys.append('logical_name')
+        if self.include_flags[i]:
+            keys.append('is_include_file')
+        if i in self.include_paths:
+            keys.append('include_path')
+        keys += self.extra.get(i, {}).keys()
+        return keys
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_string_ids']
+        state['_cache'] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._string_ids = {s : i for i, s in enumerate(self.strings) if i}
+
+_COLUMNS = frozenset(['name', 'file_type', 'logical_name', 'is_include_file', 'include_path'])
+
+def _file_name(f):
+    try:
+        return f['name']
+    except (KeyError, TypeError):
+        raise RuntimeError("Invalid file {!r} in EDAM. Files must have a name".format(f))
+
+class FileTableView(_FileSequence):
+    """ Some rows of a FileTable, sharing its storage """
+
+    def __init__(self, table, rows):
+        self.table = table
+        self.rows = array('I', rows)
+        self._cache = {}
+        self._cache_generation = table.generation
+
+    def _table(self):
+        return self.table
+
+    def _row(self, i):
+        return self.rows[i]
+
+    def __len__(self):
+        return len(self.rows)
+
+def digest_files(files):
+    """ Hash of all attributes of a list of file dicts or a FileTable, in order """
+    h = hashlib.sha256()
+    for f in files:
+        h.update(json.dumps(dict(f), sort_keys=True, default=str).encode('utf-8'))
+        h.update(b'\n')
+    return h.hexdigest()
+
+def _skip(text, i):
+    return _WHITESPACE.match(text, i).end()
+
+class _JSONReader(object):
+    """ Decode JSON values one at a time from a text file
+
+    The file is read in chunks, and text before the current position is
+    dropped when the next chunk is read, so only the value being decoded
+    has to fit in memory
+    """
+    CHUNK_SIZE = 1 << 20
+
+    def __init__(self, f):
+        self.f = f
+        self.decoder = json.JSONDecoder()
+        self.text = ''
+        self.i = 0
+        # Position of text[0] in the file
+        self.offset = 0
+        self.eof = False
+
+    def _read(self):
+        # Returns False at the end of the file
+        chunk = self.f.read(self.CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.offset += self.i
+        self.text = self.text[self.i:] + chunk
+        self.i = 0
+        return True
+
+    def error(self, msg):
+        return ValueError("{} at character {}".format(msg, self.offset + self.i))
+
+    def peek(self):
+        """ Skip whitespace and get the next character, or '' at the end """
+        while True:
+            self.i = _skip(self.text, self.i)
+            if self.i < len(self.text) or not self._read():
+                return self.text[self.i:self.i+1]
+
+    def expect(self, c, msg):
+        if self.peek() != c:
+            raise self.error(msg)
+        self.i += 1
+
+    def decode(self):
+        """ Decode the next value """
+        self.peek()
+        while True:
+            try:
+                (value, end) = self.decoder.raw_decode(self.text, self.i)
+                # A number at the end of the text can continue in the next chunk
+                if end < len(self.text) or self.eof:
+                    self.i = end
+                    return value
+            except ValueError as e:
+                if self.eof:
+                    raise ValueError("{} at character {}".format(getattr(e, 'msg', e),
+                                                                 self.offset + getattr(e, 'pos', self.i)))
+            self._read()
+
+def loads_edam(text):
+    """ Parse an EDAM from a JSON string, streaming the files into a FileTable """
+    return _read_edam(io.StringIO(text))
+
+def _read_edam(f):
+    reader = _JSONReader(f)
+    reader.expect('{', "Expecting an EDAM object")
+    edam = {}
+    if reader.peek() == '}':
+        reader.i += 1
+    else:
+        while True:
+            if reader.peek() != '"':
+                raise reader.error("Expecting property name enclosed in double quotes")
+            key = reader.decode()
+            reader.expect(':', "Expecting ':' delimiter")
+            if key == 'files' and reader.peek() == '[':
+                edam[key] = _read_files(reader)
+            else:
+                edam[key] = reader.decode()
+            c = reader.peek()
+            if c != ',' and c != '}':
+                raise reader.error("Expecting ',' delimiter")
+            reader.i += 1
+            if c == '}':
+                break
+    if reader.peek():
+        raise reader.error("Extra data")
+    return edam
+
+def _read_files(reader):
+    files = FileTable()
+    reader.i += 1
+    if reader.peek() == ']':
+        reader.i += 1
+        return files
+    while True:
+        files.append(reader.decode())
+        c = reader.peek()
+        if c != ',' and c != ']':
+            raise reader.error("Expecting ',' delimiter")
+        reader.i += 1
+        if c == ']':
+            return files
+
+def _to_json(o):
+    if isinstance(o, _FileSequence):
+        return o.to_list()
+    if isinstance(o, FileEntry):
+        return dict(o)
+    raise TypeError("Object of type {} is not JSON serializable".format(o.__class__.__name__))
+
+def dumps_edam(edam, **kwargs):
+    """ Get an EDAM as a JSON string. The files can be a FileTable
+
+    Keyword arguments are passed on to json.dumps
+    """
+    return json.dumps(edam, default=_to_json, **kwargs)
+
+def dump_edam(edam, path, **kwargs):
+    """ Write an EDAM to a JSON file. See dumps_edam """
+    with open(path, 'w') as f:
+        json.dump(edam, f, default=_to_json, **kwargs)
+
+def load_edam(path):
+    """ Read an EDAM from a JSON or YAML (.yml, .yaml) file
+
+    The files of the EDAM are returned as a FileTable. YAML files are
+    parsed as a whole, and require PyYAML to be installed.
+    """
+    if path.endswith(('.yml', '.yaml')):
+        try:
+            import yaml
+        except ImportError:
+            raise RuntimeError("PyYAML is required to read YAML EDAM files")
+        try:
+            with open(path) as f:
+                edam = yaml.safe_load(f)
+        except yaml.YAMLError as e:
+            raise RuntimeError("Invalid EDAM file {}: {}".format(path, e))
+        if not isinstance(edam, dict):
+            raise RuntimeError("Invalid EDAM file {}: Expecting an EDAM object".format(path))
+        if 'files' in edam:
+            edam['files'] = FileTable(edam['files'])
+        return edam
+    try:
+        with open(path) as f:
+            return _read_edam(f)
+    except ValueError as e:
+        raise RuntimeError("Invalid EDAM file {}: {}".format(path, e))
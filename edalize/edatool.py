@@ -3,12 +3,31 @@
 # SPDX-License-Identifier: BSD-2-Clause
 
 import argparse
+import asyncio
+import copy
 from collections import OrderedDict
+import hashlib
+import io
+import json
 import os
 import subprocess
 import logging
 import sys
-from jinja2 import Environment, PackageLoader
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from jinja2 import BytecodeCache, Environment, FileSystemBytecodeCache, PackageLoader
+
+from edalize import get_cache_dir, trace
+from edalize.artifact_cache import default_artifact_cache, parse_size
+from edalize.edam import FileTable, digest_files
+from edalize.history import default_history
+from edalize.licenses import default_license_pools
+# The process helpers used to live here and are still imported from here
+from edalize.process import (LicenseError, OutputCollector, ProcessMetrics,
+                             ProcessRunner, ToolError, ToolTimeout, error_message,
+                             run_streaming)
 
 logger = logging.getLogger(__name__)
 
@@ -38,7 +57,7 @@ def subprocess_run_3_9(*popenargs,
     with subprocess.Popen(*popenargs, **kwargs) as process:
         try:
             stdout, stderr = process.communicate(input, timeout=timeout)
-        except TimeoutExpired as exc:
+        except subprocess.TimeoutExpired as exc:
             process.kill()
             if _mswindows:
                 # Windows accumulates the output in a single blocking
@@ -68,6 +87,45 @@ if sys.version_info < (3, 7):
 else:
     run = subprocess.run
 
+class TemplateCodeCache(BytecodeCache):
+    """ Process-wide cache of compiled template code
+
+    Compiled templates are kept in memory, so that every backend instance
+    can skip parsing and compiling templates that another instance already
+    loaded. If a cache directory is given, the code is also stored there
+    to be picked up by later processes. The shared environment uses the
+    templates directory of get_cache_dir, so an empty EDALIZE_CACHE_DIR
+    keeps the code in memory only.
+    """
+    def __init__(self, directory=None):
+        self.codes = {}
+        self.lock = threading.Lock()
+        self.fs_cache = FileSystemBytecodeCache(directory) if directory else None
+
+    def load_bytecode(self, bucket):
+        with self.lock:
+            entry = self.codes.get(bucket.key)
+        if entry and entry[0] == bucket.checksum:
+            bucket.code = entry[1]
+        elif self.fs_cache:
+            try:
+                self.fs_cache.load_bytecode(bucket)
+            except Exception:
+                bucket.reset()
+            if bucket.code is not None:
+                with self.lock:
+                    self.codes[bucket.key] = (bucket.checksum, bucket.code)
+
+    def dump_bytecode(self, bucket):
+        with self.lock:
+            self.codes[bucket.key] = (bucket.checksum, bucket.code)
+        if self.fs_cache:
+            try:
+                self.fs_cache.dump_bytecode(bucket)
+            except OSError:
+                logger.debug("Unable to store compiled template " + bucket.key)
+
+
 # Jinja2 tests and filters, available in all templates
 def jinja_filter_param_value_str(value, str_quote_style="", bool_is_str=False):
     """ Convert a parameter value to string suitable to be passed to an EDA tool
@@ -92,6 +150,128 @@ def jinja_filter_param_value_str(value, str_quote_style="", bool_is_str=False):
         return str(value)
 
 
+def write_if_changed(path, content):
+    """ Write *content* to the text file *path* unless it already holds it
+
+    Leaving unchanged files alone preserves their timestamps, which keeps
+    the generated Makefiles from rebuilding everything after a configure.
+
+    Returns True if the file was (re)written
+    """
+    try:
+        with open(path) as f:
+            if f.read() == content:
+                return False
+    except (IOError, OSError, UnicodeDecodeError):
+        pass
+    with open(path, 'w') as f:
+        f.write(content)
+    return True
+
+_source_digest = None
+_source_digest_lock = threading.Lock()
+
+def source_digest():
+    """ Hash the Python sources and templates of edalize
+
+    The hash is part of the configure fingerprint and the artifact cache
+    key, so that files generated by another version of edalize are not
+    taken as up to date. It is computed once per process
+    """
+    global _source_digest
+    with _source_digest_lock:
+        if _source_digest is None:
+            root = os.path.dirname(os.path.abspath(__file__))
+            h = hashlib.sha256()
+            for (dirpath, dirnames, filenames) in os.walk(root):
+                dirnames[:] = sorted(d for d in dirnames if d != '__pycache__')
+                in_templates = os.path.relpath(dirpath, root).split(os.sep)[0] == 'templates'
+                for name in sorted(filenames):
+                    if not (in_templates or name.endswith('.py')):
+                        continue
+                    path = os.path.join(dirpath, name)
+                    h.update(os.path.relpath(path, root).encode('utf-8') + b'\0')
+                    with open(path, 'rb') as f:
+                        h.update(f.read())
+                    h.update(b'\0')
+            _source_digest = h.hexdigest()
+        return _source_digest
+
+class OutputFile(io.StringIO):
+    """ A text file which is only written to disk on close if it changed
+
+    Drop-in replacement for open(path, 'w') for files generated by a backend
+    """
+    def __init__(self, path):
+        super(OutputFile, self).__init__()
+        self.path = path
+
+    def close(self):
+        if not self.closed:
+            write_if_changed(self.path, self.getvalue())
+        super(OutputFile, self).close()
+
+
+class File(object):
+    """ A source file as returned by Edatool._get_fileset_files """
+    def __init__(self, name, file_type, logical_name):
+        self.name         = name
+        self.file_type    = file_type
+        self.logical_name = logical_name
+
+class SourceFile(object):
+    """ Read-only record of a source file in a FilesetIndex """
+    __slots__ = ('index', 'name', 'slash_name', 'file_type', 'logical_name')
+
+    def __init__(self, index, name, file_type, logical_name):
+        self.index        = index
+        self.name         = name
+        self.slash_name   = name.replace('\\', '/')
+        self.file_type    = file_type
+        self.logical_name = logical_name
+
+class FilesetIndex(object):
+    """ Index over the files of an EDAM
+
+    Built once per backend instance. Holds the non-include files in EDAM
+    order, the files of each file type and the unique include directories,
+    both as given and with forward slashes only.
+    """
+    def __init__(self, files):
+        self.src_files = []
+        self.by_type = {}
+        incdirs = OrderedDict()
+        slash_incdirs = OrderedDict()
+        for f in files:
+            if f.get('is_include_file'):
+                _incdir = f.get('include_path') or os.path.dirname(f['name']) or '.'
+                incdirs[_incdir] = None
+                slash_incdirs[_incdir.replace('\\', '/')] = None
+            else:
+                src_file = SourceFile(len(self.src_files),
+                                      f['name'],
+                                      f.get('file_type', ''),
+                                      f.get('logical_name', ''))
+                self.src_files.append(src_file)
+                self.by_type.setdefault(src_file.file_type, []).append(src_file)
+        self.incdirs = list(incdirs)
+        self.slash_incdirs = list(slash_incdirs)
+
+    def has_file_type(self, file_type, prefix=False):
+        """ Check if there are files of file_type, or of any type starting with it """
+        if prefix:
+            return any(ft.startswith(file_type) for ft in self.by_type)
+        return file_type in self.by_type
+
+    def files_of_type(self, *file_types):
+        """ Get the files of any of file_types, in EDAM order """
+        if len(file_types) == 1:
+            return list(self.by_type.get(file_types[0], []))
+        files = []
+        for ft in set(file_types):
+            files += self.by_type.get(ft, [])
+        return sorted(files, key=lambda f: f.index)
+
 class FileAction(argparse.Action):
     def __call__(self, parser, namespace, values, option_string=None):
         path = os.path.expandvars(values[0])
@@ -99,7 +279,57 @@ class FileAction(argparse.Action):
         path = os.path.abspath(path)
         setattr(namespace, self.dest, [path])
 
-class Edatool(object):
+# Progress messages of nextpnr, for the backends that run it
+NEXTPNR_PROGRESS_PATTERNS = [r'^Info: Running (?P<step>[\w ]*placer)',
+                             r'^Info:\s+at (?:initial placer iter |iteration #)(?P<iteration>\d+)',
+                             r'^Info: (?P<step>Routing)\.\.']
+
+class Edatool(ProcessRunner):
+
+    # Bump this whenever edalize changes what a backend generates without
+    # changing its inputs, to invalidate existing configure fingerprints
+    # Tool options that only change how and when the tools are run, not
+    # what they produce. They are left out of the fingerprints
+    scheduling_options = ['tool_timeout', 'tool_timeouts', 'phase_timeouts',
+                          'memory_estimate', 'cpu_estimate', 'abort_on_error',
+                          'progress_patterns']
+
+    # Commands that get the jobserver, if there is one, through MAKEFLAGS
+    jobserver_commands = ['make', 'gmake', 'ninja']
+
+    # Regular expressions matching the messages of a tool that failed to
+    # check out a license. See edalize.licenses
+    license_errors = []
+
+    # Regular expressions matching the fatal error messages of a tool. With
+    # the abort_on_error tool option, the tool is killed at the first one
+    fatal_errors = []
+
+    # Regular expressions matching the progress messages of a tool. The
+    # named groups step (the name of the step the tool is in), percent,
+    # iteration and time (simulation time) of a match go into a progress
+    # event. See _report_progress
+    progress_patterns = []
+
+    # Template environment shared by all backend instances in the process
+    _jinja_env = None
+    _jinja_env_lock = threading.Lock()
+
+    @classmethod
+    def _get_shared_jinja_env(cls):
+        with Edatool._jinja_env_lock:
+            if Edatool._jinja_env is None:
+                env = Environment(
+                    loader = PackageLoader(__package__, 'templates'),
+                    trim_blocks = True,
+                    lstrip_blocks = True,
+                    keep_trailing_newline = True,
+                    bytecode_cache = TemplateCodeCache(get_cache_dir('templates')),
+                )
+                env.filters['param_value_str']   = jinja_filter_param_value_str
+                env.filters['generic_value_str'] = jinja_filter_param_value_str
+                Edatool._jinja_env = env
+        return Edatool._jinja_env
 
     def __init__(self, edam=None, work_root=None, eda_api=None, verbose=True):
         _tool_name = self.__class__.__name__.lower()
@@ -108,6 +338,47 @@ class Edatool(object):
         self.stdout=None
         self.stderr=None
 
+        # Number of output lines kept from each tool invocation for error
+        # reporting, and an optional file (relative to work_root) that
+        # receives the complete output of all captured tool invocations
+        self.log_tail_lines = 100
+        self.log_file = None
+
+        # Maximum number of hook scripts to run concurrently. Defaults to
+        # the number of CPUs
+        self.hook_jobs = None
+
+        # ProcessMetrics of all tool and script invocations. If metrics_file
+        # (relative to work_root) is set, each of them is also appended to it
+        # as a JSON line. It defaults to $EDALIZE_METRICS, so it is off
+        # unless that is set
+        self.metrics = []
+        self.metrics_file = os.environ.get('EDALIZE_METRICS') or None
+
+        # ArtifactCache that build restores the outputs of build_main from,
+        # for backends that list them in build_artifacts. See
+        # edalize.artifact_cache
+        self.artifact_cache = default_artifact_cache()
+        self._artifact_key = None
+
+        # Jobserver shared by all make invocations, build steps and
+        # concurrent runs, or None. Looked up on first use. See
+        # edalize.jobserver
+        self._jobserver = None
+        self._jobserver_initialized = False
+
+        # History that the duration, peak memory use and outcome of each
+        # phase are recorded in, or None. See edalize.history
+        self.history = default_history()
+
+        # LicensePools that limit the number of concurrent builds and runs
+        # of license-bound tools, or None. See edalize.licenses
+        self.license_pools = default_license_pools()
+
+        # Process ids of the running tool and script invocations. Each of
+        # them leads its own process group
+        self.processes = set()
+
         if not edam:
             edam = eda_api
         try:
@@ -117,7 +388,46 @@ class Edatool(object):
 
         self.tool_options = edam.get('tool_options', {}).get(_tool_name, {})
 
+        # Timeouts in seconds. tool_timeout applies to every tool and hook
+        # script invocation, tool_timeouts to the commands with a given
+        # name and phase_timeouts to all invocations of the 'build' or
+        # 'run' phase together. None means no limit
+        self.tool_timeout   = self.tool_options.get('tool_timeout')
+        self.tool_timeouts  = dict(self.tool_options.get('tool_timeouts', {}))
+        self.phase_timeouts = dict(self.tool_options.get('phase_timeouts', {}))
+        self._phase_deadline = None
+
+        # Expected peak memory use in bytes and number of CPUs used by the
+        # build, or None to rely on the runtime history. See edalize.batch
+        self.memory_estimate = parse_size(self.tool_options.get('memory_estimate'))
+        self.cpu_estimate    = self.tool_options.get('cpu_estimate')
+
+        # Kill a tool at the first line of output that matches fatal_errors,
+        # instead of waiting for it to exit
+        self.abort_on_error = self.tool_options.get('abort_on_error', False)
+
+        # Called with a dict for each progress event, in addition to the
+        # trace. The progress_patterns tool option adds patterns, e.g. for
+        # the time reports of a testbench
+        self.progress_callback = None
+        self.progress_patterns = self.progress_patterns + \
+            list(self.tool_options.get('progress_patterns', []))
+        self._progress = None
+
+        # How build_main runs the build. 'make' runs the Makefile written by
+        # configure. 'ninja' runs a build.ninja that configure renders from
+        # build_graph. 'python' runs the steps from build_graph directly.
+        # Both run up to build_jobs steps (default: number of CPUs) in
+        # parallel. With 'python', the status and duration of each step end
+        # up in step_results
+        self.build_runner = self.tool_options.get('build_runner', 'make')
+        self.build_jobs = None
+        self.step_results = []
+
+        # The files of the EDAM as given, usually a list of dicts. See
+        # file_table
         self.files       = edam.get('files', [])
+        self._file_table = None
         self.toplevel    = edam.get('toplevel', [])
         self.vpi_modules = edam.get('vpi', [])
 
@@ -127,6 +437,16 @@ class Edatool(object):
         self.work_root = work_root
         self.env = os.environ.copy()
 
+        # Files written through _open_output during configure
+        self._generated_files = None
+
+        # Set when an asyncio phase is cancelled, to stop starting commands
+        self._cancelled = threading.Event()
+
+        # threading.Event that new commands wait for before they start, or
+        # None. edalize.batch clears it while a job is paused
+        self.start_gate = None
+
         self.env['WORK_ROOT'] = self.work_root
 
         self.plusarg     = OrderedDict()
@@ -140,14 +460,11 @@ class Edatool(object):
             args[k] = v.get('default')
         self._apply_parameters(args)
 
-        self.jinja_env = Environment(
-            loader = PackageLoader(__package__, 'templates'),
-            trim_blocks = True,
-            lstrip_blocks = True,
-            keep_trailing_newline = True,
-        )
-        self.jinja_env.filters['param_value_str']   = jinja_filter_param_value_str
-        self.jinja_env.filters['generic_value_str'] = jinja_filter_param_value_str
+        # Backends register their own filters, so each instance gets an
+        # overlay with a private filter dict. Compiled template code is
+        # shared through the bytecode cache of the shared environment
+        self.jinja_env = self._get_shared_jinja_env().overlay()
+        self.jinja_env.filters = dict(self.jinja_env.filters)
 
     @classmethod
     def get_doc(cls, api_ver):
@@ -165,13 +482,125 @@ class Edatool(object):
         else:
             logger.warning("Invalid API version '{}' for get_tool_options".format(api_ver))
 
+    """ Get tool version
+
+    Backends override this to report the version of the underlying tool.
+    The version is part of the artifact cache key.
+    """
+    def get_version(self):
+        return "unknown"
+
     def configure(self, args=[]):
         if args:
             logger.error("Edalize has stopped supporting passing arguments as a function argument. Set these values as default values in the EDAM object instead")
+        fingerprint = self._configure_fingerprint()
+        if self._configure_is_up_to_date(fingerprint):
+            logger.info("Project is already set up. Skipping")
+            return
         logger.info("Setting up project")
-        self.configure_pre()
-        self.configure_main()
-        self.configure_post()
+        self._generated_files = []
+        with self._history_phase('configure'):
+            with self._trace_span('configure_pre'):
+                self.configure_pre()
+            with self._trace_span('configure_main'):
+                self.configure_main()
+                if self.build_runner == 'ninja':
+                    self._write_ninja_file()
+            with self._trace_span('configure_post'):
+                self.configure_post()
+        self._write_configure_fingerprint(fingerprint)
+
+    def _fingerprint_path(self):
+        _tool_name = self.__class__.__name__.lower()
+        return os.path.join(self.work_root, '.edalize-{}.fingerprint'.format(_tool_name))
+
+    def _configure_fingerprint(self):
+        """ Hash everything that can affect the files written by configure
+
+        This covers the normalized EDAM, the tool options, the parameter
+        values in effect, the edalize sources and the size and mtime of
+        input files, which some backends read during configure. The tool
+        version is left out, as probing it can mean starting the tool.
+        Backends whose configure depends on it add it with
+        _configure_fingerprint_version
+        """
+        file_stats = []
+        for f in self.files:
+            try:
+                st = os.stat(os.path.join(self.work_root, f['name']))
+                file_stats.append([f['name'], st.st_size, st.st_mtime_ns])
+            except (OSError, TypeError):
+                file_stats.append([f['name'], None, None])
+
+        data = {
+            'edalize'      : source_digest(),
+            'backend'      : self.__class__.__module__ + '.' + self.__class__.__name__,
+            'version'      : self._configure_fingerprint_version(),
+            'name'         : self.name,
+            'files'        : digest_files(self.files),
+            'file_stats'   : file_stats,
+            'toplevel'     : self.toplevel,
+            'vpi'          : self.vpi_modules,
+            'parameters'   : self.parameters,
+            'tool_options' : self._fingerprint_tool_options(),
+            'plusarg'      : self.plusarg,
+            'vlogparam'    : self.vlogparam,
+            'vlogdefine'   : self.vlogdefine,
+            'generic'      : self.generic,
+            'cmdlinearg'   : self.cmdlinearg,
+        }
+        s = json.dumps(data, sort_keys=True, default=str)
+        return hashlib.sha256(s.encode('utf-8')).hexdigest()
+
+    def _configure_fingerprint_version(self):
+        """ The tool version that configure depends on, or None """
+        return None
+
+    def _read_configure_fingerprint(self):
+        """ Get the fingerprint and files stored by the last configure, or {} """
+        try:
+            with open(self._fingerprint_path()) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _fingerprint_tool_options(self):
+        return {k : v for k, v in self.tool_options.items()
+                if not k in self.scheduling_options}
+
+    def _configure_is_up_to_date(self, fingerprint):
+        stored = self._read_configure_fingerprint()
+        if stored.get('fingerprint') != fingerprint:
+            return False
+        # Regenerate if any of the files from last time has been removed
+        return all(os.path.exists(os.path.join(self.work_root, f))
+                   for f in stored.get('files', []))
+
+    def _write_configure_fingerprint(self, fingerprint):
+        with open(self._fingerprint_path(), 'w') as f:
+            json.dump({'fingerprint' : fingerprint,
+                       'files'       : self._generated_files}, f, indent=2)
+
+    def _open_output(self, file_path):
+        """ Open a generated file for writing
+
+        The returned file object is only written to disk on close if its
+        contents differ from the existing file. Relative paths are relative
+        to work_root.
+        """
+        if self._generated_files is not None:
+            self._generated_files.append(file_path)
+        return OutputFile(os.path.join(self.work_root, file_path))
+
+    def _configure_subtool(self, tool):
+        """ Configure a backend that this one uses, e.g. yosys for synthesis
+
+        The files written by the sub-tool are recorded as generated by this
+        backend too, so that configure isn't skipped when one is removed
+        """
+        tool.configure()
+        if self._generated_files is not None:
+            self._generated_files.extend(tool._read_configure_fingerprint().get('files', []))
 
     def configure_pre(self):
         pass
@@ -183,9 +612,133 @@ class Edatool(object):
         pass
 
     def build(self):
-        self.build_pre()
-        self.build_main()
-        self.build_post()
+        with self._history_phase('build'), self._phase_timeout('build'), self._progress_phase('build'):
+            with self._trace_span('build_pre'):
+                self.build_pre()
+            with self._trace_span('build_main'):
+                if not self._restore_artifacts():
+                    self._licensed(self.build_main)
+                    self._store_artifacts()
+            with self._trace_span('build_post'):
+                self.build_post()
+
+    def _history_key(self):
+        """ Fingerprint of the options and parameter values of a job
+
+        Unlike the configure fingerprint, this doesn't depend on the files,
+        so that edits of the sources don't lose the runtime history
+        """
+        data = [self.__class__.__module__ + '.' + self.__class__.__name__,
+                self.toplevel, self._fingerprint_tool_options(), self.vlogparam,
+                self.vlogdefine, self.generic, self.plusarg, self.cmdlinearg]
+        s = json.dumps(data, sort_keys=True, default=str)
+        return hashlib.sha256(s.encode('utf-8')).hexdigest()[:16]
+
+    @contextmanager
+    def _history_phase(self, phase):
+        """ Record the duration, peak memory and outcome of a phase """
+        if self.history is None:
+            yield
+            return
+        _tool_name = self.__class__.__name__.lower()
+        fingerprint = self._history_key()
+        n_metrics = len(self.metrics)
+        start = time.time()
+        status = 'failed'
+        try:
+            yield
+            status = 'passed'
+        finally:
+            rss = [m.max_rss for m in self.metrics[n_metrics:] if m.max_rss is not None]
+            try:
+                self.history.record(self.name, _tool_name, fingerprint, phase,
+                                    start, time.time() - start,
+                                    max(rss) if rss else None, status)
+            except Exception as e:
+                logger.warning("Unable to record runtime history: {}".format(e))
+
+    @contextmanager
+    def _phase_timeout(self, phase):
+        timeout = self.phase_timeouts.get(phase)
+        if timeout is None:
+            yield
+            return
+        self._phase_deadline = time.monotonic() + timeout
+        try:
+            yield
+        finally:
+            self._phase_deadline = None
+
+    async def configure_async(self, args=[]):
+        """ asyncio version of configure. See build_async """
+        await self._run_in_thread(self.configure, args)
+
+    async def build_async(self):
+        """ asyncio version of build
+
+        Each phase method runs in a thread of its own while the event loop
+        carries on, so many backends can be built concurrently. If the task
+        is cancelled, the running tools and all their children are killed.
+        """
+        with self._history_phase('build'), self._phase_timeout('build'), self._progress_phase('build'):
+            with self._trace_span('build_pre'):
+                await self._run_in_thread(self.build_pre)
+            with self._trace_span('build_main'):
+                if not await self._run_in_thread(self._restore_artifacts):
+                    await self._licensed_async(self._run_in_thread, self.build_main)
+                    await self._run_in_thread(self._store_artifacts)
+            with self._trace_span('build_post'):
+                await self._run_in_thread(self.build_post)
+
+    def _license_pool(self):
+        if self.license_pools is None:
+            return None
+        return self.license_pools.pool(self.__class__.__name__.lower())
+
+    def _licensed(self, func, *args):
+        """ Call func with a license token of the backend's pool, if any
+
+        After a LicenseError, the token is given back and the call is
+        retried with backoff. See edalize.licenses
+        """
+        pool = self._license_pool()
+        if pool is None:
+            return func(*args)
+        attempt = 0
+        while True:
+            with pool.slot():
+                try:
+                    return func(*args)
+                except LicenseError as e:
+                    delay = self._license_retry_delay(e, attempt)
+            time.sleep(delay)
+            attempt += 1
+
+    async def _licensed_async(self, func, *args):
+        """ asyncio version of _licensed. func is a coroutine function """
+        pool = self._license_pool()
+        if pool is None:
+            return await func(*args)
+        loop = asyncio.get_event_loop()
+        attempt = 0
+        while True:
+            token = await loop.run_in_executor(None, pool.acquire)
+            try:
+                return await func(*args)
+            except LicenseError as e:
+                delay = self._license_retry_delay(e, attempt)
+            finally:
+                pool.release(token)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def _license_retry_delay(self, error, attempt):
+        # Reraises the error if there are no attempts left
+        if attempt >= self.license_pools.attempts:
+            raise error
+        delay = self.license_pools.delay(attempt)
+        logger.warning("{}. Retrying in {} seconds".format(error.message, delay))
+        return delay
 
     def build_pre(self):
         if 'pre_build' in self.hooks:
@@ -193,7 +746,101 @@ class Edatool(object):
 
     def build_main(self, target=None):
         logger.info("Building{}".format("" if target is None else "target " + " ".join(target)))
-        self._run_tool('make', [] if target is None else [target], quiet=True)
+        self._run_build(target)
+
+    def _run_build(self, target=None):
+        """ Build target, or the default target, with the build_runner """
+        if self.build_runner == 'python':
+            self._run_build_graph(None if target is None else [target])
+        elif self.build_runner == 'ninja':
+            args = [] if self.build_jobs is None else ['-j', str(self.build_jobs)]
+            self._run_tool('ninja', args + ([] if target is None else [target]), quiet=True)
+        elif self.build_runner == 'make':
+            self._run_tool('make', [] if target is None else [target], quiet=True)
+        else:
+            raise RuntimeError("Invalid build_runner '{}'".format(self.build_runner))
+
+    def build_graph(self):
+        """ Describe the build as an edalize.build_graph.BuildGraph
+
+        Backends that support build_runner 'python' return the steps that
+        make would run for the default target. Returns None otherwise
+        """
+        return None
+
+    def _get_build_graph(self):
+        graph = self.build_graph()
+        if graph is None:
+            _tool_name = self.__class__.__name__.lower()
+            raise RuntimeError("The {} backend doesn't support build_runner '{}'".format(_tool_name, self.build_runner))
+        return graph
+
+    def _write_ninja_file(self):
+        with self._open_output('build.ninja') as f:
+            f.write(self._get_build_graph().to_ninja())
+
+    def build_artifacts(self):
+        """ List the outputs of build_main that can be cached
+
+        Backends override this to return the files and directories, relative
+        to work_root, that build_main produces and later phases need. It is
+        called after a successful build. An empty list disables the
+        artifact cache for the backend.
+        """
+        return []
+
+    def _artifact_cache_key(self):
+        """ Hash everything that can affect the outputs of build_main
+
+        Unlike the configure fingerprint, this uses the contents of the
+        input files, so that identical sources hit the cache from any work
+        root and at any time.
+        """
+        h = hashlib.sha256()
+        for f in self.files:
+            h.update(f['name'].encode('utf-8') + b'\0')
+            try:
+                with open(os.path.join(self.work_root, f['name']), 'rb') as fp:
+                    for chunk in iter(lambda: fp.read(1 << 20), b''):
+                        h.update(chunk)
+            except (IOError, OSError):
+                h.update(b'\1missing')
+            h.update(b'\0')
+        data = {
+            'edalize'      : source_digest(),
+            'backend'      : self.__class__.__module__ + '.' + self.__class__.__name__,
+            'version'      : self.get_version(),
+            'name'         : self.name,
+            'files'        : digest_files(self.files),
+            'toplevel'     : self.toplevel,
+            'vpi'          : self.vpi_modules,
+            'hooks'        : self.hooks.get('pre_build', []),
+            'tool_options' : self._fingerprint_tool_options(),
+            'vlogparam'    : self.vlogparam,
+            'vlogdefine'   : self.vlogdefine,
+            'generic'      : self.generic,
+        }
+        h.update(json.dumps(data, sort_keys=True, default=str).encode('utf-8'))
+        return h.hexdigest()
+
+    def _restore_artifacts(self):
+        self._artifact_key = None
+        if self.artifact_cache is None or \
+           type(self).build_artifacts is Edatool.build_artifacts:
+            return False
+        self._artifact_key = self._artifact_cache_key()
+        restored = self.artifact_cache.restore(self._artifact_key, self.work_root)
+        if restored is None:
+            return False
+        logger.info("Restored {} from the artifact cache".format(', '.join(restored)))
+        return True
+
+    def _store_artifacts(self):
+        if self._artifact_key is None:
+            return
+        artifacts = self.build_artifacts()
+        if artifacts:
+            self.artifact_cache.store(self._artifact_key, self.work_root, artifacts)
 
     def build_post(self):
         if 'post_build' in self.hooks:
@@ -201,9 +848,24 @@ class Edatool(object):
 
     def run(self, args={}):
         logger.info("Running")
-        self.run_pre(args)
-        self.run_main()
-        self.run_post()
+        with self._history_phase('run'), self._phase_timeout('run'), self._progress_phase('run'):
+            with self._trace_span('run_pre'):
+                self.run_pre(args)
+            with self._trace_span('run_main'):
+                self._licensed(self.run_main)
+            with self._trace_span('run_post'):
+                self.run_post()
+
+    async def run_async(self, args={}):
+        """ asyncio version of run. See build_async """
+        logger.info("Running")
+        with self._history_phase('run'), self._phase_timeout('run'), self._progress_phase('run'):
+            with self._trace_span('run_pre'):
+                await self._run_in_thread(self.run_pre, args)
+            with self._trace_span('run_main'):
+                await self._licensed_async(self._run_in_thread, self.run_main)
+            with self._trace_span('run_post'):
+                await self._run_in_thread(self.run_post)
 
     def run_pre(self, args=None):
         if type(args) == list:
@@ -221,13 +883,195 @@ class Edatool(object):
         if 'post_run' in self.hooks:
             self._run_scripts(self.hooks['post_run'], 'post_run')
 
+    def run_command(self, run_dir):
+        """ Get the command that runs the built model from run_dir
+
+        Simulator backends whose build produces a model that can be run
+        directly override this. They return the command line for running it
+        with the current parameter values, with run_dir as the working
+        directory and the model in work_root. Returns None if the backend
+        can only be run through run_main
+        """
+        return None
+
+    def run_links(self):
+        """ Get the files and directories in work_root that a run needs
+
+        Simulators that look up the compiled model relative to the working
+        directory override this. run_many links the listed names that exist
+        into the directory of each run
+        """
+        return []
+
+    def run_many_pre(self):
+        """ Prepare the built model for run_many
+
+        Called once before the runs start. Backends that finish the model
+        at run time, e.g. by elaborating it, do that here instead
+        """
+        pass
+
+    def run_many(self, runs, jobs=None, run_root='runs'):
+        """ Run the built model once for each parameter set in runs
+
+        runs is a list of dicts with parameter values, as passed to run.
+        Run i is started in work_root/run_root/run_<i>, which gets its own
+        run.log, so the runs don't interfere with each other or with the
+        build. Up to jobs runs (default: number of CPUs) run concurrently,
+        each holding a slot of the jobserver, if there is one.
+        The model is not rebuilt and the pre_run and post_run hooks are not
+        run. The names from run_links are linked into each run directory.
+
+        Returns a list with one result dict per run, which is also written
+        to work_root/run_root/runs.json. Each result contains the run index,
+        its parameter values, run directory, status ('passed', 'failed' or
+        'timeout'), exit code, duration in seconds, error message and the
+        lines of output that matched fatal_errors (or None).
+        """
+        work_root = os.path.abspath(self.work_root)
+        commands = []
+        for i, args in enumerate(runs):
+            run_dir = os.path.join(work_root, run_root, 'run_{}'.format(i))
+            commands.append((run_dir, self._run_command_with(args, run_dir)))
+        self.run_many_pre()
+        links = [name for name in self.run_links()
+                 if os.path.lexists(os.path.join(work_root, name))]
+
+        def _run(i):
+            (run_dir, cmd) = commands[i]
+            result = {'run'        : i,
+                      'parameters' : runs[i],
+                      'run_dir'    : run_dir,
+                      'status'     : 'passed',
+                      'returncode' : 0,
+                      'duration'   : None,
+                      'error'      : None,
+                      'errors'     : None}
+            os.makedirs(run_dir, exist_ok=True)
+            for name in links:
+                if not os.path.lexists(os.path.join(run_dir, name)):
+                    os.symlink(os.path.join(work_root, name), os.path.join(run_dir, name))
+            with self._job_slot(), self._trace_span('run {}'.format(i), cmd=cmd) as span:
+                self._wait_to_start(cmd)
+                start_time = time.time()
+                collector = OutputCollector(self.log_tail_lines,
+                                            open(os.path.join(run_dir, 'run.log'), 'wb'))
+                for watch in self._output_watches():
+                    collector.watch(*watch)
+                try:
+                    cp = run_streaming(cmd,
+                                       collector = collector,
+                                       echo = False,
+                                       timeout = self._process_timeout(cmd),
+                                       cwd = run_dir,
+                                       env = self.env,
+                                       processes = self.processes)
+                    self._record_metrics(ProcessMetrics(cmd, cp.returncode, start_time,
+                                                        time.time() - start_time,
+                                                        cp.rusage))
+                    span['returncode'] = result['returncode'] = cp.returncode
+                    if cp.returncode:
+                        result['status'] = 'failed'
+                        result['error'] = (cp.stdout + cp.stderr).decode(errors='replace')
+                        if 'error' in collector.matches:
+                            result['errors'] = [l.rstrip('\r\n') for l in collector.matches['error']]
+                except subprocess.TimeoutExpired as e:
+                    result.update({'status'     : 'timeout',
+                                   'returncode' : None,
+                                   'error'      : "Timed out after {:g} seconds".format(e.timeout)})
+                except OSError as e:
+                    result.update({'status'     : 'failed',
+                                   'returncode' : None,
+                                   'error'      : str(e)})
+                finally:
+                    collector.log_file.close()
+            result['duration'] = time.time() - start_time
+            logger.info("Run {}: {}".format(i, result['status']))
+            return result
+
+        with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+            results = list(executor.map(_run, range(len(runs))))
+
+        with open(os.path.join(self.work_root, run_root, 'runs.json'), 'w') as f:
+            json.dump(results, f, indent=2, default=str)
+        return results
+
+    def _run_command_with(self, args, run_dir):
+        # Parameter values and tool options are restored afterwards so that
+        # the runs don't affect each other
+        saved = {'tool_options' : copy.deepcopy(self.tool_options)}
+        for paramtype in ['plusarg', 'vlogparam', 'vlogdefine', 'generic', 'cmdlinearg']:
+            saved[paramtype] = getattr(self, paramtype).copy()
+        try:
+            self._apply_parameters(args)
+            cmd = self.run_command(run_dir)
+        finally:
+            for k, v in saved.items():
+                setattr(self, k, v)
+        if cmd is None:
+            _tool_name = self.__class__.__name__.lower()
+            raise RuntimeError("The {} backend doesn't support run_many".format(_tool_name))
+        return cmd
+
+    # Backend option schemas per class and argument parsers per parameter
+    # schema, so that applying parameters repeatedly, e.g. in sweeps,
+    # doesn't redo the work
+    _option_schemas = {}
+    _parsers = OrderedDict()
+    _parsers_lock = threading.Lock()
+    MAX_CACHED_PARSERS = 64
+
+    @classmethod
+    def _option_schema(cls):
+        """ Get the names of the backend members and lists from get_doc(0)
+
+        Returns a tuple with the set of member names, the set of list names
+        and a list of (name, description) of all options
+        """
+        schema = Edatool._option_schemas.get(cls)
+        if schema is None:
+            _opts = cls.get_doc(0) or {}
+            members = [(x['name'], x['desc']) for x in _opts.get('members', [])]
+            lists   = [(x['name'], x['desc']) for x in _opts.get('lists', [])]
+            schema = (frozenset(n for (n, _) in members),
+                      frozenset(n for (n, _) in lists),
+                      members + lists)
+            Edatool._option_schemas[cls] = schema
+        return schema
+
     def parse_args(self, args, paramtypes):
+        progname = os.path.basename(sys.argv[0]) + ' run {}'.format(self.name)
+        key = json.dumps([self.__class__.__module__, self.__class__.__name__,
+                          progname, sorted(paramtypes), self.parameters],
+                         sort_keys=True, default=str)
+        with Edatool._parsers_lock:
+            parser = Edatool._parsers.get(key)
+            if parser is not None:
+                Edatool._parsers.move_to_end(key)
+        if parser is None:
+            parser = self._create_parser(progname, paramtypes)
+            with Edatool._parsers_lock:
+                Edatool._parsers[key] = parser
+                while len(Edatool._parsers) > self.MAX_CACHED_PARSERS:
+                    Edatool._parsers.popitem(last=False)
+
+        args_dict = {}
+        for key, value in vars(parser.parse_args(args)).items():
+            if value is None:
+                continue
+            if type(value) == list:
+                _value = value[0]
+            else:
+                _value = value
+            args_dict[key] = _value
+        return args_dict
+
+    def _create_parser(self, progname, paramtypes):
         typedict = {'bool' : {'action' : 'store_true'},
                     'file' : {'type' : str , 'nargs' : 1, 'action' : FileAction},
                     'int'  : {'type' : int , 'nargs' : 1},
                     'str'  : {'type' : str , 'nargs' : 1},
                     }
-        progname = os.path.basename(sys.argv[0]) + ' run {}'.format(self.name)
 
         parser = argparse.ArgumentParser(prog = progname,
                                          conflict_handler='resolve')
@@ -237,7 +1081,6 @@ class Edatool(object):
                   'vlogdefine' : 'Verilog defines (Compile-time global symbol)',
                   'generic'    : 'VHDL generic (Run-time option)',
                   'cmdlinearg' : 'Command-line arguments (Run-time option)'}
-        param_type_map = {}
 
         for name, param in self.parameters.items():
             _description = param.get('description', "No description")
@@ -264,33 +1107,18 @@ class Edatool(object):
                 except KeyError as e:
                     raise RuntimeError("Invalid data type {} for parameter '{}'".format(str(e),
                                                                                         name))
-                param_type_map[name.replace('-','_')] = _paramtype
             else:
                 logging.warn("Parameter '{}' has unsupported type '{}' for requested backend".format(name, _paramtype))
 
         #backend_args.
         backend_args = parser.add_argument_group("Backend arguments")
-        _opts = self.__class__.get_doc(0)
-        for _opt in _opts.get('members', []) + _opts.get('lists', []):
-            backend_args.add_argument('--'+_opt['name'],
-                                      help=_opt['desc'])
-
-        args_dict = {}
-        for key, value in vars(parser.parse_args(args)).items():
-            if value is None:
-                continue
-            if type(value) == list:
-                _value = value[0]
-            else:
-                _value = value
-            args_dict[key] = _value
-        return args_dict
+        for (_name, _desc) in self._option_schema()[2]:
+            backend_args.add_argument('--'+_name,
+                                      help=_desc)
+        return parser
 
     def _apply_parameters(self, args):
-        _opts = self.__class__.get_doc(0)
-        #Parse arguments
-        backend_members = [x['name'] for x in _opts.get('members', [])]
-        backend_lists   = [x['name'] for x in _opts.get('lists', [])]
+        (backend_members, backend_lists, _) = self._option_schema()
         for key,value in args.items():
             if value is None:
                 continue
@@ -312,98 +1140,156 @@ class Edatool(object):
 
         The template file is expected in the directory templates/BACKEND_NAME.
         """
+        with self._open_output(target_file) as f:
+            f.write(self._render(template_file, template_vars))
+
+    def _render(self, template_file, template_vars = {}):
         template_dir = str(self.__class__.__name__).lower()
         template = self.jinja_env.get_template('/'.join([template_dir, template_file]))
-        file_path = os.path.join(self.work_root, target_file)
-        with open(file_path, 'w') as f:
-            f.write(template.render(template_vars))
+        return template.render(template_vars)
+
+    def _write_graph_makefile(self, extra=None, makefile_name='Makefile'):
+        """
+        Write the build graph of the backend as a Makefile
+
+        extra holds the targets that aren't part of the build, like run and
+        clean. They are added after the build rules.
+        """
+        with self._open_output(makefile_name) as f:
+            f.write(self._get_build_graph().to_makefile(extra))
+
+    @property
+    def file_table(self):
+        """ The files of the EDAM as an edalize.edam.FileTable
+
+        Files that are already a table, e.g. from edalize.edam.load_edam,
+        are used as they are. A list of file dicts is converted on first
+        use, and again when files is replaced or files are added to or
+        removed from the list
+        """
+        files = self.files
+        if self._file_table is None or self._file_table[0] is not files or \
+           len(self._file_table[1]) != len(files):
+            self._file_table = (files, FileTable.from_files(files))
+        return self._file_table[1]
+
+    @property
+    def fileset(self):
+        """ FilesetIndex over the files of the EDAM, built on first use
+
+        The index is kept with the file table, so sub-tools that get the
+        same table share it. It is rebuilt when the table changes
+        """
+        table = self.file_table
+        fileset = table.cache.get('fileset')
+        if fileset is None:
+            fileset = FilesetIndex(table)
+            table.cache['fileset'] = fileset
+        return fileset
 
     def _get_fileset_files(self, force_slash=False):
-        class File:
-            def __init__(self, name, file_type, logical_name):
-                self.name         = name
-                self.file_type    = file_type
-                self.logical_name = logical_name
-        incdirs = []
-        src_files = []
-        for f in self.files:
-            if 'is_include_file' in f and f['is_include_file']:
-                _incdir = f.get('include_path') or os.path.dirname(f['name']) or '.'
-                if force_slash:
-                    _incdir = _incdir.replace('\\', '/')
-                if not _incdir in incdirs:
-                    incdirs.append(_incdir)
-            else:
-                _name = f['name']
-                if force_slash:
-                    _name = _name.replace('\\', '/')
-                file_type = f.get('file_type', '')
-                logical_name = f.get('logical_name', '')
-                src_files.append(File(_name,
-                                      file_type,
-                                      logical_name))
+        """ Get the source files and include directories of the EDAM
+
+        Returns a list of new File objects, which backends may modify, and
+        a list of unique include directories. Use self.fileset for read-only
+        lookups.
+        """
+        index = self.fileset
+        if force_slash:
+            src_files = [File(f.slash_name, f.file_type, f.logical_name) for f in index.src_files]
+            incdirs = list(index.slash_incdirs)
+        else:
+            src_files = [File(f.name, f.file_type, f.logical_name) for f in index.src_files]
+            incdirs = list(index.incdirs)
         return (src_files, incdirs)
 
     def _param_value_str(self, param_value, str_quote_style="", bool_is_str=False):
         return jinja_filter_param_value_str(param_value, str_quote_style, bool_is_str)
 
-    def _run_scripts(self, scripts, hook_name):
-        for script in scripts:
-            _env = self.env.copy()
-            if 'env' in script:
-                _env.update(script['env'])
-            logger.info("Running {} script {}".format(hook_name, script['name']))
-            logger.debug("Environment: " + str(_env))
-            logger.debug("Working directory: " + self.work_root)
+    def _output_watches(self, collected=True):
+        """ Get the (name, regex, callback, kill) watches for the output of each tool invocation
+
+        Output that isn't collected anyway is only watched when something
+        depends on it, since that takes the terminal away from the tool.
+        Fatal errors are then only watched with abort_on_error
+        """
+        watches = []
+        if self.license_pools:
+            regex = self._output_pattern('license_errors')
+            if regex:
+                watches.append(('license', regex, None, False))
+        regex = self._output_pattern('fatal_errors')
+        if regex and (collected or self.abort_on_error):
+            watches.append(('error', regex, None, self.abort_on_error))
+        if self.progress_callback or trace.get_tracer():
+            # Separately, since the patterns can use the same group names
+            for pattern in self.progress_patterns:
+                watches.append(('progress', self._compile_patterns([pattern]),
+                                self._report_progress, False))
+        return watches
+
+    @contextmanager
+    def _progress_phase(self, phase):
+        """ Track the elapsed time of a phase for progress events
+
+        The expected duration from the runtime history, if any, gives the
+        percentage for tools that don't report it themselves
+        """
+        estimate = None
+        if self.history is not None and (self.progress_callback or trace.get_tracer()):
+            _tool_name = self.__class__.__name__.lower()
             try:
-                cp = run(script['cmd'],
-                                    cwd = self.work_root,
-                                    env = _env,
-				    capture_output=not self.verbose,
-                                    check = True)
-            except FileNotFoundError as e:
-                msg = "Unable to run {} script '{}': {}"
-                raise RuntimeError(msg.format(hook_name, script['name'], str(e)))
-            except subprocess.CalledProcessError as e:
-                msg = "{} script '{}': {} exited with error code {}".format(hook_name, script['name'], e.cmd, e.returncode)
-                logger.debug(msg)
-                if e.stdout:
-                    logger.info(e.stdout.decode())
-                if e.stderr:
-                    logger.error(e.stderr.decode())
-                    logger.debug("=== STDERR ===")
-                    logger.debug(e.stderr)
-                raise RuntimeError(msg)
-
-    def _run_tool(self, cmd, args=[], quiet=False):
-        logger.debug("Running " + cmd)
-        logger.debug("args  : " + ' '.join(args))
-
-        capture_output = quiet and not (self.verbose or self.stdout or self.stderr)
+                estimate = self.history.estimate(self.name, _tool_name,
+                                                 self._history_key(), [phase])
+            except Exception as e:
+                logger.debug("Unable to read runtime history: {}".format(e))
+        self._progress = {'phase'    : phase,
+                          'start'    : time.time(),
+                          'duration' : estimate and estimate['duration'],
+                          'step'     : None}
         try:
-            cp = run([cmd] + args,
-		     cwd = self.work_root,
-		     stdin=subprocess.PIPE,
-                     stdout=self.stdout,
-                     stderr=self.stderr,
-		     capture_output=capture_output,
-		     check=True)
-        except FileNotFoundError:
-            _s = "Command '{}' not found. Make sure it is in $PATH".format(cmd)
-            raise RuntimeError(_s)
-        except subprocess.CalledProcessError as e:
-            _s = "'{}' exited with an error: {}".format(e.cmd, e.returncode)
-            logger.debug(_s)
-
-            if e.stdout:
-                logger.info(e.stdout.decode())
-            if e.stderr:
-                logger.error(e.stderr.decode())
-                logger.debug("=== STDERR ===")
-                logger.debug(e.stderr)
-            
-            raise RuntimeError(_s)
-        return cp.returncode, cp.stdout, cp.stderr
+            yield
+        finally:
+            self._progress = None
+
+    def _report_progress(self, stream_name, line, match):
+        """ Emit a progress event for a line that matched progress_patterns
+
+        The event has the core name, the backend, the phase ('build' or
+        'run'), the step from the last match with a step group, the
+        percentage (from the tool, or estimated from the runtime history),
+        the seconds elapsed since the start of the phase and the line, plus
+        any iteration or time groups of the match
+        """
+        _tool_name = self.__class__.__name__.lower()
+        groups = {k : v for k, v in match.groupdict().items() if v is not None}
+        progress = self._progress or {'phase' : None, 'start' : None,
+                                      'duration' : None, 'step' : None}
+        if 'step' in groups:
+            progress['step'] = groups['step'].strip()
+        elapsed = None if progress['start'] is None else time.time() - progress['start']
+        percent = None
+        if 'percent' in groups:
+            percent = float(groups['percent'])
+        elif progress['duration'] and elapsed is not None:
+            # Never report an estimate as done
+            percent = min(100.0 * elapsed / progress['duration'], 99.0)
+        event = OrderedDict([('core',    self.name),
+                             ('tool',    _tool_name),
+                             ('phase',   progress['phase']),
+                             ('step',    progress['step']),
+                             ('percent', percent),
+                             ('elapsed', elapsed),
+                             ('line',    line.rstrip('\r\n'))])
+        for key in ['iteration', 'time']:
+            if key in groups:
+                event[key] = groups[key]
+        trace.event('progress', cat=_tool_name, **event)
+        if self.progress_callback:
+            try:
+                self.progress_callback(event)
+            except Exception as e:
+                logger.warning("Progress callback failed: {}".format(e))
 
     def _filter_verilog_files(src_file):
         ft = src_file.file_type
@@ -415,7 +1301,7 @@ class Edatool(object):
         Returns a list of all files which were not added to the *.f file
         """
 
-        with open(output_file, 'w') as f:
+        with self._open_output(os.path.relpath(output_file, self.work_root)) as f:
             unused_files = []
             (src_files, incdirs) = self._get_fileset_files()
 
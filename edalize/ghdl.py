@@ -5,6 +5,7 @@
 import collections
 import logging
 import os.path
+from edalize.build_graph import BuildGraph
 from edalize.edatool import Edatool
 
 logger = logging.getLogger(__name__)
@@ -27,9 +28,16 @@ class Ghdl(Edatool):
                          'desc' : 'Options to use for the run (ghdl -r) phase'},
                         ]}
 
-    def configure_main(self):
+    def _analyze_setup(self):
+        """ Get the options and libraries of the analysis
+
+        Returns the --std option, the standard (e.g. 08), the analyze
+        options as a string, the top level libraries option, the top level
+        unit, the VHDL sources as a string and an OrderedDict of the files
+        of each library (None for the work library)
+        """
         (src_files, incdirs) = self._get_fileset_files()
-        analyze_options = self.tool_options.get('analyze_options', '')
+        analyze_options = list(self.tool_options.get('analyze_options', []))
 
         # Check of std=xx analyze option, this overyides the dynamic determination of vhdl standard
         import re
@@ -78,15 +86,12 @@ class Ghdl(Edatool):
             standard =  rx.match(stdarg[0]).group(1)
 
 
-        run_options = self.tool_options.get('run_options', [])
-
         analyze_options=' '.join(analyze_options)
 
         _vhdltypes = ("vhdlSource", "vhdlSource-87", "vhdlSource-93", "vhdlSource-2008")
 
         libraries = collections.OrderedDict()
         library_options = "--work={lib} --workdir=./{lib}"
-        ghdlimport = ""
         vhdl_sources = ""
 
         # GHDL doesn't support the dot notation used by other tools (e.g.
@@ -118,32 +123,69 @@ class Ghdl(Edatool):
                 _s = "{} has unknown file type '{}'"
                 logger.warning(_s.format(f.name, f.file_type))
 
-        ghdlimport = ""
-        make_libraries_directories = ""
-
-        for lib, files in libraries.items():
-            lib_opts = ""
+        for lib in libraries:
             if lib:
                 analyze_options += " -P./{}".format(lib)
-                make_libraries_directories += "\tmkdir -p {}\n".format(lib)
-                lib_opts = library_options.format(lib=lib)
-            ghdlimport += "\tghdl -i $(STD) $(ANALYZE_OPTIONS) {} {}\n".format(lib_opts, " ".join(files))
 
-        self.render_template(
+        return (stdarg, standard, analyze_options, top_libraries, top_unit,
+                vhdl_sources, libraries)
+
+    def configure_main(self):
+        (stdarg, standard, analyze_options, top_libraries, top_unit,
+         vhdl_sources, libraries) = self._analyze_setup()
+        run_options = self.tool_options.get('run_options', [])
+
+        graph = self.build_graph()
+        self._write_graph_makefile(self._render(
             'Makefile.j2',
-            'Makefile',
             {
                 'std' : ' '.join(stdarg),
                 'toplevel' : top_unit,
-                'vhdl_sources' : vhdl_sources,
-                'standard' : standard,
                 'analyze_options' : analyze_options,
                 'run_options' : ' '.join(run_options),
-                'make_libraries_directories' : make_libraries_directories,
-                'ghdlimport' : ghdlimport,
+                'libraries' : ' '.join(graph.steps[n].outputs[0] for n in graph.default),
                 'top_libraries': top_libraries
             }
-        )
+        ))
+
+    def build_graph(self):
+        (stdarg, standard, analyze_options, top_libraries, top_unit,
+         vhdl_sources, libraries) = self._analyze_setup()
+        graph = BuildGraph()
+        lib_dirs = [lib for lib in libraries if lib]
+        if lib_dirs:
+            graph.add('libraries', ['mkdir', '-p'] + lib_dirs,
+                      description = 'Creating libraries directories')
+        import_steps = []
+        for lib, files in libraries.items():
+            if lib:
+                lib_opts = ['--work=' + lib, '--workdir=./' + lib]
+                output = '{0}/{0}-obj{1}.cf'.format(lib, standard)
+            else:
+                lib_opts = []
+                output = 'work-obj{}.cf'.format(standard)
+            name = 'import-' + (lib or 'work')
+            graph.add(name,
+                      ['ghdl', '-i'] + stdarg + analyze_options.split() + lib_opts + files,
+                      inputs = files,
+                      outputs = [output],
+                      depends = ['libraries'] if lib_dirs else [],
+                      description = 'Importing VHDL files into library ' + (lib or 'work'))
+            import_steps.append(name)
+        graph.default = import_steps
+        return graph
+
+    def build_artifacts(self):
+        # The work libraries: the .cf files in work_root and the
+        # directories of named libraries
+        artifacts = sorted(f for f in os.listdir(self.work_root) if f.endswith('.cf'))
+        libraries = set(f.logical_name for f in self.fileset.src_files if f.logical_name)
+        if '.' in self.toplevel:
+            libraries.add(self.toplevel.split('.')[0])
+        for lib in sorted(libraries):
+            if os.path.isdir(os.path.join(self.work_root, lib)):
+                artifacts.append(lib)
+        return artifacts
 
     def run_main(self):
         cmd = 'make'
@@ -166,3 +208,25 @@ class Ghdl(Edatool):
                     extra_options += ' -g{}={}'.format(k,self._param_value_str(v,'"',bool_is_str=True))
             args.append(extra_options)
         self._run_tool(cmd, args)
+
+    def run_many_pre(self):
+        # The runs share the model that ghdl -m analyzes and elaborates
+        (stdarg, standard, analyze_options, top_libraries, top_unit,
+         vhdl_sources, libraries) = self._analyze_setup()
+        self._run_tool('ghdl', ['-m'] + stdarg + analyze_options.split() +
+                       top_libraries.split() + [top_unit])
+
+    def run_command(self, run_dir):
+        (stdarg, standard, analyze_options, top_libraries, top_unit,
+         vhdl_sources, libraries) = self._analyze_setup()
+        args = ['ghdl', '-r'] + stdarg + analyze_options.split() + top_libraries.split()
+        args += [top_unit] + self.tool_options.get('run_options', [])
+        for d in [self.vlogparam, self.generic]:
+            for k, v in d.items():
+                args.append('-g{}={}'.format(k, self._param_value_str(v, bool_is_str=True)))
+        return args
+
+    def run_links(self):
+        # The libraries are found relative to the working directory, as is
+        # the executable that ghdl -m links with the GCC and LLVM backends
+        return self.build_artifacts() + [self.toplevel.split('.')[-1]]
@@ -0,0 +1,179 @@
+# Copyright edalize contributors
+# Licensed under the 2-Clause BSD License, see LICENSE for details.
+# SPDX-License-Identifier: BSD-2-Clause
+
+""" Runtime history
+
+An optional SQLite database with the duration, peak memory use and outcome
+of every configure, build and run phase. Entries are keyed by the core
+name, the backend and a fingerprint of the tool options and parameter
+values, so that the history of a job can be found again the next time it
+runs.
+
+The history is off by default. Setting the EDALIZE_HISTORY environment
+variable to the path of a database file enables it for all backends, or it
+can be set per backend::
+
+    from edalize.history import History
+
+    backend.history = History('history.sqlite')
+
+edalize.batch uses it to start the longest jobs first and to leave enough
+memory for the jobs that are running. runtime_regressions lists the phases
+that have recently become slower.
+"""
+
+import logging
+import os
+import sqlite3
+import statistics
+import threading
+from contextlib import closing
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS phases (
+    id          INTEGER PRIMARY KEY,
+    core        TEXT NOT NULL,
+    backend     TEXT NOT NULL,
+    fingerprint TEXT,
+    phase       TEXT NOT NULL,
+    start       REAL NOT NULL,
+    duration    REAL NOT NULL,
+    max_rss     INTEGER,
+    status      TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS phases_job ON phases (core, backend, phase, start);
+"""
+
+class History(object):
+    """ A runtime history database at path
+
+    Each call opens its own connection, so a History can be shared between
+    threads, and several processes can write to the same database
+    """
+
+    # Number of recent runs that estimates are based on
+    WINDOW = 5
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as db:
+            db.executescript(_SCHEMA)
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        db.row_factory = sqlite3.Row
+        return closing(db)
+
+    def record(self, core, backend, fingerprint, phase, start, duration,
+               max_rss=None, status='passed'):
+        """ Add the result of one phase """
+        with self._lock, self._connect() as db, db:
+            db.execute("INSERT INTO phases (core, backend, fingerprint, phase, start, duration, max_rss, status) "
+                       "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                       (core, backend, fingerprint, phase, start, duration, max_rss, status))
+
+    def entries(self, core=None, backend=None, phase=None, fingerprint=None):
+        """ Get the recorded phases, oldest first, as a list of dicts """
+        where = []
+        values = []
+        for column, value in [('core', core), ('backend', backend),
+                              ('phase', phase), ('fingerprint', fingerprint)]:
+            if value is not None:
+                where.append(column + ' = ?')
+                values.append(value)
+        sql = "SELECT * FROM phases"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        with self._connect() as db:
+            return [dict(row) for row in db.execute(sql + " ORDER BY start", values)]
+
+    def estimate(self, core, backend, fingerprint=None, phases=('configure', 'build', 'run')):
+        """ Estimate the duration and peak memory use of a job
+
+        Uses the median duration of the last WINDOW successful runs of each
+        phase and the highest peak memory use among them. Runs with the same
+        fingerprint are preferred over other runs of the core with the same
+        backend. Returns a dict with duration in seconds and max_rss in
+        bytes (None if unknown), or None if there is no history
+        """
+        duration = 0
+        max_rss = None
+        found = False
+        for phase in phases:
+            rows = []
+            if fingerprint is not None:
+                rows = self._recent(core, backend, phase, fingerprint)
+            if not rows:
+                rows = self._recent(core, backend, phase)
+            if not rows:
+                continue
+            found = True
+            duration += statistics.median(r['duration'] for r in rows)
+            for r in rows:
+                if r['max_rss'] is not None:
+                    max_rss = max(max_rss or 0, r['max_rss'])
+        if not found:
+            return None
+        return {'duration' : duration, 'max_rss' : max_rss}
+
+    def _recent(self, core, backend, phase, fingerprint=None):
+        sql = "SELECT duration, max_rss FROM phases WHERE core = ? AND backend = ? AND phase = ? AND status = 'passed'"
+        values = [core, backend, phase]
+        if fingerprint is not None:
+            sql += " AND fingerprint = ?"
+            values.append(fingerprint)
+        sql += " ORDER BY start DESC LIMIT ?"
+        values.append(self.WINDOW)
+        with self._connect() as db:
+            return [dict(row) for row in db.execute(sql, values)]
+
+    def runtime_regressions(self, threshold=1.5, window=None, since=None):
+        """ Find phases that have become slower
+
+        For each core, backend and phase, compares the median duration of
+        the last window successful runs (default: WINDOW) with the median of
+        the runs before them. since limits the history to runs started
+        after that time. Returns a list of dicts with core, backend, phase,
+        baseline and recent durations and their ratio for the phases where
+        the ratio is at least threshold, largest ratio first
+        """
+        window = window or self.WINDOW
+        sql = "SELECT core, backend, phase, duration FROM phases WHERE status = 'passed'"
+        values = []
+        if since is not None:
+            sql += " AND start >= ?"
+            values.append(since)
+        series = {}
+        with self._connect() as db:
+            for row in db.execute(sql + " ORDER BY start", values):
+                series.setdefault((row['core'], row['backend'], row['phase']), []).append(row['duration'])
+
+        regressions = []
+        for (core, backend, phase), durations in series.items():
+            if len(durations) <= window:
+                continue
+            baseline = statistics.median(durations[:-window])
+            recent = statistics.median(durations[-window:])
+            if baseline > 0 and recent / baseline >= threshold:
+                regressions.append({'core'     : core,
+                                    'backend'  : backend,
+                                    'phase'    : phase,
+                                    'baseline' : baseline,
+                                    'recent'   : recent,
+                                    'ratio'    : recent / baseline})
+        return sorted(regressions, key=lambda r: -r['ratio'])
+
+def default_history():
+    """ Get the History configured by EDALIZE_HISTORY, or None """
+    path = os.environ.get('EDALIZE_HISTORY')
+    if not path:
+        return None
+    try:
+        return History(path)
+    except sqlite3.Error as e:
+        logger.warning("Unable to open runtime history {}: {}".format(path, e))
+        return None
@@ -5,33 +5,19 @@
 import os
 import logging
 
+from edalize.build_graph import BuildGraph
 from edalize.edatool import Edatool
 
 logger = logging.getLogger(__name__)
 
 MAKEFILE_TEMPLATE = """
-all: $(VPI_MODULES) $(TARGET)
-
-$(TARGET):
-	iverilog -s$(TOPLEVEL) -c $(TARGET).scr -o $@ $(IVERILOG_OPTIONS)
-
 run: $(VPI_MODULES) $(TARGET)
 	vvp -n -M. -l icarus.log $(patsubst %.vpi,-m%,$(VPI_MODULES)) $(TARGET) -fst $(EXTRA_OPTIONS)
 
 clean:
 	$(RM) $(VPI_MODULES) $(TARGET)
-"""
-
-VPI_MAKE_SECTION = """
-{name}_LIBS := {libs}
-{name}_INCS := {incs}
-{name}_SRCS := {srcs}
-
-{name}.vpi: $({name}_SRCS)
-	iverilog-vpi --name={name} $({name}_LIBS) $({name}_INCS) $?
 
-clean_{name}:
-	$(RM) {name}.vpi
+.PHONY: run clean
 """
 
 class Icarus(Edatool):
@@ -53,7 +39,7 @@ class Icarus(Edatool):
                         ]}
 
     def configure_main(self):
-        f = open(os.path.join(self.work_root, self.name+'.scr'),'w')
+        f = self._open_output(self.name+'.scr')
 
         (src_files, incdirs) = self._get_fileset_files()
         for key, value in self.vlogdefine.items():
@@ -65,7 +51,7 @@ class Icarus(Edatool):
             f.write("+incdir+" + id+'\n')
         timescale = self.tool_options.get('timescale')
         if timescale:
-            with open(os.path.join(self.work_root, 'timescale.v'), 'w') as tsfile:
+            with self._open_output('timescale.v') as tsfile:
                 tsfile.write("`timescale {}\n".format(timescale))
             f.write('timescale.v\n')
 
@@ -90,30 +76,41 @@ class Icarus(Edatool):
 
         f.close()
 
-        with open(os.path.join(self.work_root, 'Makefile'), 'w') as f:
-
-            f.write("TARGET           := {}\n".format(self.name))
-            _vpi_modules = ' '.join([m['name']+'.vpi' for m in self.vpi_modules])
-            if _vpi_modules:
-                f.write("VPI_MODULES      := {}\n".format(_vpi_modules))
-            f.write("TOPLEVEL         := {}\n".format(self.toplevel))
-            f.write("IVERILOG_OPTIONS := {}\n".format(' '.join(self.tool_options.get('iverilog_options', []))))
-            if self.plusarg:
-                plusargs = []
-                for key, value in self.plusarg.items():
-                    plusargs += ['+{}={}'.format(key, self._param_value_str(value))]
-                f.write("EXTRA_OPTIONS    ?= {}\n".format(' '.join(plusargs)))
-
-            f.write(MAKEFILE_TEMPLATE)
-
-            for vpi_module in self.vpi_modules:
-                _incs = ['-I' + s for s in vpi_module['include_dirs']]
-                _libs = ['-l'+l for l in vpi_module['libs']]
-                _srcs = vpi_module['src_files']
-                f.write(VPI_MAKE_SECTION.format(name = vpi_module['name'],
-                                                libs = ' '.join(_libs),
-                                                incs = ' '.join(_incs),
-                                                srcs = ' '.join(_srcs)))
+        # The build rules come from the build graph
+        extra = "TARGET           := {}\n".format(self.name)
+        _vpi_modules = ' '.join([m['name']+'.vpi' for m in self.vpi_modules])
+        if _vpi_modules:
+            extra += "VPI_MODULES      := {}\n".format(_vpi_modules)
+        if self.plusarg:
+            plusargs = []
+            for key, value in self.plusarg.items():
+                plusargs += ['+{}={}'.format(key, self._param_value_str(value))]
+            extra += "EXTRA_OPTIONS    ?= {}\n".format(' '.join(plusargs))
+        self._write_graph_makefile(extra + MAKEFILE_TEMPLATE)
+
+    def build_graph(self):
+        graph = BuildGraph()
+        for vpi_module in self.vpi_modules:
+            _name = vpi_module['name']
+            graph.add(_name + '.vpi',
+                      ['iverilog-vpi', '--name=' + _name] +
+                      ['-l' + l for l in vpi_module['libs']] +
+                      ['-I' + s for s in vpi_module['include_dirs']] +
+                      vpi_module['src_files'],
+                      inputs = vpi_module['src_files'],
+                      outputs = [_name + '.vpi'],
+                      description = 'Building VPI module ' + _name)
+        inputs = [self.name + '.scr'] + [f['name'] for f in self.files
+                                         if f.get('file_type', '').startswith(('verilogSource', 'systemVerilogSource'))]
+        if self.tool_options.get('timescale'):
+            inputs.append('timescale.v')
+        graph.add('compile',
+                  ['iverilog', '-s' + self.toplevel, '-c', self.name + '.scr',
+                   '-o', self.name] + self.tool_options.get('iverilog_options', []),
+                  inputs = inputs,
+                  outputs = [self.name],
+                  description = 'Compiling simulation model')
+        return graph
 
     def run_main(self):
         args = ['run']
@@ -126,3 +123,12 @@ class Icarus(Edatool):
             args.append('EXTRA_OPTIONS='+' '.join(plusargs))
 
         self._run_tool('make', args)
+
+    def run_command(self, run_dir):
+        work_root = os.path.abspath(self.work_root)
+        args = ['vvp', '-n', '-M' + work_root, '-l', 'icarus.log']
+        args += ['-m' + v['name'] for v in self.vpi_modules]
+        args += [os.path.join(work_root, self.name), '-fst']
+        for key, value in self.plusarg.items():
+            args.append('+{}={}'.format(key, self._param_value_str(value)))
+        return args
@@ -4,7 +4,7 @@
 
 import os.path
 
-from edalize.edatool import Edatool
+from edalize.edatool import Edatool, NEXTPNR_PROGRESS_PATTERNS
 from edalize.yosys import Yosys
 from importlib import import_module
 
@@ -12,6 +12,8 @@ class Icestorm(Edatool):
 
     argtypes = ['vlogdefine', 'vlogparam']
 
+    progress_patterns = NEXTPNR_PROGRESS_PATTERNS
+
     @classmethod
     def get_doc(cls, api_ver):
         if api_ver == 0:
@@ -45,9 +47,7 @@ class Icestorm(Edatool):
                     'members' : combined_members,
                     'lists' : combined_lists}
 
-    def configure_main(self):
-        # Write yosys script file
-        (src_files, incdirs) = self._get_fileset_files()
+    def _yosys(self):
         yosys_synth_options = self.tool_options.get('yosys_synth_options', '')
         yosys_edam = {
                 'files'         : self.files,
@@ -62,39 +62,66 @@ class Icestorm(Edatool):
                                 }
                 }
 
-        yosys = getattr(import_module("edalize.yosys"), 'Yosys')(yosys_edam, self.work_root)
-        yosys.configure()
-
-        pcf_files = []
-        for f in src_files:
-            if f.file_type == 'PCF':
-                pcf_files.append(f.name)
-            elif f.file_type == 'user':
-                pass
-
-        if not pcf_files:
-            pcf_files = ['empty.pcf']
-            with open(os.path.join(self.work_root, pcf_files[0]), 'a'):
-                os.utime(os.path.join(self.work_root, pcf_files[0]), None)
-        elif len(pcf_files) > 1:
+        return getattr(import_module("edalize.yosys"), 'Yosys')(yosys_edam, self.work_root)
+
+    def _pcf_file(self):
+        pcf_files = [f.name for f in self.fileset.files_of_type('PCF')]
+        if len(pcf_files) > 1:
             raise RuntimeError("Icestorm backend supports only one PCF file. Found {}".format(', '.join(pcf_files)))
+        return pcf_files[0] if pcf_files else 'empty.pcf'
 
+    def _pnr(self):
         pnr = self.tool_options.get('pnr', 'next')
-        part = self.tool_options.get('part', None)
         if not pnr in ['arachne', 'next', 'none']:
             raise RuntimeError("Invalid pnr option '{}'. Valid values are 'arachne' for Arachne-pnr, 'next' for nextpnr or 'none' to only perform synthesis".format(pnr))
+        return pnr
+
+    def configure_main(self):
+        # Write yosys script file
+        self._configure_subtool(self._yosys())
+
+        pcf_file = self._pcf_file()
+        if pcf_file == 'empty.pcf':
+            with open(os.path.join(self.work_root, pcf_file), 'a'):
+                os.utime(os.path.join(self.work_root, pcf_file), None)
+
+        pnr = self._pnr()
+        part = self.tool_options.get('part', None)
         # Write Makefile
-        arachne_pnr_options = self.tool_options.get('arachne_pnr_options', [])
         nextpnr_options     = self.tool_options.get('nextpnr_options', [])
         template_vars = {
             'name'                : self.name,
-            'pcf_file'            : pcf_files[0],
+            'pcf_file'            : pcf_file,
             'pnr'                 : pnr,
-            'arachne_pnr_options' : arachne_pnr_options,
             'nextpnr_options'     : nextpnr_options,
-            'default_target'      : 'json' if pnr == 'none' else 'bin',
             'device'              : part,
         }
-        self.render_template('icestorm-makefile.j2',
-                             'Makefile',
-                             template_vars)
+        self._write_graph_makefile(self._render('icestorm-makefile.j2', template_vars))
+
+    def build_graph(self):
+        graph = self._yosys().build_graph()
+        pnr = self._pnr()
+        if pnr == 'none':
+            return graph
+        pcf_file = self._pcf_file()
+        asc = '{}_{}.asc'.format(self.name, pnr)
+        if pnr == 'arachne':
+            graph.add('pnr',
+                      ['arachne-pnr'] + self.tool_options.get('arachne_pnr_options', []) +
+                      ['-q', '-p', pcf_file, self.name + '.blif', '-o', asc],
+                      inputs = [pcf_file, self.name + '.blif'],
+                      outputs = [asc],
+                      description = 'Place and route with arachne-pnr')
+        else:
+            graph.add('pnr',
+                      ['nextpnr-ice40', '-l', 'next.log'] + self.tool_options.get('nextpnr_options', []) +
+                      ['--pcf', pcf_file, '--json', self.name + '.json', '--asc', asc],
+                      inputs = [pcf_file, self.name + '.json'],
+                      outputs = [asc],
+                      description = 'Place and route with nextpnr')
+        graph.add('bitstream',
+                  ['icepack', asc, self.name + '.bin'],
+                  inputs = [asc],
+                  outputs = [self.name + '.bin'],
+                  description = 'Generating bitstream')
+        return graph
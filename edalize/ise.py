@@ -85,16 +85,16 @@ quit
             if not i in self.tool_options:
                 raise RuntimeError("Missing required option '{}'".format(i))
         self._write_tcl_file()
-        with open(os.path.join(self.work_root, 'Makefile'),'w') as f:
+        with self._open_output('Makefile') as f:
             f.write(self.MAKEFILE_TEMPLATE)
-        with open(os.path.join(self.work_root, 'config.mk'),'w') as f:
+        with self._open_output('config.mk') as f:
             f.write("NAME     := {}\n".format(self.name))
             f.write("TOPLEVEL := {}\n".format(self.toplevel))
-        with open(os.path.join(self.work_root, self.name+'_run.tcl'),'w') as f:
+        with self._open_output(self.name+'_run.tcl') as f:
             f.write(self.TCL_RUN_FILE_TEMPLATE)
 
     def _write_tcl_file(self):
-        tcl_file = open(os.path.join(self.work_root, self.name+'.tcl'),'w')
+        tcl_file = self._open_output(self.name+'.tcl')
 
         tcl_file.write(self.TCL_FILE_TEMPLATE.format(
             design               = self.name,
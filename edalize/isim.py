@@ -66,7 +66,7 @@ quit
             modules = [m['name'] for m in self.vpi_modules]
             logger.error('VPI modules not supported by Isim: %s' % ', '.join(modules))
 
-        with open(os.path.join(self.work_root, self.name+'.prj'),'w') as f:
+        with self._open_output(self.name+'.prj') as f:
             (src_files, self.incdirs) = self._get_fileset_files()
 
             for src_file in src_files:
@@ -96,13 +96,13 @@ quit
                 if prefix:
                     f.write('{} work {}{}\n'.format(prefix, logical_name, src_file.name))
 
-        with open(os.path.join(self.work_root, 'run_'+self.name+'.tcl'),'w') as f:
+        with self._open_output('run_'+self.name+'.tcl') as f:
             f.write(self.RUN_TCL_TEMPLATE)
 
-        with open(os.path.join(self.work_root, 'Makefile'),'w') as f:
+        with self._open_output('Makefile') as f:
             f.write(self.MAKEFILE_TEMPLATE)
 
-        with open(os.path.join(self.work_root, 'config.mk'),'w') as f:
+        with self._open_output('config.mk') as f:
             vlog_defines  = ' '.join(['--define {}={}'.format(k, self._param_value_str(v)) for k,v, in self.vlogdefine.items()])
             vlog_includes = ' '.join(['-i '+k for k in self.incdirs])
             vlog_params   = ' '.join(['--generic_top {}={}'.format(k, self._param_value_str(v)) for k,v, in self.vlogparam.items()])
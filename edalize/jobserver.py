@@ -0,0 +1,260 @@
+# Copyright edalize contributors
+# Licensed under the 2-Clause BSD License, see LICENSE for details.
+# SPDX-License-Identifier: BSD-2-Clause
+
+""" GNU make jobserver
+
+A jobserver bounds the total number of jobs run by a tree of processes. It
+is a pipe holding one token (a byte) per job slot beyond the first. Each
+process owns one implicit slot and has to read a token from the pipe before
+starting another job, and write it back when the job is done. GNU make
+finds the pipe through the --jobserver-auth option in MAKEFLAGS.
+
+When edalize runs below a make that has a jobserver (e.g. from a recipe
+line starting with +), it attaches to that jobserver. Otherwise setting the
+EDALIZE_JOBS environment variable to a number of jobs makes edalize use a
+host-wide jobserver: a named fifo in the edalize cache directory, shared by
+all edalize processes of the user. The first of them fills it with tokens,
+so its EDALIZE_JOBS sets the size of the pool. All make invocations of the
+backends then share the job slots, as do the steps of the python build
+runner and the runs of run_many. Worker processes forked by edalize, like
+those of run_sweep, inherit it.
+
+Commands find a fifo jobserver through --jobserver-auth=fifo:PATH if GNU
+make understands it (version 4.4 or later). Otherwise they get the file
+descriptor of the open fifo.
+"""
+
+import logging
+import os
+import re
+import stat
+import sys
+import threading
+from contextlib import contextmanager
+
+from edalize import get_cache_dir
+from edalize.version_probe import get_version_probe
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_JOBSERVER_RE = re.compile(r'--jobserver-(?:auth|fds)=(\S+)')
+
+class Jobserver(object):
+    """ A jobserver pipe, created by edalize or inherited from make
+
+    Use create() or from_makeflags() to get one
+    """
+
+    def __init__(self, read_fd=None, write_fd=None, fifo=None, jobs=None):
+        self.read_fd = read_fd
+        self.write_fd = write_fd
+        self.fifo = fifo
+        self.jobs = jobs
+        self._implicit = threading.Lock()
+        self._fifo_auth = None
+        # Held while a shared fifo is in use. See create
+        self._users_lock = None
+
+    @classmethod
+    def create(cls, jobs, fifo=None):
+        """ Create a jobserver with jobs slots
+
+        Without fifo, the jobserver is an anonymous pipe that only this
+        process and its children can use. With fifo, it is a named fifo at
+        that path, which all processes that use the same path share. The
+        first of them fills it with tokens, later ones join the pool.
+        """
+        if jobs < 1:
+            raise ValueError("A jobserver needs at least one job slot")
+        if fifo is None:
+            (read_fd, write_fd) = os.pipe()
+            os.set_inheritable(read_fd, True)
+            os.set_inheritable(write_fd, True)
+            os.write(write_fd, b'+' * (jobs - 1))
+            return cls(read_fd, write_fd, jobs=jobs)
+
+        try:
+            os.mkfifo(fifo, 0o600)
+        except FileExistsError:
+            pass
+        # Tokens in a fifo are lost when nobody has it open, so it is opened
+        # before checking for other users
+        fd = os.open(fifo, os.O_RDWR)
+        os.set_inheritable(fd, True)
+        jobserver = cls(fd, fd, fifo=fifo, jobs=jobs)
+        # Users hold a shared lock. Without other users, the pool is
+        # (re)filled, dropping tokens of processes that died holding them
+        jobserver._users_lock = open(fifo + '.lock', 'a')
+        with open(fifo + '.init', 'a') as init:
+            fcntl.flock(init, fcntl.LOCK_EX)
+            try:
+                fcntl.flock(jobserver._users_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                _drain(fd)
+                os.write(fd, b'+' * (jobs - 1))
+            except BlockingIOError:
+                pass
+            fcntl.flock(jobserver._users_lock, fcntl.LOCK_SH)
+        return jobserver
+
+    @classmethod
+    def from_makeflags(cls, makeflags):
+        """ Attach to the jobserver described by a MAKEFLAGS value
+
+        Returns None if makeflags has no jobserver or the jobserver is not
+        accessible from this process
+        """
+        m = _JOBSERVER_RE.search(makeflags or '')
+        if not m:
+            return None
+        auth = m.group(1)
+        j = re.search(r'(?:^|\s)-j(\d+)', makeflags)
+        jobs = int(j.group(1)) if j else None
+        if auth.startswith('fifo:'):
+            fifo = auth[5:]
+            try:
+                fd = os.open(fifo, os.O_RDWR)
+            except OSError as e:
+                logger.warning("Unable to open jobserver fifo {}: {}".format(fifo, e))
+                return None
+            return cls(fd, fd, fifo=fifo, jobs=jobs)
+        # make closes the pipe for recipes without +, after which the file
+        # descriptors can be reused for anything else
+        try:
+            (read_fd, write_fd) = (int(x) for x in auth.split(','))
+            if read_fd < 0:
+                return None
+            is_pipe = stat.S_ISFIFO(os.fstat(read_fd).st_mode) and \
+                      stat.S_ISFIFO(os.fstat(write_fd).st_mode)
+        except (ValueError, OSError):
+            is_pipe = False
+        if not is_pipe:
+            logger.warning("The make jobserver is not available. Run edalize from a make recipe starting with + to use it")
+            return None
+        return cls(read_fd, write_fd, jobs=jobs)
+
+    @property
+    def fds(self):
+        """ File descriptors that child processes need to inherit """
+        if self._use_fifo_auth():
+            return ()
+        return tuple(sorted({self.read_fd, self.write_fd}))
+
+    def _use_fifo_auth(self):
+        if not self.fifo:
+            return False
+        if self._fifo_auth is None:
+            self._fifo_auth = _make_supports_fifo()
+        return self._fifo_auth
+
+    def makeflags(self, makeflags=''):
+        """ Get makeflags with the jobserver options of this jobserver
+
+        Job counts and jobserver options already in makeflags are replaced,
+        so that make doesn't start a separate jobserver
+        """
+        words = [w for w in (makeflags or '').split()
+                 if not re.match(r'-j\d*$', w) and not _JOBSERVER_RE.match(w)]
+        if self.jobs is not None:
+            words.append('-j{}'.format(self.jobs))
+        if self._use_fifo_auth():
+            words.append('--jobserver-auth=fifo:' + self.fifo)
+        else:
+            words.append('--jobserver-auth={},{}'.format(self.read_fd, self.write_fd))
+        return ' '.join(words)
+
+    def acquire(self):
+        """ Wait for a job slot. Returns the token to pass to release """
+        if self._implicit.acquire(blocking=False):
+            return None
+        while True:
+            try:
+                return os.read(self.read_fd, 1)
+            except InterruptedError:
+                continue
+
+    def release(self, token):
+        """ Give back a job slot from acquire """
+        if token is None:
+            self._implicit.release()
+        else:
+            os.write(self.write_fd, token)
+
+    @contextmanager
+    def slot(self):
+        """ Hold a job slot during a with block """
+        token = self.acquire()
+        try:
+            yield
+        finally:
+            self.release(token)
+
+def _drain(fd):
+    # Read everything that is in a pipe without blocking
+    os.set_blocking(fd, False)
+    try:
+        while os.read(fd, 4096):
+            pass
+    except BlockingIOError:
+        pass
+    finally:
+        os.set_blocking(fd, True)
+
+def _make_supports_fifo():
+    # --jobserver-auth=fifo:PATH is new in GNU make 4.4
+    output = get_version_probe().output(['make', '--version'])
+    m = re.search(r'GNU Make (\d+)\.(\d+)', output or '')
+    return bool(m) and (int(m.group(1)), int(m.group(2))) >= (4, 4)
+
+_jobserver = None
+_initialized = False
+_lock = threading.Lock()
+
+def get_jobserver():
+    """ Get the jobserver of this process, or None
+
+    On first use, attaches to the jobserver in MAKEFLAGS, or creates one
+    with EDALIZE_JOBS slots
+    """
+    global _jobserver, _initialized
+    with _lock:
+        if not _initialized:
+            _initialized = True
+            if sys.platform != 'win32':
+                _jobserver = _default_jobserver()
+        return _jobserver
+
+def _default_jobserver():
+    jobserver = Jobserver.from_makeflags(os.environ.get('MAKEFLAGS'))
+    if jobserver:
+        logger.debug("Using the make jobserver from MAKEFLAGS")
+        return jobserver
+    jobs = os.environ.get('EDALIZE_JOBS')
+    if not jobs:
+        return None
+    try:
+        jobs = int(jobs)
+        if jobs < 1:
+            raise ValueError
+    except ValueError:
+        logger.warning("Invalid EDALIZE_JOBS '{}'".format(jobs))
+        return None
+    directory = get_cache_dir('jobserver')
+    if directory and fcntl:
+        try:
+            return Jobserver.create(jobs, os.path.join(directory, 'jobserver.fifo'))
+        except OSError as e:
+            logger.warning("Unable to use the host-wide jobserver: {}".format(e))
+    return Jobserver.create(jobs)
+
+def set_jobserver(jobserver):
+    """ Use jobserver (or no jobserver, if None) for all backends """
+    global _jobserver, _initialized
+    with _lock:
+        _initialized = True
+        _jobserver = jobserver
@@ -113,12 +113,12 @@ class Libero(Edatool):
         if not "hdl" in self.tool_options:
             verilogFiles = 0
             VHDLFiles = 0
-            for f in src_files:
-                t = f.file_type.split('-')[0]
+            for file_type, files in self.fileset.by_type.items():
+                t = file_type.split('-')[0]
                 if t == "verilogSource" or t == "systemVerilogSource":
-                    verilogFiles += 1
+                    verilogFiles += len(files)
                 elif t == "vhdlSource":
-                    VHDLFiles += 1
+                    VHDLFiles += len(files)
             if verilogFiles >= VHDLFiles:
                 self.tool_options["hdl"] = "VERILOG"
             else:
@@ -0,0 +1,180 @@
+# Copyright edalize contributors
+# Licensed under the 2-Clause BSD License, see LICENSE for details.
+# SPDX-License-Identifier: BSD-2-Clause
+
+""" License pools
+
+Commercial tools check out floating licenses, and starting more of them than
+there are licenses makes the extra ones fail, often after minutes of setup.
+License pools limit how many builds and runs of each tool run at the same
+time. They are configured in $EDALIZE_LICENSES, or in
+$XDG_CONFIG_HOME/edalize/licenses.ini (~/.config/edalize/licenses.ini) if
+unset::
+
+    [pools]
+    xilinx = 4
+    siemens = 8
+
+    [tools]
+    vivado = xilinx
+    modelsim = siemens
+    questa = siemens
+
+    [retry]
+    attempts = 5
+    backoff = 30
+    max_backoff = 600
+
+[pools] gives the number of licenses in each pool and [tools] the pool that
+each backend takes its licenses from. The build and run phases of a backend
+with a pool each hold one license token while the tool runs. Tokens are lock
+files in the edalize cache directory, so the limits hold for all edalize
+processes on the host.
+
+Backends list the messages of their tools that mean that a license could
+not be checked out in license_errors. When a tool fails with one of them,
+the phase gives back its token, waits and tries again, up to attempts
+times. The wait starts at backoff seconds and doubles after each attempt,
+up to max_backoff seconds.
+"""
+
+import configparser
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from edalize import get_cache_dir
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+class LicensePool(object):
+    """ A pool of license tokens
+
+    With a lock_dir, the tokens are lock files in it, shared with other
+    processes. Otherwise they are only shared within the process
+    """
+
+    # Seconds between attempts to get a token from another process
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, name, tokens, lock_dir=None):
+        self.name = name
+        self.tokens = tokens
+        self.lock_dir = lock_dir if fcntl else None
+        self._semaphore = threading.BoundedSemaphore(tokens)
+
+    def acquire(self, blocking=True):
+        """ Get a token, or None if blocking is False and there is none free """
+        if self.lock_dir is None:
+            if self._semaphore.acquire(blocking):
+                return True
+            return None
+        while True:
+            for i in range(self.tokens):
+                path = os.path.join(self.lock_dir, '{}.{}.lock'.format(self.name, i))
+                f = open(path, 'a')
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return f
+                except OSError:
+                    f.close()
+            if not blocking:
+                return None
+            time.sleep(self.POLL_INTERVAL)
+
+    def release(self, token):
+        if self.lock_dir is None:
+            self._semaphore.release()
+        else:
+            token.close()
+
+    def available(self):
+        """ Check if a token is free now """
+        token = self.acquire(blocking=False)
+        if token is None:
+            return False
+        self.release(token)
+        return True
+
+    @contextmanager
+    def slot(self):
+        """ Hold a token while the with block runs """
+        token = self.acquire()
+        try:
+            yield
+        finally:
+            self.release(token)
+
+class LicensePools(object):
+    """ License pools and the tools that use them
+
+    pools maps pool names to their number of tokens and tools maps backend
+    names to pool names
+    """
+
+    def __init__(self, pools={}, tools={}, attempts=5, backoff=30, max_backoff=600,
+                 lock_dir=None):
+        self.pools = {name : LicensePool(name, tokens, lock_dir)
+                      for name, tokens in pools.items()}
+        self.tools = {}
+        for tool, pool in tools.items():
+            if not pool in self.pools:
+                raise RuntimeError("Unknown license pool '{}' for tool '{}'".format(pool, tool))
+            self.tools[tool] = pool
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    @classmethod
+    def load(cls, path, lock_dir=None):
+        """ Read license pools from an INI file """
+        config = configparser.ConfigParser()
+        try:
+            with open(path) as f:
+                config.read_file(f)
+            pools = {name : config.getint('pools', name)
+                     for name in config.options('pools')} if config.has_section('pools') else {}
+            tools = dict(config.items('tools')) if config.has_section('tools') else {}
+            return cls(pools, tools,
+                       attempts    = config.getint('retry', 'attempts', fallback=5),
+                       backoff     = config.getfloat('retry', 'backoff', fallback=30),
+                       max_backoff = config.getfloat('retry', 'max_backoff', fallback=600),
+                       lock_dir    = lock_dir)
+        except (configparser.Error, ValueError) as e:
+            raise RuntimeError("Invalid license configuration {}: {}".format(path, e))
+
+    def pool(self, tool):
+        """ Get the LicensePool of a backend, or None """
+        name = self.tools.get(tool)
+        return self.pools[name] if name else None
+
+    def delay(self, attempt):
+        """ Seconds to wait before the retry after attempt (from 0) failed """
+        return min(self.backoff * 2 ** attempt, self.max_backoff)
+
+_license_pools = {}
+_license_pools_lock = threading.Lock()
+
+def default_license_pools():
+    """ Get the LicensePools from the license configuration file, or None """
+    path = os.environ.get('EDALIZE_LICENSES')
+    if path is None:
+        xdg_config_home = os.environ.get('XDG_CONFIG_HOME') or \
+            os.path.join(os.path.expanduser('~'), '.config')
+        path = os.path.join(xdg_config_home, 'edalize', 'licenses.ini')
+        if not os.path.exists(path):
+            return None
+    if not path:
+        return None
+    # Shared by all backends, so that the tokens of the process are too
+    with _license_pools_lock:
+        if not path in _license_pools:
+            _license_pools[path] = LicensePools.load(path, get_cache_dir('licenses'))
+        return _license_pools[path]
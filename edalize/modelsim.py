@@ -9,6 +9,9 @@ from edalize.edatool import Edatool
 
 logger = logging.getLogger(__name__)
 
+# Runs the simulation and exits with the test status
+RUN_DO = "run -all; quit -code [expr [coverage attribute -name TESTSTATUS -concise] >= 2 ? [coverage attribute -name TESTSTATUS -concise] : 0]; exit"
+
 MAKE_HEADER ="""#Generated by Edalize
 ifndef MODEL_TECH
 $(error Environment variable MODEL_TECH was not found. It should be set to <modelsim install path>/bin)
@@ -44,7 +47,7 @@ EXTRA_OPTIONS ?= $(VSIM_OPTIONS) $(addprefix -g,$(PARAMETERS)) $(addprefix +,$(P
 all: work $(VPI_MODULES)
 
 run: work $(VPI_MODULES)
-	$(VSIM) -do "run -all; quit -code [expr [coverage attribute -name TESTSTATUS -concise] >= 2 ? [coverage attribute -name TESTSTATUS -concise] : 0]; exit" -c $(addprefix -pli ,$(VPI_MODULES)) $(EXTRA_OPTIONS) $(TOPLEVEL)
+	$(VSIM) -do "{run_do}" -c $(addprefix -pli ,$(VPI_MODULES)) $(EXTRA_OPTIONS) $(TOPLEVEL)
 
 run-gui: work $(VPI_MODULES)
 	$(VSIM) -gui $(addprefix -pli ,$(VPI_MODULES)) $(EXTRA_OPTIONS) $(TOPLEVEL)
@@ -73,6 +76,14 @@ class Modelsim(Edatool):
 
     argtypes = ['plusarg', 'vlogdefine', 'vlogparam', 'generic']
 
+    license_errors = [r'Unable to checkout a license',
+                      r'Failure to obtain a \w+ simulation license',
+                      r'FLEXnet Licensing error']
+
+    fatal_errors = [r'^(?:# )?\*\* Fatal']
+
+    progress_patterns = [r'^# (?:KERNEL: )?Time: (?P<time>\d+(?:\.\d+)? ?[munpf]?s)']
+
     @classmethod
     def get_doc(cls, api_ver):
         if api_ver == 0:
@@ -90,7 +101,7 @@ class Modelsim(Edatool):
                         ]}
 
     def _write_build_rtl_tcl_file(self, tcl_main):
-        tcl_build_rtl  = open(os.path.join(self.work_root, "edalize_build_rtl.tcl"), 'w')
+        tcl_build_rtl  = self._open_output("edalize_build_rtl.tcl")
 
         (src_files, incdirs) = self._get_fileset_files()
         vlog_include_dirs = ['+incdir+'+d.replace('\\','/') for d in incdirs]
@@ -142,14 +153,19 @@ class Modelsim(Edatool):
                 args += ['-work', f.logical_name]
                 args += [f.name.replace('\\','/')]
                 tcl_build_rtl.write("{} {}\n".format(cmd, ' '.join(args)))
+        tcl_build_rtl.close()
 
-    def _write_makefile(self):
-        vpi_make = open(os.path.join(self.work_root, "Makefile"), 'w')
+    def _parameters(self):
         _parameters = []
         for key, value in self.vlogparam.items():
             _parameters += ['{}={}'.format(key, self._param_value_str(value))]
         for key, value in self.generic.items():
             _parameters += ['{}={}'.format(key, self._param_value_str(value, bool_is_str=True))]
+        return _parameters
+
+    def _write_makefile(self):
+        vpi_make = self._open_output("Makefile")
+        _parameters = self._parameters()
         _plusargs = []
         for key, value in self.plusarg.items():
             _plusargs += ['{}={}'.format(key, self._param_value_str(value))]
@@ -158,7 +174,8 @@ class Modelsim(Edatool):
 
         _modules = [m['name'] for m in self.vpi_modules]
         _clean_targets = ' '.join(["clean_"+m for m in _modules])
-        _s = MAKE_HEADER.format(toplevel = self.toplevel,
+        _s = MAKE_HEADER.format(run_do = RUN_DO,
+                                toplevel = self.toplevel,
                                 parameters = ' '.join(_parameters),
                                 plusargs = ' '.join(_plusargs),
                                 vsim_options = ' '.join(_vsim_options),
@@ -180,7 +197,7 @@ class Modelsim(Edatool):
         vpi_make.close()
 
     def configure_main(self):
-        tcl_main = open(os.path.join(self.work_root, "edalize_main.tcl"), 'w')
+        tcl_main = self._open_output("edalize_main.tcl")
         tcl_main.write("onerror { quit -code 1; }\n")
         tcl_main.write("do edalize_build_rtl.tcl\n")
 
@@ -199,3 +216,24 @@ class Modelsim(Edatool):
             args.append('PLUSARGS='+' '.join(plusargs))
 
         self._run_tool('make', args)
+
+    def run_command(self, run_dir):
+        model_tech = self.env.get('MODEL_TECH')
+        work_root = os.path.abspath(self.work_root)
+        args = [os.path.join(model_tech, 'vsim') if model_tech else 'vsim',
+                '-do', RUN_DO, '-c']
+        for m in self.vpi_modules:
+            args += ['-pli', os.path.join(work_root, m['name'])]
+        args += self.tool_options.get('vsim_options', [])
+        args += ['-g' + p for p in self._parameters()]
+        for key, value in self.plusarg.items():
+            args.append('+{}={}'.format(key, self._param_value_str(value)))
+        return args + [self.toplevel]
+
+    def run_links(self):
+        # vsim finds the libraries compiled by vlib in the working directory
+        libs = ['work']
+        for f in self.fileset.src_files:
+            if f.logical_name and not f.logical_name in libs:
+                libs.append(f.logical_name)
+        return libs
@@ -0,0 +1,773 @@
+# Copyright edalize contributors
+# Licensed under the 2-Clause BSD License, see LICENSE for details.
+# SPDX-License-Identifier: BSD-2-Clause
+
+""" Running tools, hook scripts and build steps
+
+Commands are started in a process group of their own, so that they can be
+killed together with their children on a timeout or when an asyncio phase
+is cancelled. Their output can be streamed through an OutputCollector,
+which keeps a bounded tail of it, writes it to a log file and matches it
+against regular expressions while the command runs.
+
+Edatool gets the methods that run commands from ProcessRunner.
+"""
+
+import asyncio
+from collections import OrderedDict, deque
+import json
+import logging
+import os
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from edalize import trace
+from edalize.build_graph import run_graph
+from edalize.jobserver import get_jobserver
+
+logger = logging.getLogger(__name__)
+
+try:
+    import msvcrt
+    _mswindows = True
+except ImportError:
+    _mswindows = False
+
+def _console_stream(f):
+    # Binary stream behind a console text stream, for echoing raw tool output
+    return getattr(f, 'buffer', None)
+
+def _echo_stream(f, console):
+    # Collected output is echoed where it would have gone without the
+    # collector: the console, or a file object the caller redirected it to
+    if f is None:
+        return _console_stream(console)
+    if isinstance(f, int):
+        return None
+    return getattr(f, 'buffer', f)
+
+class OutputCollector(object):
+    """ Collect the output streams of a running tool
+
+    Each stream is read line by line in a separate thread. Only the last tail_lines lines are kept in memory for
+    error reporting, so memory use stays constant regardless of how much
+    output a tool produces. Lines can also be echoed to the console and
+    appended to a log file, and matched against regular expressions while
+    the tool runs.
+    """
+
+    # Longest line that is read at once. Longer lines are split
+    MAX_LINE_LENGTH = 65536
+
+    # Number of matching lines kept for each watch
+    MAX_MATCHES = 10
+
+    def __init__(self, tail_lines=100, log_file=None):
+        self.tails = {}
+        self.echo = {}
+        self.tail_lines = tail_lines
+        self.log_file = log_file
+        self.threads = []
+        self.lock = threading.Lock()
+        self.watches = []
+        # The first MAX_MATCHES lines that matched each watch
+        self.matches = {}
+        # The process whose output is collected, and if it was killed by a
+        # watch
+        self.process = None
+        self.killed = False
+
+    def add_stream(self, stream_name, echo=None):
+        self.tails[stream_name] = deque(maxlen=self.tail_lines)
+        self.echo[stream_name] = echo
+
+    def watch(self, name, regex, callback=None, kill=False):
+        """ Match the output against a compiled regex
+
+        The first matching lines are kept in matches[name]. callback, if
+        given, is called with the stream name, the line as a string and
+        the match object for every matching line. If kill is True, the
+        process and its children are killed at the first matching line
+        """
+        self.watches.append((name, regex, callback, kill))
+
+    def feed(self, stream_name, line):
+        """ Handle one line of output from stream_name """
+        self.tails[stream_name].append(line)
+        if self.watches:
+            self._match(stream_name, line.decode(errors='replace'))
+        with self.lock:
+            if self.log_file:
+                self.log_file.write(line)
+            echo = self.echo[stream_name]
+            if echo:
+                echo.write(line)
+                echo.flush()
+
+    def _match(self, stream_name, text):
+        for (name, regex, callback, kill) in self.watches:
+            m = regex.search(text)
+            if m:
+                matches = self.matches.setdefault(name, [])
+                if len(matches) < self.MAX_MATCHES:
+                    matches.append(text)
+                if callback:
+                    callback(stream_name, text, m)
+                if kill and not self.killed and self.process:
+                    self.killed = True
+                    _kill_process_tree(self.process)
+
+    def follow(self, stream_name, pipe, echo=None):
+        """ Read a pipe line by line in a separate thread """
+        self.add_stream(stream_name, echo)
+        t = threading.Thread(target=self._read, args=(stream_name, pipe))
+        t.daemon = True
+        t.start()
+        self.threads.append(t)
+
+    def _read(self, stream_name, pipe):
+        for line in iter(lambda: pipe.readline(self.MAX_LINE_LENGTH), b''):
+            self.feed(stream_name, line)
+        pipe.close()
+
+    def join(self):
+        for t in self.threads:
+            t.join()
+        if self.log_file:
+            self.log_file.flush()
+
+    def tail(self, stream_name):
+        """ Get the last lines of a stream as bytes """
+        return b''.join(self.tails.get(stream_name, []))
+
+class ProcessMetrics(object):
+    """ Resources used by one tool or script invocation
+
+    Times are in seconds and max_rss in bytes. The rusage fields are None
+    if they couldn't be collected, e.g. on Windows.
+    """
+    FIELDS = ['cmd', 'returncode', 'start_time', 'wall_time',
+              'user_time', 'system_time', 'max_rss',
+              'block_input', 'block_output',
+              'voluntary_context_switches', 'involuntary_context_switches']
+
+    def __init__(self, cmd, returncode, start_time, wall_time, rusage=None):
+        self.cmd = cmd
+        self.returncode = returncode
+        self.start_time = start_time
+        self.wall_time = wall_time
+        if rusage is None:
+            self.user_time = self.system_time = self.max_rss = None
+            self.block_input = self.block_output = None
+            self.voluntary_context_switches = None
+            self.involuntary_context_switches = None
+        else:
+            self.user_time = rusage.ru_utime
+            self.system_time = rusage.ru_stime
+            # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+            self.max_rss = rusage.ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+            self.block_input = rusage.ru_inblock
+            self.block_output = rusage.ru_oublock
+            self.voluntary_context_switches = rusage.ru_nvcsw
+            self.involuntary_context_switches = rusage.ru_nivcsw
+
+    def to_dict(self):
+        return OrderedDict((f, getattr(self, f)) for f in self.FIELDS)
+
+def _wait_with_rusage(process):
+    """ Wait for a Popen process and return its exit code and rusage """
+    if not hasattr(os, 'wait4'):
+        return process.wait(), None
+    (_, status, rusage) = os.wait4(process.pid, 0)
+    if os.WIFSIGNALED(status):
+        process.returncode = -os.WTERMSIG(status)
+    else:
+        process.returncode = os.WEXITSTATUS(status)
+    return process.returncode, rusage
+
+def _timeout_expired(args, timeout, collector):
+    if collector:
+        return subprocess.TimeoutExpired(args, timeout,
+                                         collector.tail('stdout'),
+                                         collector.tail('stderr'))
+    return subprocess.TimeoutExpired(args, timeout)
+
+def run_streaming(args, collector=None, echo=True, timeout=None, processes=None, **kwargs):
+    """ Run a command and wait for it to finish
+
+    If a collector is given, stdout and stderr are streamed through it
+    and echoed if echo is True, to the console or to the stdout and stderr
+    file objects from the keyword arguments. The command never gets any
+    input. Other keyword arguments are passed on to subprocess.Popen.
+
+    The command is started in a new process group, but stays attached to
+    the controlling terminal. If it runs for longer than timeout seconds,
+    the whole process group is sent SIGTERM, and SIGKILL if it still runs
+    TERMINATE_GRACE seconds later. If the wait is interrupted, the group
+    is killed right away. A timeout raises subprocess.TimeoutExpired with
+    the output tails collected so far. If processes is a set, the process
+    id of the command is in it while the command runs.
+
+    Returns a subprocess.CompletedProcess with the output tails from the
+    collector (or None) as stdout and stderr. Its rusage attribute holds
+    the resource usage of the command, or None where os.wait4 is missing
+    """
+    if collector:
+        echo_stdout = _echo_stream(kwargs.get('stdout'), sys.stdout) if echo else None
+        echo_stderr = _echo_stream(kwargs.get('stderr'), sys.stderr) if echo else None
+        kwargs['stdout'] = kwargs['stderr'] = subprocess.PIPE
+    kwargs.update(_process_group_kwargs())
+
+    process = subprocess.Popen(args, stdin=subprocess.PIPE, **kwargs)
+    # Closing stdin lets the command see EOF if it tries to read
+    process.stdin.close()
+    if collector:
+        collector.process = process
+    if processes is not None:
+        processes.add(process.pid)
+
+    timers = []
+    timed_out = threading.Event()
+    if timeout is not None:
+        def _kill():
+            if process.returncode is None:
+                _kill_process_tree(process)
+        def _expire():
+            if process.returncode is None:
+                timed_out.set()
+                _kill_process_tree(process, terminate=True)
+                _start_timer(TERMINATE_GRACE, _kill)
+        def _start_timer(interval, function):
+            timer = threading.Timer(interval, function)
+            timer.daemon = True
+            timers.append(timer)
+            timer.start()
+        _start_timer(timeout, _expire)
+    try:
+        if collector:
+            collector.follow('stdout', process.stdout, echo_stdout)
+            collector.follow('stderr', process.stderr, echo_stderr)
+            collector.join()
+        (returncode, rusage) = _wait_with_rusage(process)
+    except:  # Including KeyboardInterrupt
+        _kill_process_tree(process)
+        process.wait()
+        raise
+    finally:
+        for timer in timers:
+            timer.cancel()
+        if processes is not None:
+            processes.discard(process.pid)
+
+    if timed_out.is_set():
+        # Children that outlived the command on SIGTERM
+        _kill_process_tree(process)
+        raise _timeout_expired(args, timeout, collector)
+    if collector:
+        cp = subprocess.CompletedProcess(args, returncode,
+                                         collector.tail('stdout'),
+                                         collector.tail('stderr'))
+    else:
+        cp = subprocess.CompletedProcess(args, returncode)
+    cp.rusage = rusage
+    return cp
+
+class ToolError(RuntimeError):
+    """ Raised when a tool or hook script exits with an error
+
+    returncode holds the exit code, stdout and stderr the collected output
+    tails (or None), and errors the lines of output that matched the
+    fatal_errors of the backend (or None)
+    """
+    def __init__(self, msg, returncode=None, stdout=None, stderr=None, errors=None):
+        super(ToolError, self).__init__(msg)
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.errors = errors
+
+def error_message(e):
+    """ Get the message of an exception for a job result
+
+    Errors other than RuntimeError are usually bugs or invalid jobs, so they
+    keep their type, e.g. "KeyError: 'cmd'"
+    """
+    if isinstance(e, RuntimeError):
+        return str(e)
+    return '{}: {}'.format(e.__class__.__name__, e)
+
+class LicenseError(ToolError):
+    """ Raised when a tool fails because it couldn't check out a license
+
+    message holds the line of output with the license error
+    """
+    def __init__(self, msg, returncode=None, stdout=None, stderr=None, message=None):
+        super(LicenseError, self).__init__(msg, returncode, stdout, stderr)
+        self.message = message
+
+class ToolTimeout(ToolError):
+    """ Raised when a tool or hook script is killed after a timeout
+
+    timeout holds the timeout in seconds
+    """
+    def __init__(self, msg, timeout, stdout=None, stderr=None):
+        super(ToolTimeout, self).__init__(msg, None, stdout, stderr)
+        self.timeout = timeout
+
+# Seconds that a timed out command gets to exit after SIGTERM, before it is
+# killed
+TERMINATE_GRACE = 5
+
+def _process_group_kwargs():
+    # Popen arguments that start a command in a process group of its own,
+    # which can be signalled as a whole. Unlike a new session, this keeps
+    # the controlling terminal
+    if _mswindows:
+        return {}
+    if sys.version_info >= (3, 11):
+        return {'process_group' : 0}
+    return {'preexec_fn' : os.setpgrp}
+
+def _kill_process_tree(process, terminate=False):
+    """ Kill a process that was started in its own process group and all its children
+
+    With terminate, they get SIGTERM instead of SIGKILL
+    """
+    if _mswindows:
+        if terminate:
+            process.terminate()
+        else:
+            process.kill()
+        return
+    try:
+        os.killpg(process.pid, signal.SIGTERM if terminate else signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+class ProcessRunner(object):
+    """ Runs the tools, hook scripts and build steps of a backend
+
+    Commands run in work_root with the environment in env. The output
+    handling, timeouts, jobserver and metrics are set up through the
+    attributes that Edatool initializes: verbose, stdout, stderr, log_file,
+    log_tail_lines, tool_timeout, tool_timeouts, hook_jobs, build_jobs,
+    metrics and metrics_file. _output_watches gives the patterns to match
+    the output of each command against. The running processes are kept in
+    processes, so that cancellation, start_gate and _phase_deadline can
+    stop or hold them.
+    """
+
+    def _trace_span(self, name, **args):
+        """ Record a span for the timeline trace if tracing is enabled
+
+        See edalize.trace. The span is named after the backend and name
+        """
+        _tool_name = self.__class__.__name__.lower()
+        return trace.span('{} {}'.format(_tool_name, name), cat=_tool_name, **args)
+
+    def _process_timeout(self, args):
+        """ Get the timeout for a command from the tool and phase timeouts """
+        timeout = self.tool_timeouts.get(os.path.basename(args[0]), self.tool_timeout)
+        if self._phase_deadline is not None:
+            remaining = max(self._phase_deadline - time.monotonic(), 0)
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        return timeout
+
+    async def _run_in_thread(self, func, *args):
+        """ Call func in a thread of its own and wait for it from asyncio
+
+        The tools and scripts that func runs are started from that thread as
+        it calls them, so it sees their results just like when called
+        directly. If the calling task is cancelled, no more commands are
+        started and the running ones are killed along with their process
+        groups. The cancellation is propagated once func has returned.
+        """
+        loop = asyncio.get_event_loop()
+        executor = ThreadPoolExecutor(max_workers=1)
+        self._cancelled.clear()
+        future = loop.run_in_executor(executor, func, *args)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            self._cancelled.set()
+            # Also catches commands that were started while killing
+            while not future.done():
+                self._kill_processes()
+                await asyncio.wait([future], timeout=0.1)
+            if not future.cancelled():
+                future.exception()
+            raise
+        finally:
+            executor.shutdown(wait=False)
+
+    def _kill_processes(self):
+        """ Kill the running tool and script invocations with their children """
+        for pid in self.processes.copy():
+            try:
+                if _mswindows:
+                    os.kill(pid, signal.SIGTERM)
+                else:
+                    os.killpg(pid, signal.SIGKILL)
+            except OSError:
+                pass
+
+    def _run_build_graph(self, targets=None):
+        self.step_results = run_graph(self._get_build_graph(), self._run_build_step, self.work_root,
+                                      targets = targets,
+                                      jobs = self.build_jobs,
+                                      state_file = '.edalize-steps.json')
+        for r in self.step_results:
+            logger.info("Build step {}: {} ({:.2f}s)".format(r['name'], r['status'], r['duration'] or 0))
+
+    def _run_build_step(self, step):
+        _env = self.env.copy()
+        _env.update(step.env)
+        logger.info(step.description)
+        capture_output = not (self.verbose or self.stdout or self.stderr)
+        with self._job_slot(), self._trace_span(step.name, cmd=step.cmd) as span:
+            try:
+                result = self._run_process(step.cmd,
+                                           env = _env,
+                                           capture = capture_output,
+                                           stdout = self.stdout,
+                                           stderr = self.stderr)
+            except FileNotFoundError:
+                _s = "Command '{}' not found. Make sure it is in $PATH".format(step.cmd[0])
+                raise RuntimeError(_s)
+            span['returncode'] = result[0]
+            self._check_tool_result(step.cmd[0], step.cmd[1:], result)
+
+    def _open_collector(self, capture, watch=True):
+        # Output that is watched has to go through a collector, unless it
+        # is redirected elsewhere
+        watches = self._output_watches(bool(capture or self.log_file)) if watch else []
+        if not (capture or self.log_file or watches):
+            return None
+        log_file = None
+        if self.log_file:
+            log_file = open(os.path.join(self.work_root, self.log_file), 'ab')
+        collector = OutputCollector(self.log_tail_lines, log_file)
+        for watch in watches:
+            collector.watch(*watch)
+        return collector
+
+    _output_patterns = {}
+
+    _output_patterns_lock = threading.Lock()
+
+    @classmethod
+    def _output_pattern(cls, attr):
+        """ Get the regular expressions listed in a class attribute as one compiled regex, or None """
+        return cls._compile_patterns(getattr(cls, attr))
+
+    @staticmethod
+    def _compile_patterns(patterns):
+        patterns = tuple(patterns)
+        if not patterns:
+            return None
+        with ProcessRunner._output_patterns_lock:
+            if not patterns in ProcessRunner._output_patterns:
+                try:
+                    ProcessRunner._output_patterns[patterns] = re.compile('|'.join(
+                        '(?:{})'.format(p) for p in patterns))
+                except re.error as e:
+                    raise RuntimeError("Invalid pattern in {}: {}".format(list(patterns), e))
+            return ProcessRunner._output_patterns[patterns]
+
+    def _check_output(self, args, returncode, collector):
+        """ Raise an error with the watched lines of output of a failed tool """
+        if not returncode or not collector:
+            return
+        stdout = collector.tail('stdout')
+        stderr = collector.tail('stderr')
+        if 'license' in collector.matches:
+            message = collector.matches['license'][0].strip()
+            raise LicenseError("'{}' failed to check out a license: {}".format(args[0], message),
+                               returncode, stdout, stderr, message)
+        if 'error' in collector.matches:
+            errors = [line.rstrip('\r\n') for line in collector.matches['error']]
+            if collector.killed:
+                _s = "'{}' was stopped at the first error".format(args[0])
+            else:
+                _s = "'{}' exited with an error: {}".format(args[0], returncode)
+            logger.debug(_s)
+            raise ToolError(_s + "\nErrors:\n" + '\n'.join(errors),
+                            returncode, stdout, stderr, errors)
+
+    def _close_collector(self, collector):
+        if collector and collector.log_file:
+            collector.log_file.close()
+
+    def _run_process(self, args, env=None, capture=False, stdout=None, stderr=None, watch=True):
+        """ Run a command in work_root and wait for it to finish
+
+        If capture is True, or a log file is set, the output is streamed
+        through an OutputCollector. Unless capture is True, it is also
+        echoed to stdout and stderr, which default to the console. Otherwise
+        the output goes directly to stdout and stderr.
+
+        The command is killed after the timeout from _process_timeout,
+        which raises a ToolTimeout. Output written until then is kept in the
+        log file.
+
+        If watch is True, the output is also matched against the patterns
+        of _output_watches. A failed command with matches raises a
+        LicenseError or a ToolError with the matching lines.
+
+        Returns a tuple with the return code and the tails of stdout and
+        stderr (or None if the output was not collected)
+        """
+        self._wait_to_start(args)
+        collector = self._open_collector(capture, watch and (self.log_file or (stdout is None and stderr is None)))
+        start_time = time.time()
+        try:
+            cp = run_streaming(args,
+                               collector = collector,
+                               echo = not capture,
+                               timeout = self._process_timeout(args),
+                               cwd = self.work_root,
+                               stdout = stdout,
+                               stderr = stderr,
+                               processes = self.processes,
+                               **self._jobserver_kwargs(args, env))
+        except subprocess.TimeoutExpired as e:
+            self._raise_timeout(e)
+        finally:
+            self._close_collector(collector)
+        self._record_metrics(ProcessMetrics(args, cp.returncode, start_time,
+                                            time.time() - start_time,
+                                            getattr(cp, 'rusage', None)))
+        self._check_output(args, cp.returncode, collector)
+        return cp.returncode, cp.stdout, cp.stderr
+
+    def _wait_to_start(self, args):
+        if self.start_gate is not None:
+            self.start_gate.wait()
+        if self._cancelled.is_set():
+            raise ToolError("'{}' was not started since the phase was cancelled".format(args[0]))
+
+    @property
+    def jobserver(self):
+        if not self._jobserver_initialized:
+            self.jobserver = get_jobserver()
+        return self._jobserver
+
+    @jobserver.setter
+    def jobserver(self, jobserver):
+        self._jobserver = jobserver
+        self._jobserver_initialized = True
+
+    def _jobserver_kwargs(self, args, env):
+        # Hands the jobserver to make-like commands through MAKEFLAGS, so
+        # that they and their sub-makes take their job slots from it. Other
+        # commands don't get it, since they could hold on to the pipe
+        if not os.path.basename(args[0]) in self.jobserver_commands or \
+           self.jobserver is None:
+            return {'env' : env}
+        env = dict(os.environ if env is None else env)
+        env['MAKEFLAGS'] = self.jobserver.makeflags(env.get('MAKEFLAGS'))
+        return {'env'      : env,
+                'pass_fds' : self.jobserver.fds}
+
+    @contextmanager
+    def _job_slot(self):
+        if self.jobserver is None:
+            yield
+        else:
+            with self.jobserver.slot():
+                yield
+
+    _metrics_lock = threading.Lock()
+
+    def _record_metrics(self, metrics):
+        self.metrics.append(metrics)
+        if not self.metrics_file:
+            return
+        line = json.dumps(metrics.to_dict()) + '\n'
+        with ProcessRunner._metrics_lock:
+            with open(os.path.join(self.work_root, self.metrics_file), 'a') as f:
+                f.write(line)
+
+    def _raise_timeout(self, e):
+        _s = "'{}' timed out after {:g} seconds".format(e.cmd, e.timeout)
+        if self.log_file:
+            _s += ". See {} for the output".format(os.path.join(self.work_root, self.log_file))
+        logger.debug(_s)
+        self._log_output_tail(e.stdout, e.stderr)
+        if e.stdout or e.stderr:
+            _tail = (e.stdout or b'') + (e.stderr or b'')
+            _s += "\nLast lines of output:\n" + _tail.decode(errors='replace')
+        raise ToolTimeout(_s, e.timeout, e.stdout, e.stderr)
+
+    def _log_output_tail(self, stdout, stderr):
+        if stdout:
+            logger.info(stdout.decode(errors='replace'))
+        if stderr:
+            logger.error(stderr.decode(errors='replace'))
+
+    def _script_env(self, script, hook_name):
+        _env = self.env.copy()
+        if 'env' in script:
+            _env.update(script['env'])
+        logger.info("Running {} script {}".format(hook_name, script['name']))
+        logger.debug("Environment: " + str(_env))
+        logger.debug("Working directory: " + self.work_root)
+        return _env
+
+    def _check_script_result(self, script, hook_name, result):
+        (returncode, stdout, stderr) = result
+        if returncode:
+            msg = "{} script '{}': {} exited with error code {}".format(hook_name, script['name'], script['cmd'], returncode)
+            logger.debug(msg)
+            self._log_output_tail(stdout, stderr)
+            raise ToolError(msg, returncode, stdout, stderr)
+
+    def _script_dependencies(self, scripts, hook_name):
+        """ Get the indices of the scripts that each script depends on
+
+        A script that has a 'depends' list only waits for the scripts named
+        there. A script without one waits for the previous script in the
+        list, so hooks without dependency information run in order.
+        """
+        names = {}
+        for i, script in enumerate(scripts):
+            names[script['name']] = i
+        deps = []
+        for i, script in enumerate(scripts):
+            if 'depends' in script:
+                _deps = set()
+                for name in script['depends']:
+                    if not name in names:
+                        raise RuntimeError("{} script '{}' depends on unknown script '{}'".format(hook_name, script['name'], name))
+                    _deps.add(names[name])
+            else:
+                _deps = set([i-1]) if i else set()
+            deps.append(_deps)
+
+        #Check for dependency cycles
+        resolved = set()
+        while len(resolved) < len(scripts):
+            ready = [i for i in range(len(scripts)) if not i in resolved and deps[i] <= resolved]
+            if not ready:
+                _s = ', '.join(scripts[i]['name'] for i in range(len(scripts)) if not i in resolved)
+                raise RuntimeError("Circular dependencies between {} scripts: {}".format(hook_name, _s))
+            resolved.update(ready)
+        return deps
+
+    def _script_is_up_to_date(self, script):
+        """ Check if the outputs of a script are newer than its inputs """
+        if not script.get('outputs'):
+            return False
+        try:
+            oldest_output = min(os.path.getmtime(os.path.join(self.work_root, f))
+                                for f in script['outputs'])
+        except OSError:
+            return False
+        for f in script.get('inputs', []):
+            try:
+                if os.path.getmtime(os.path.join(self.work_root, f)) > oldest_output:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def _run_script(self, script, hook_name):
+        if self._script_is_up_to_date(script):
+            logger.info("{} script {} is up to date. Skipping".format(hook_name, script['name']))
+            return
+        _env = self._script_env(script, hook_name)
+        with self._trace_span('{} {}'.format(hook_name, script['name']),
+                              cmd=script['cmd']) as span:
+            try:
+                result = self._run_process(script['cmd'],
+                                           env = _env,
+                                           capture = not self.verbose,
+                                           watch = False)
+            except FileNotFoundError as e:
+                msg = "Unable to run {} script '{}': {}"
+                raise RuntimeError(msg.format(hook_name, script['name'], str(e)))
+            span['returncode'] = result[0]
+            self._check_script_result(script, hook_name, result)
+
+    def _run_scripts(self, scripts, hook_name):
+        """ Run the scripts of a hook
+
+        Scripts run concurrently in up to hook_jobs worker threads as soon
+        as the scripts they depend on have finished. Scripts whose declared
+        outputs are newer than their inputs are skipped. After a failure no
+        new scripts are started and the first error is raised once the
+        running scripts have finished.
+        """
+        deps = self._script_dependencies(scripts, hook_name)
+        if not any('depends' in script for script in scripts):
+            for script in scripts:
+                self._run_script(script, hook_name)
+            return
+        pending = set(range(len(scripts)))
+        finished = set()
+        running = {}
+        error = None
+        with ThreadPoolExecutor(max_workers=self.hook_jobs or os.cpu_count()) as executor:
+            while pending or running:
+                if error is None:
+                    for i in sorted(pending):
+                        if deps[i] <= finished:
+                            pending.discard(i)
+                            running[executor.submit(self._run_script, scripts[i], hook_name)] = i
+                if not running:
+                    break
+                (done, _) = wait(running, return_when=FIRST_COMPLETED)
+                for f in done:
+                    i = running.pop(f)
+                    try:
+                        f.result()
+                        finished.add(i)
+                    except Exception as e:
+                        error = error or e
+        if error:
+            raise error
+
+    def _check_tool_result(self, cmd, args, result):
+        (returncode, stdout, stderr) = result
+        if returncode:
+            _s = "'{}' exited with an error: {}".format([cmd] + args, returncode)
+            logger.debug(_s)
+            self._log_output_tail(stdout, stderr)
+            if stdout or stderr:
+                _tail = (stdout or b'') + (stderr or b'')
+                _s += "\nLast lines of output:\n" + _tail.decode(errors='replace')
+            raise ToolError(_s, returncode, stdout, stderr)
+        return result
+
+    def _run_tool(self, cmd, args=[], quiet=False):
+        """ Run a tool in work_root
+
+        If quiet is True and the backend is not verbose, the output of the
+        tool is not shown. The last log_tail_lines lines of it are still
+        collected and included in the error if the tool fails.
+
+        Returns the return code and the collected tails of stdout and
+        stderr (None if not collected)
+        """
+        logger.debug("Running " + cmd)
+        logger.debug("args  : " + ' '.join(args))
+
+        capture_output = quiet and not (self.verbose or self.stdout or self.stderr)
+        with self._trace_span(cmd, cmd=[cmd] + args) as span:
+            try:
+                result = self._run_process([cmd] + args,
+                                           capture = capture_output,
+                                           stdout = self.stdout,
+                                           stderr = self.stderr)
+            except FileNotFoundError:
+                _s = "Command '{}' not found. Make sure it is in $PATH".format(cmd)
+                raise RuntimeError(_s)
+            span['returncode'] = result[0]
+            return self._check_tool_result(cmd, args, result)
@@ -6,11 +6,12 @@ import logging
 import os.path
 import os
 import platform
-import subprocess
 import re
 import xml.etree.ElementTree as ET
 from functools import partial
-from edalize.edatool import Edatool
+from edalize.build_graph import BuildGraph
+from edalize.edatool import Edatool, jinja_filter_param_value_str
+from edalize.version_probe import get_version_probe
 
 logger = logging.getLogger(__name__)
 
@@ -18,8 +19,13 @@ class Quartus(Edatool):
 
     argtypes = ['vlogdefine', 'vlogparam', 'generic']
 
-    # Define Standard edition to be our default version
-    isPro = False
+    license_errors = [r'Error \(2920\d\d\)',
+                      r'FLEXnet Licensing error']
+
+    fatal_errors = [r'^\s*Error \(\d+\)']
+
+    progress_patterns = [r'^Info: Running Quartus Prime (?P<step>.+)$']
+
     makefile_template = {False : "quartus-std-makefile.j2",
                          True  : "quartus-pro-makefile.j2"}
 
@@ -51,51 +57,71 @@ class Quartus(Edatool):
                          'type' : 'String',
                          'desc' : 'Additional options for Quartus'},
                         ]}
-    """ Initial setup of the class
-
-    This calls the parent constructor, but also identifies whether
-    the current system is using a Standard or Pro edition of Quartus.
+    # Version assumed when quartus_sh can't be run or its output isn't
+    # recognised
+    default_version = {
+        'major':   '18',
+        'minor':   '1',
+        'patch':   '0',
+        'date':    '01/01/2019',
+        'edition': 'Standard'
+    }
+
+    """ Get the Quartus version
+
+    This identifies whether the current system is using a Standard or Pro
+    edition of Quartus from the output of quartus_sh --version. The probe
+    only runs when the version is first needed, and its output is cached
     """
-    def __init__(self, edam=None, work_root=None, eda_api=None):
-        if not edam:
-            edam = eda_api
-
-        super(Quartus, self).__init__(edam, work_root)
-
-        # Acquire quartus_sh identification information from available tool if
-        # possible. We always default to version 18.1 Standard if a problem is encountered
-        version = {
-            'major':   '18',
-            'minor':   '1',
-            'patch':   '0',
-            'date':    '01/01/2019',
-            'edition': 'Standard'
-        }
-        try:
-            qsh_text = subprocess.Popen(["quartus_sh", "--version"], stdout=subprocess.PIPE, env=os.environ).communicate()[0]
-
-            # Attempt to pattern match the output. Examples include
-            # Version 16.1.2 Build 203 01/18/2017 SJ Standard Edition
-            # Version 17.1.2 Build 304 01/31/2018 SJ Pro Edition
-            version_exp = r'Version (?P<major>\d+)\.(?P<minor>\d+)\.(?P<patch>\d+) ' + \
-                          r'Build (?P<build>\d+) (?P<date>\d{2}/\d{2}/\d{4}) (?:\w+) '    + \
-                          r'(?P<edition>(Lite|Standard|Pro)) Edition'
-
-            match = re.search(version_exp, str(qsh_text))
-            if match != None:
-                version = match.groupdict()
-        except:
+    @property
+    def quartus_version(self):
+        if getattr(self, '_quartus_version', None) is None:
+            self._quartus_version = self._probe_version()
+        return self._quartus_version
+
+    def _probe_version(self):
+        qsh_text = get_version_probe().output(["quartus_sh", "--version"])
+        if qsh_text is None:
             # It is possible for this to have been run on a box without
             # Quartus being installed. Allow these errors to be ignored
             logger.warning("Unable to recognise Quartus version via quartus_sh")
+            return self.default_version
 
-        self.isPro = (version['edition'] == "Pro")
+        # Attempt to pattern match the output. Examples include
+        # Version 16.1.2 Build 203 01/18/2017 SJ Standard Edition
+        # Version 17.1.2 Build 304 01/31/2018 SJ Pro Edition
+        version_exp = r'Version (?P<major>\d+)\.(?P<minor>\d+)\.(?P<patch>\d+) ' + \
+                      r'Build (?P<build>\d+) (?P<date>\d{2}/\d{2}/\d{4}) (?:\w+) '    + \
+                      r'(?P<edition>(Lite|Standard|Pro)) Edition'
 
-        # Quartus Pro 17 and later use 1/0 for boolean generics. Other editions
-        # and versions use "true"/"false" strings
-        if (version['edition'] != "Pro") or (int(version['major']) < 17):
-            self.jinja_env.filters['generic_value_str'] = \
-                partial(self.jinja_env.filters['generic_value_str'], bool_is_str=True)
+        match = re.search(version_exp, qsh_text)
+        if match is None:
+            logger.warning("Unable to recognise Quartus version via quartus_sh")
+            return self.default_version
+        return match.groupdict()
+
+    """ Whether Quartus is the Pro edition
+
+    This follows the probed version unless it is set explicitly
+    """
+    @property
+    def isPro(self):
+        if getattr(self, '_isPro', None) is None:
+            return self.quartus_version['edition'] == "Pro"
+        return self._isPro
+
+    @isPro.setter
+    def isPro(self, value):
+        self._isPro = value
+
+    def get_version(self):
+        return '{major}.{minor}.{patch} {edition}'.format(**self.quartus_version)
+
+    """ The project files written by configure depend on the edition and
+    version, which configure probes anyway
+    """
+    def _configure_fingerprint_version(self):
+        return [self.get_version(), self.isPro]
 
     """ Configuration is the first phase of the build
 
@@ -108,8 +134,14 @@ class Quartus(Edatool):
         self.jinja_env.filters['src_file_filter'] = self.src_file_filter
         self.jinja_env.filters['qsys_file_filter'] = self.qsys_file_filter
 
-        has_vhdl2008 = 'vhdlSource-2008' in [x.file_type for x in src_files]
-        has_qsys     = 'QSYS'            in [x.file_type for x in src_files]
+        # Quartus Pro 17 and later use 1/0 for boolean generics. Other editions
+        # and versions use "true"/"false" strings
+        if not self.isPro or (int(self.quartus_version['major']) < 17):
+            self.jinja_env.filters['generic_value_str'] = \
+                partial(jinja_filter_param_value_str, bool_is_str=True)
+
+        has_vhdl2008 = self.fileset.has_file_type('vhdlSource-2008')
+        has_qsys     = self.fileset.has_file_type('QSYS')
 
         escaped_name = self.name.replace(".", "_")
 
@@ -126,13 +158,14 @@ class Quartus(Edatool):
         }
 
         # Render Makefile based on detected version
-        self.render_template(self.makefile_template[self.isPro],
-                             'Makefile',
-                             { 'name'         : escaped_name,
-                               'src_files'    : src_files,
-                               'tool_options' : self.tool_options})
-
-        # Render the TCL project file
+        self._write_graph_makefile(
+            self._render(self.makefile_template[self.isPro],
+                         {'name' : escaped_name}))
+
+        # Render the TCL project file. src_file_filter uses the attributes
+        # that qsys_file_filter gives QSYS files
+        for f in src_files:
+            self.qsys_file_filter(f)
         self.render_template('quartus-project.tcl.j2',
                              escaped_name + '.tcl',
                              template_vars)
@@ -226,15 +259,80 @@ class Quartus(Edatool):
 
     def build_main(self):
         logger.info("Building")
-        args = []
+        target = None
         if 'pnr' in self.tool_options:
             if self.tool_options['pnr'] == 'quartus':
                 pass
             elif self.tool_options['pnr'] == 'dse':
-                args.append('dse')
+                target = 'dse'
             elif self.tool_options['pnr'] == 'none':
-                args.append('syn')
-        self._run_tool('make', args, quiet=True)
+                target = 'syn'
+        self._run_build(target)
+
+    def build_graph(self):
+        # Like the targets of the Makefile, the steps have no outputs and
+        # always run
+        (src_files, incdirs) = self._get_fileset_files(force_slash=True)
+        name = self.name.replace('.', '_')
+        options = self.tool_options.get('quartus_options', [])
+        family = self.tool_options.get('family', '')
+        device = self.tool_options.get('device', '')
+
+        graph = BuildGraph()
+        graph.add('project',
+                  ['quartus_sh'] + options + ['-t', name + '.tcl'],
+                  inputs = [name + '.tcl'],
+                  description = 'Creating Quartus project')
+        qsys_steps = []
+        for f in src_files:
+            if not self.qsys_file_filter(f):
+                continue
+            if self.isPro:
+                cmds = [['qsys-generate', f.name, '--synthesis=VERILOG',
+                         '--family=' + family, '--part=' + device,
+                         '--quartus-project=' + name]]
+            else:
+                report = os.path.join(f.dstdir, f.simplename)
+                system_info = ['--system-info=DEVICE_FAMILY=' + family,
+                               '--system-info=DEVICE=' + device]
+                component = '--component-file={}/{}.qsys'.format(f.srcdir, f.simplename)
+                cmds = [['ip-generate',
+                         '--project-directory=' + f.srcdir,
+                         '--output-directory=' + f.dstdir,
+                         '--report-file=bsf:' + report + '.bsf'] + system_info + [component],
+                        ['ip-generate',
+                         '--project-directory=' + f.srcdir,
+                         '--output-directory=' + f.dstdir + '/synthesis',
+                         '--file-set=QUARTUS_SYNTH',
+                         '--report-file=sopcinfo:' + report + '.sopcinfo',
+                         '--report-file=html:' + report + '.html',
+                         '--report-file=qip:' + report + '.qip',
+                         '--report-file=cmp:' + report + '.cmp',
+                         '--report-file=svd'] + system_info + [component, '--language=VERILOG']]
+            for cmd in cmds:
+                step = 'qsys{}'.format(len(qsys_steps))
+                graph.add(step, cmd,
+                          depends = ['project'] + qsys_steps[-1:],
+                          description = 'Generating ' + f.simplename)
+                qsys_steps.append(step)
+        graph.add('syn',
+                  ['quartus_syn' if self.isPro else 'quartus_map'] + options + [name],
+                  depends = qsys_steps[-1:] or ['project'],
+                  description = 'Synthesizing with Quartus')
+        for (step, prev, tool, description) in [
+                ('fit', 'syn', 'quartus_fit', 'Fitting'),
+                ('asm', 'fit', 'quartus_asm', 'Assembling'),
+                ('sta', 'asm', 'quartus_sta', 'Running timing analysis')]:
+            graph.add(step, [tool] + options + [name],
+                      depends = [prev],
+                      description = description)
+        graph.add('dse',
+                  ['quartus_dse', name] + self.tool_options.get('dse_options', []),
+                  depends = ['syn'],
+                  description = 'Running Design Space Explorer')
+        # build_main picks the dse and syn targets for the other pnr options
+        graph.default = ['sta']
+        return graph
 
     """ Program the FPGA
     """
@@ -33,7 +33,7 @@ class Radiant(Edatool):
                 else:
                     pdc_file = f.name
 
-        with open(os.path.join(self.work_root, self.name+'.tcl'), 'w') as f:
+        with self._open_output(self.name+'.tcl') as f:
             TCL_TEMPLATE = """#Generated by Edalize
 prj_create -name {} -impl "impl" -dev {}
 prj_set_impl_opt top {}
@@ -67,7 +67,7 @@ prj_set_impl_opt top {}
                     f.write(_s+'\n')
             f.write('prj_save\nprj_close\n')
 
-        with open(os.path.join(self.work_root, self.name+'_run.tcl'), 'w') as f:
+        with self._open_output(self.name+'_run.tcl') as f:
             f.write("""#Generated by Edalize
 prj_open {}.rdf
 prj_run Synthesis -impl impl -forceOne
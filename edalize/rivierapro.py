@@ -17,6 +17,15 @@ class Rivierapro(Edatool):
 
     argtypes = ['plusarg', 'vlogdefine', 'vlogparam']
 
+    license_errors = [r'Cannot checkout license',
+                      r'License (?:for feature \S+ )?not found',
+                      r'FLEXnet Licensing error']
+
+    fatal_errors = [r'^(?:# )?\*\* Fatal',
+                    r'^(?:# )?\w+: Fatal Error']
+
+    progress_patterns = [r'^# (?:KERNEL: )?Time: (?P<time>\d+(?:\.\d+)? ?[munpf]?s)']
+
     @classmethod
     def get_doc(cls, api_ver):
         if api_ver == 0:
@@ -35,7 +44,7 @@ class Rivierapro(Edatool):
                         ]}
 
     def _write_build_rtl_tcl_file(self, tcl_main):
-        tcl_build_rtl  = open(os.path.join(self.work_root, "edalize_build_rtl.tcl"), 'w')
+        tcl_build_rtl  = self._open_output("edalize_build_rtl.tcl")
 
         (src_files, incdirs) = self._get_fileset_files(force_slash=True)
         vlog_include_dirs = ['+incdir+'+d.replace('\\','/') for d in incdirs]
@@ -101,6 +110,7 @@ class Rivierapro(Edatool):
 
         if (self.tool_options.get('compilation_mode')=='common'):
             tcl_build_rtl.write("{} \n".format(' '.join(common_compilation)))
+        tcl_build_rtl.close()
 			
         if not (self.tool_options.get('compilation_mode')=='common' or self.tool_options.get('compilation_mode')==None or self.tool_options.get('compilation_mode')=='sep'):
             raise RuntimeError('wrong compilation mode, use --compilation_mode=common for common compilation or --compilation_mode=sep for separate compilation')
@@ -109,7 +119,7 @@ class Rivierapro(Edatool):
 
 
     def _write_run_tcl_file(self):
-        tcl_launch = open(os.path.join(self.work_root, "edalize_launch.tcl"), 'w')
+        tcl_launch = self._open_output("edalize_launch.tcl")
 
         #FIXME: Handle failures. Save stdout/stderr
         vpi_options = []
@@ -130,14 +140,14 @@ class Rivierapro(Edatool):
         tcl_launch.write(' '.join(args)+'\n')
         tcl_launch.close()
 
-        tcl_run = open(os.path.join(self.work_root, "edalize_run.tcl"), 'w')
+        tcl_run = self._open_output("edalize_run.tcl")
         tcl_run.write("do edalize_launch.tcl\n")
         tcl_run.write("run -all\n")
         tcl_run.write("exit\n")
         tcl_run.close()
 
     def _write_build_vpi_tcl_file(self):
-        tcl_build_vpi = open(os.path.join(self.work_root, "edalize_build_vpi.tcl"), 'w')
+        tcl_build_vpi = self._open_output("edalize_build_vpi.tcl")
         for vpi_module in self.vpi_modules:
             _name = vpi_module['name']
             _incs = ' '.join(['-I'+d for d in vpi_module['include_dirs']])
@@ -154,7 +164,7 @@ class Rivierapro(Edatool):
         tcl_build_vpi.close()
 
     def configure_main(self):
-        tcl_main = open(os.path.join(self.work_root, "edalize_main.tcl"), 'w')
+        tcl_main = self._open_output("edalize_main.tcl")
         tcl_main.write("do edalize_build_rtl.tcl\n")
 
         self._write_build_rtl_tcl_file(tcl_main)
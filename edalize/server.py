@@ -0,0 +1,309 @@
+# Copyright edalize contributors
+# Licensed under the 2-Clause BSD License, see LICENSE for details.
+# SPDX-License-Identifier: BSD-2-Clause
+
+""" Build daemon
+
+``edalize serve --socket PATH`` starts a long-lived process that accepts
+jobs over a Unix domain socket. Backend modules, templates and tool version
+probes stay loaded between jobs, so short jobs don't pay for starting
+Python and importing edalize each time.
+
+The protocol is line-based JSON. Each line a client sends is a job::
+
+    {"id"        : "lint-42",
+     "tool"      : "verilator",
+     "edam"      : {...},
+     "work_root" : "/path/to/build",
+     "phases"    : ["configure", "build"],
+     "args"      : {"seed" : 3}}
+
+phases defaults to configure, build and run, and args are the parameter
+values passed to run. The tool output goes to log_file (default
+edalize.log) in the work root. For each job the server sends back events,
+also one JSON object per line, all with the id of the job:
+
+- ``{"event" : "queued"}`` when the job is received
+- ``{"event" : "started"}`` when it gets a job slot
+- ``{"event" : "phase", "phase" : "build"}`` when a phase starts
+- ``{"event" : "progress", "phase" : "build", "step" : ..., "percent" :
+  ..., "elapsed" : ..., ...}`` for the progress messages of the tool. See
+  Edatool._report_progress
+- ``{"event" : "finished", "status" : ..., "error" : ..., "returncode" :
+  ..., "errors" : [...], "duration" : ..., "metrics" : [...]}`` with
+  status 'passed' or 'failed', the lines of output that matched the fatal
+  errors of the tool (see Edatool.fatal_errors) and the ProcessMetrics of
+  all tool invocations
+
+At most jobs jobs run at the same time, and at most limit jobs of a tool
+with a per-tool limit. Only the user running the server can connect to the
+socket. A client keeps its connection open until it has
+received the finished events of its jobs. Jobs of a client that
+disconnects are cancelled: no more commands are started and the running
+tools are killed. The Python code of a phase, like the rendering of files
+in configure, runs in a thread and can't be interrupted, so a cancelled
+job finishes it and keeps its job slot until then. submit() is a simple
+client.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import socket
+import stat
+import sys
+import time
+
+from edalize import get_edatool
+from edalize.process import error_message
+
+logger = logging.getLogger(__name__)
+
+PHASES = ['configure', 'build', 'run']
+
+class Server(object):
+    """ Runs jobs received on a Unix domain socket
+
+    jobs is the maximum number of concurrent jobs (default: number of
+    CPUs). tool_limits maps tool names to their own maximum
+    """
+
+    def __init__(self, path, jobs=None, tool_limits={}):
+        self.path = path
+        self.jobs = jobs or os.cpu_count()
+        self.tool_limits = dict(tool_limits)
+        self._server = None
+        self._slots = None
+        self._tool_slots = {}
+        self._ids = itertools.count()
+
+    async def start(self):
+        """ Start listening on the socket
+
+        Raises RuntimeError if another server is listening on it
+        """
+        self._remove_stale_socket()
+        self._slots = asyncio.Semaphore(self.jobs)
+        self._tool_slots = {tool : asyncio.Semaphore(limit)
+                            for tool, limit in self.tool_limits.items()}
+        # Anyone who can connect can run commands as the server's user, so
+        # the socket is created accessible to the user only
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o177)
+        try:
+            sock.bind(self.path)
+        except OSError:
+            sock.close()
+            raise
+        finally:
+            os.umask(umask)
+        os.chmod(self.path, 0o600)
+        self._server = await asyncio.start_unix_server(self._handle_client, sock=sock)
+        logger.info("Listening on {}".format(self.path))
+
+    def _remove_stale_socket(self):
+        """ Remove a socket left behind by a server that didn't shut down cleanly
+
+        It would make the bind fail. Only a socket that refuses connections
+        is removed, so a running server keeps its socket
+        """
+        try:
+            if not stat.S_ISSOCK(os.stat(self.path).st_mode):
+                return
+        except OSError:
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.path)
+        except ConnectionRefusedError:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+            return
+        except OSError:
+            return
+        finally:
+            probe.close()
+        raise RuntimeError("A server is already listening on {}".format(self.path))
+
+    async def close(self):
+        """ Stop listening and remove the socket """
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    async def _handle_client(self, reader, writer):
+        tasks = set()
+        drain_lock = asyncio.Lock()
+
+        async def send(event):
+            if writer.transport.is_closing():
+                return
+            writer.write(json.dumps(event, default=str).encode('utf-8') + b'\n')
+            # Waits while a slow client is behind, instead of buffering
+            # without limit
+            async with drain_lock:
+                try:
+                    await writer.drain()
+                except ConnectionError:
+                    pass
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    job = json.loads(line.decode('utf-8'))
+                    if not isinstance(job, dict):
+                        raise ValueError("A job must be a JSON object")
+                except ValueError as e:
+                    await send({'id'     : None,
+                                'event'  : 'finished',
+                                'status' : 'failed',
+                                'error'  : "Invalid job: {}".format(e)})
+                    continue
+                job.setdefault('id', next(self._ids))
+                await send({'id' : job['id'], 'event' : 'queued'})
+                task = asyncio.ensure_future(self._run_job(job, send))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def _run_job(self, job, send):
+        tool = job.get('tool')
+        result = {'id'         : job['id'],
+                  'event'      : 'finished',
+                  'status'     : 'passed',
+                  'error'      : None,
+                  'returncode' : None,
+                  'errors'     : None,
+                  'duration'   : None,
+                  'metrics'    : []}
+        tool_slot = self._tool_slots.get(tool)
+        backend = None
+        start = None
+        try:
+            if tool_slot:
+                await tool_slot.acquire()
+            try:
+                async with self._slots:
+                    await send({'id' : job['id'], 'event' : 'started'})
+                    start = time.time()
+                    backend = self._create_backend(job)
+                    loop = asyncio.get_event_loop()
+                    # Progress can be reported from executor threads
+                    backend.progress_callback = lambda event: asyncio.run_coroutine_threadsafe(
+                        send(dict(event, id=job['id'], event='progress')), loop)
+                    for phase in job.get('phases', PHASES):
+                        await send({'id' : job['id'], 'event' : 'phase', 'phase' : phase})
+                        if phase == 'configure':
+                            await backend.configure_async()
+                        elif phase == 'build':
+                            await backend.build_async()
+                        else:
+                            await backend.run_async(job.get('args', {}))
+            finally:
+                if tool_slot:
+                    tool_slot.release()
+        except Exception as e:
+            if not isinstance(e, RuntimeError):
+                logger.exception("Job {} failed".format(job['id']))
+            result.update({'status'     : 'failed',
+                           'error'      : error_message(e),
+                           'returncode' : getattr(e, 'returncode', None),
+                           'errors'     : getattr(e, 'errors', None)})
+        finally:
+            if start is not None:
+                result['duration'] = time.time() - start
+            if backend:
+                result['metrics'] = [m.to_dict() for m in backend.metrics]
+        logger.info("Job {}: {}".format(job['id'], result['status']))
+        await send(result)
+
+    def _create_backend(self, job):
+        for phase in job.get('phases', PHASES):
+            if not phase in PHASES:
+                raise RuntimeError("Invalid phase '{}'".format(phase))
+        if not 'work_root' in job:
+            raise RuntimeError("Missing required parameter 'work_root'")
+        try:
+            tool_class = get_edatool(job['tool'])
+        except (ImportError, AttributeError):
+            raise RuntimeError("Unknown tool '{}'".format(job['tool']))
+        work_root = job['work_root']
+        os.makedirs(work_root, exist_ok=True)
+        backend = tool_class(edam=job['edam'], work_root=work_root,
+                             verbose=job.get('verbose', False))
+        backend.log_file = job.get('log_file', 'edalize.log')
+        return backend
+
+def submit(path, jobs):
+    """ Send jobs to a server and yield the events it sends back
+
+    Returns when all jobs have finished. Closing the generator before that
+    disconnects from the server, which cancels the remaining jobs
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(path)
+    with sock, sock.makefile('rb') as f:
+        for job in jobs:
+            sock.sendall(json.dumps(job).encode('utf-8') + b'\n')
+        pending = len(jobs)
+        while pending:
+            line = f.readline()
+            if not line:
+                raise RuntimeError("Connection to edalize server closed")
+            event = json.loads(line.decode('utf-8'))
+            if event['event'] == 'finished':
+                pending -= 1
+            yield event
+
+def _parse_limit(s):
+    (tool, _, limit) = s.partition('=')
+    try:
+        return (tool, int(limit))
+    except ValueError:
+        raise argparse.ArgumentTypeError("Invalid limit '{}'. Expected TOOL=N".format(s))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='edalize')
+    subparsers = parser.add_subparsers(dest='command')
+    serve = subparsers.add_parser('serve', help='Run jobs received on a Unix domain socket')
+    serve.add_argument('--socket', required=True, help='Path of the socket')
+    serve.add_argument('--jobs', '-j', type=int, help='Maximum number of concurrent jobs (default: number of CPUs)')
+    serve.add_argument('--limit', type=_parse_limit, action='append', default=[],
+                       metavar='TOOL=N', help='Maximum number of concurrent jobs of TOOL')
+    args = parser.parse_args(argv)
+    if args.command != 'serve':
+        parser.print_help()
+        return 1
+
+    logging.basicConfig(level=logging.INFO)
+    server = Server(args.socket, args.jobs, dict(args.limit))
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(server.start())
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.run_until_complete(server.close())
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
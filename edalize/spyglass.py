@@ -6,6 +6,7 @@ import logging
 import re
 from collections import OrderedDict
 
+from edalize.build_graph import BuildGraph
 from edalize.edatool import Edatool
 
 logger = logging.getLogger(__name__)
@@ -47,6 +48,10 @@ Example snippet of a CAPI2 description file
 
     argtypes = ['vlogdefine', 'vlogparam']
 
+    license_errors = [r'License checkout failed',
+                      r'Failed to obtain \S+ license',
+                      r'FLEXnet Licensing error']
+
     tool_options_defaults = {
          'methodology': 'GuideWare/latest/block/rtl_handoff',
          'goals': [ 'lint/lint_rtl' ],
@@ -103,11 +108,8 @@ Example snippet of a CAPI2 description file
                              template_vars)
 
         # Create a single TCL file for each goal
-        goals = ['Design_Read'] + self.tool_options['goals']
-
-        for goal in goals:
+        for (goal, sanitized_goal) in self._goals():
             template_vars['goal'] = goal
-            sanitized_goal = re.sub(r"[^a-zA-Z0-9]", '_', goal).lower()
             template_vars['sanitized_goals'].append(sanitized_goal)
 
             self.render_template('spyglass-run-goal.tcl.j2',
@@ -115,9 +117,23 @@ Example snippet of a CAPI2 description file
                                  template_vars)
 
 
-        self.render_template('Makefile.j2',
-                             'Makefile',
-                             template_vars)
+        self._write_graph_makefile(self._render('Makefile.j2', template_vars))
+
+    def _goals(self):
+        # The goals with the names used for their TCL files
+        goals = ['Design_Read'] + self.tool_options['goals']
+        return [(goal, re.sub(r"[^a-zA-Z0-9]", '_', goal).lower()) for goal in goals]
+
+    def build_graph(self):
+        self._set_tool_options_defaults()
+        graph = BuildGraph()
+        for (goal, sanitized_goal) in self._goals():
+            graph.add('run-goal-' + sanitized_goal,
+                      ['sg_shell', '-enable_pass_exit_codes', '-tcl',
+                       'spyglass-run-%s.tcl' % sanitized_goal],
+                      inputs = ['spyglass-run-%s.tcl' % sanitized_goal],
+                      description = 'Running goal ' + goal)
+        return graph
 
     def src_file_filter(self, f):
         def _vhdl_source(f):
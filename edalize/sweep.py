@@ -0,0 +1,221 @@
+# Copyright edalize contributors
+# Licensed under the 2-Clause BSD License, see LICENSE for details.
+# SPDX-License-Identifier: BSD-2-Clause
+
+""" Parameter sweeps
+
+Run the same EDAM with many combinations of parameter values. Variants that
+only differ in run-time parameters share one configured and built work
+directory, so e.g. sweeping plusargs or seeds only compiles the design once.
+Variants with different compile-time parameters are built in separate work
+directories, spread over a pool of worker processes.
+
+Example::
+
+    from edalize.sweep import run_sweep
+
+    results = run_sweep('icarus', edam, 'build',
+                        {'WIDTH' : [8, 16],
+                         'seed'  : [1, 2, 3]},
+                        jobs=4)
+"""
+
+import copy
+import itertools
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from edalize import get_edatool
+from edalize.process import error_message
+
+logger = logging.getLogger(__name__)
+
+# Parameter types that are only used when running, not when building
+RUNTIME_PARAMTYPES = ['plusarg', 'cmdlinearg']
+
+def expand_sweep(sweep):
+    """ Expand a sweep specification to a list of variants
+
+    The specification is either a dict of parameter name to list of values,
+    which is expanded to all combinations of the values, or a list of dicts
+    with explicit parameter values for each variant.
+    """
+    if isinstance(sweep, dict):
+        names = list(sweep.keys())
+        return [OrderedDict(zip(names, values))
+                for values in itertools.product(*[sweep[n] for n in names])]
+    return [OrderedDict(v) for v in sweep]
+
+def group_variants(edam, variants):
+    """ Group variants that can share a build
+
+    Returns an ordered dict from the compile-time parameter values of a
+    group, as a sorted tuple of (name, value) pairs, to the list of
+    (index, variant) of the variants in the group
+    """
+    parameters = edam.get('parameters', {})
+    groups = OrderedDict()
+    for i, variant in enumerate(variants):
+        compile_time = []
+        for name, value in variant.items():
+            if not name in parameters:
+                raise RuntimeError("Sweep parameter '{}' is not defined in the EDAM".format(name))
+            if not parameters[name]['paramtype'] in RUNTIME_PARAMTYPES:
+                compile_time.append((name, value))
+        key = tuple(sorted(compile_time, key=lambda x: x[0]))
+        groups.setdefault(key, []).append((i, variant))
+    return groups
+
+def _split_variant(edam, variant):
+    parameters = edam.get('parameters', {})
+    return OrderedDict((k, v) for k, v in variant.items()
+                       if parameters[k]['paramtype'] in RUNTIME_PARAMTYPES)
+
+def _run_group(tool, edam, work_root, compile_time, variants, run, jobs=None):
+    """ Configure and build one group of variants and run each of them
+
+    This is run in a worker process. The output of the tools goes to
+    build.log in the group's work root instead of the console. Backends
+    that support run_many run up to jobs variants concurrently, each in
+    runs/run_<variant> below the work root. Other backends run the variants
+    one by one in the work root, logging to run_<variant>.log.
+
+    Errors of any kind fail the variants they affect instead of the sweep
+    """
+    with open(os.devnull, 'wb') as devnull:
+        return _run_group_variants(tool, edam, work_root, compile_time, variants,
+                                   run, jobs, devnull)
+
+def _run_group_variants(tool, edam, work_root, compile_time, variants, run, jobs, devnull):
+    edam = copy.deepcopy(edam)
+    for name, value in compile_time:
+        edam['parameters'][name]['default'] = value
+
+    os.makedirs(work_root, exist_ok=True)
+    results = []
+    backend = None
+    build_error = None
+    start = time.time()
+    try:
+        backend = get_edatool(tool)(edam=edam, work_root=work_root)
+        backend.log_file = 'build.log'
+        # Only logged, not echoed
+        backend.stdout = backend.stderr = devnull
+        backend.configure()
+        backend.build()
+    except Exception as e:
+        build_error = e
+    build_time = time.time() - start
+
+    run_results = {}
+    run_error = None
+    if run and not build_error:
+        try:
+            if backend.run_command(work_root) is not None:
+                _runs = backend.run_many([_split_variant(edam, v) for (_, v) in variants],
+                                         jobs=jobs)
+                run_results = {i : r for ((i, _), r) in zip(variants, _runs)}
+        except Exception as e:
+            run_error = e
+
+    for (i, variant) in variants:
+        result = {'variant'    : i,
+                  'parameters' : variant,
+                  'work_root'  : work_root,
+                  'build_time' : build_time,
+                  'run_time'   : None,
+                  'status'     : 'passed',
+                  'phase'      : None,
+                  'returncode' : 0,
+                  'error'      : None}
+        results.append(result)
+        if build_error:
+            result.update({'status'     : 'failed',
+                           'phase'      : 'build',
+                           'returncode' : getattr(build_error, 'returncode', None),
+                           'error'      : error_message(build_error)})
+            continue
+        if not run:
+            continue
+        if run_error:
+            result.update({'status'     : 'failed',
+                           'phase'      : 'run',
+                           'returncode' : None,
+                           'error'      : error_message(run_error)})
+            continue
+        if i in run_results:
+            r = run_results[i]
+            if r['status'] != 'passed':
+                result.update({'status'     : 'failed',
+                               'phase'      : 'run',
+                               'returncode' : r['returncode'],
+                               'error'      : r['error']})
+            result.update({'work_root' : r['run_dir'],
+                           'run_time'  : r['duration']})
+            continue
+        backend.log_file = 'run_{}.log'.format(i)
+        start = time.time()
+        try:
+            backend.run(_split_variant(edam, variant))
+        except Exception as e:
+            result.update({'status'     : 'failed',
+                           'phase'      : 'run',
+                           'returncode' : getattr(e, 'returncode', None),
+                           'error'      : error_message(e)})
+        result['run_time'] = time.time() - start
+    return results
+
+def run_sweep(tool, edam, work_root, sweep, jobs=None, run=True):
+    """ Build and run all variants of a parameter sweep
+
+    tool is the name of the backend and sweep a sweep specification as
+    described in expand_sweep. Each group of variants that share their
+    compile-time parameter values is built in work_root/build_<group> and
+    run once per variant. At most jobs groups (default: number of CPUs) are
+    handled in parallel, and the CPUs are shared between the concurrent runs
+    of each group. If run is False, the variants are only
+    configured and built.
+
+    Returns a list with one result dict per variant, which is also written
+    to work_root/sweep.json. Each result contains the variant index, its
+    parameter values, the work root it used, build and run times in
+    seconds, the status ('passed' or 'failed'), the failing phase, the
+    exit code and the error message.
+    """
+    variants = expand_sweep(sweep)
+    groups = group_variants(edam, variants)
+    os.makedirs(work_root, exist_ok=True)
+
+    jobs = jobs or os.cpu_count()
+    run_jobs = max(1, jobs // len(groups)) if groups else 1
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = []
+        for n, (compile_time, group) in enumerate(groups.items()):
+            _work_root = os.path.join(os.path.abspath(work_root), 'build_{}'.format(n))
+            logger.info("Sweep group {}: {} variant(s)".format(n, len(group)))
+            futures.append(executor.submit(_run_group, tool, edam, _work_root,
+                                           compile_time, group, run, run_jobs))
+        for (f, group) in zip(futures, groups.values()):
+            try:
+                results += f.result()
+            except Exception as e:
+                # The worker itself failed, e.g. because it was killed
+                results += [{'variant'    : i,
+                             'parameters' : variant,
+                             'work_root'  : None,
+                             'build_time' : None,
+                             'run_time'   : None,
+                             'status'     : 'failed',
+                             'phase'      : None,
+                             'returncode' : None,
+                             'error'      : error_message(e)} for (i, variant) in group]
+
+    results.sort(key=lambda r: r['variant'])
+    with open(os.path.join(work_root, 'sweep.json'), 'w') as f:
+        json.dump(results, f, indent=2, default=str)
+    return results
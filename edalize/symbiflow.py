@@ -8,6 +8,7 @@ import platform
 import re
 import subprocess
 
+from edalize.build_graph import BuildGraph
 from edalize.edatool import Edatool
 from edalize.yosys import Yosys
 from importlib import import_module
@@ -77,11 +78,11 @@ class Symbiflow(Edatool):
     def get_version(self):
         return "1.0"
 
-    def configure_vpr(self):
+    def _vpr_params(self):
         (src_files, incdirs) = self._get_fileset_files(force_slash=True)
 
-        has_vhdl = "vhdlSource" in [x.file_type for x in src_files]
-        has_vhdl2008 = "vhdlSource-2008" in [x.file_type for x in src_files]
+        has_vhdl = self.fileset.has_file_type("vhdlSource")
+        has_vhdl2008 = self.fileset.has_file_type("vhdlSource-2008")
 
         if has_vhdl or has_vhdl2008:
             logger.error("VHDL files are not supported in Yosys")
@@ -140,22 +141,78 @@ class Symbiflow(Edatool):
         # This file needs to be a bash file
         environment_script = self.tool_options.get('environment_script', None)
 
-        makefile_params = {
+        return {
             "top": self.toplevel,
-            "sources": " ".join(file_list),
+            "sources": file_list,
             "partname": partname,
             "part": part,
             "bitstream_device": bitstream_device,
-            "sdc": " ".join(timing_constraints),
-            "pcf": " ".join(pins_constraints),
-            "xdc": " ".join(placement_constraints),
+            "sdc": timing_constraints,
+            "pcf": pins_constraints,
+            "xdc": placement_constraints,
             "vpr_options": vpr_options,
             "device_suffix": device_suffix,
             "toolchain_prefix": 'symbiflow_',
             "environment_script": environment_script,
             "vendor": vendor,
         }
-        self.render_template("symbiflow-vpr-makefile.j2", "Makefile", makefile_params)
+
+    def configure_vpr(self):
+        self._write_graph_makefile(self._render("symbiflow-vpr-makefile.j2", self._vpr_params()))
+
+    def build_graph(self):
+        if self.tool_options.get("pnr") != "vtr":
+            return None
+        p = self._vpr_params()
+        top = p["top"]
+        device = p["part"] + "_" + p["device_suffix"]
+        partname_opt = ["-p" if p["vendor"] == "xilinx" else "-P", p["partname"]]
+        vpr_opts = ["--additional_vpr_options", p["vpr_options"]] if p["vpr_options"] else []
+        sdc_opts = ["-s"] + p["sdc"] if p["sdc"] else []
+        pcf_opts = ["-p"] + p["pcf"] if p["pcf"] else []
+        xdc_opts = ["-x"] + p["xdc"] if p["xdc"] else []
+
+        def _cmd(tool, args):
+            cmd = [p["toolchain_prefix"] + tool] + args
+            if p["environment_script"]:
+                cmd = ["bash", "-c", 'source {} && exec "$@"'.format(p["environment_script"]), "bash"] + cmd
+            return cmd
+
+        graph = BuildGraph()
+        graph.add("synth",
+                  _cmd("synth", ["-t", top, "-v"] + p["sources"] +
+                       ["-d", p["bitstream_device"]] + partname_opt + xdc_opts),
+                  outputs = [top + ".eblif"],
+                  description = "Synthesizing")
+        graph.add("pack",
+                  _cmd("pack", ["-e", top + ".eblif", "-d", device] + sdc_opts + vpr_opts),
+                  inputs = [top + ".eblif"],
+                  outputs = [top + ".net"],
+                  description = "Packing")
+        graph.add("place",
+                  _cmd("place", ["-e", top + ".eblif", "-d", device, "-n", top + ".net",
+                                 "-P", p["partname"]] + sdc_opts + pcf_opts + vpr_opts),
+                  inputs = [top + ".net"],
+                  outputs = [top + ".place"],
+                  description = "Placing")
+        graph.add("route",
+                  _cmd("route", ["-e", top + ".eblif", "-d", device] + sdc_opts + vpr_opts),
+                  inputs = [top + ".place"],
+                  outputs = [top + ".route"],
+                  description = "Routing")
+        graph.add("fasm",
+                  _cmd("write_fasm", ["-e", top + ".eblif", "-d", device] + sdc_opts + vpr_opts),
+                  inputs = [top + ".route"],
+                  outputs = [top + ".fasm"],
+                  description = "Writing FASM")
+        graph.add("bitstream",
+                  _cmd("write_bitstream", ["-d", p["bitstream_device"], "-f", top + ".fasm"] +
+                       partname_opt + ["-b", top + ".bit"]),
+                  inputs = [top + ".fasm"],
+                  outputs = [top + ".bit"],
+                  description = "Writing bitstream")
+        graph.default = ["bitstream"]
+        return graph
 
     def configure_main(self):
         if self.tool_options.get("pnr") == "vtr":
@@ -247,7 +247,6 @@ You can reproduce the example above with something like
         assert self.rtl_paths is not None
 
         src_path = os.path.join(self.work_root, src)
-        dst_path = os.path.join(self.work_root, self.sby_name)
 
         # Load the source sby file as a Jinja2 template. We load it directly
         # (rather than through self.jinja_env) because it's user-supplied,
@@ -270,7 +269,7 @@ You can reproduce the example above with something like
             'top_level': self.toplevel
         }
 
-        with open(dst_path, 'w') as df:
+        with self._open_output(self.sby_name) as df:
             df.write(template.render(template_ctxt))
 
     def _dump_file_lists(self):
@@ -282,9 +281,9 @@ You can reproduce the example above with something like
         incdirs.txt.
 
         '''
-        with open(os.path.join(self.work_root, 'files.txt'), 'w') as handle:
+        with self._open_output('files.txt') as handle:
             handle.write('\n'.join(self.rtl_paths) + '\n')
-        with open(os.path.join(self.work_root, 'incdirs.txt'), 'w') as handle:
+        with self._open_output('incdirs.txt') as handle:
             handle.write('\n'.join(self.incdirs) + '\n')
 
     def configure_main(self):
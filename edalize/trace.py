@@ -0,0 +1,176 @@
+# Copyright edalize contributors
+# Licensed under the 2-Clause BSD License, see LICENSE for details.
+# SPDX-License-Identifier: BSD-2-Clause
+
+""" Timeline tracing
+
+Records the phases of all backends, their hook scripts and tool invocations
+as spans and exports them in the Chrome trace event format, which can be
+opened in Perfetto (https://ui.perfetto.dev) or chrome://tracing.
+
+Tracing is off by default. Enable it from Python with::
+
+    from edalize import trace
+
+    trace.enable()
+    backend.configure()
+    backend.build()
+    trace.get_tracer().save('trace.json')
+
+or by setting the EDALIZE_TRACE environment variable to the path of the
+trace file, which is then written when the process exits. A '{pid}' in the
+path is replaced with the process id, so that concurrent edalize processes
+write separate files.
+
+Spans nest by time on each thread, so the configure phase of a sub-tool
+(e.g. Yosys inside Vivado) shows up under the configure_main phase of its
+parent. Progress events parsed from the tool output are recorded as instant
+events.
+"""
+
+import asyncio
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# asyncio.current_task was added in Python 3.7
+_current_task = getattr(asyncio, 'current_task', None) or asyncio.Task.current_task
+
+class Tracer(object):
+    """ Collects spans as Chrome trace events """
+
+    def __init__(self):
+        self.events = []
+        self._lock = threading.Lock()
+        self._tids = {}
+        self._pid = os.getpid()
+        # Trace timestamps are in microseconds relative to the start
+        self._t0 = time.perf_counter()
+
+    def _tid(self):
+        # Tasks on the event loop interleave, so each gets its own track
+        try:
+            task = _current_task()
+        except RuntimeError:
+            task = None
+        if task is None:
+            key = ('thread', threading.get_ident())
+            name = threading.current_thread().name
+        else:
+            key = ('task', id(task))
+            name = 'task {}'
+        with self._lock:
+            if not key in self._tids:
+                tid = len(self._tids) + 1
+                self._tids[key] = tid
+                self.events.append({'name' : 'thread_name',
+                                    'ph'   : 'M',
+                                    'pid'  : self._pid,
+                                    'tid'  : tid,
+                                    'args' : {'name' : name.format(tid)}})
+            return self._tids[key]
+
+    def _now(self):
+        return (time.perf_counter() - self._t0) * 1e6
+
+    @contextmanager
+    def span(self, name, cat='edalize', **args):
+        """ Record the duration of a with block
+
+        Yields the dict of span arguments, which can be updated inside the
+        block, e.g. with the exit code of a command.
+        """
+        tid = self._tid()
+        start = self._now()
+        try:
+            yield args
+        except BaseException as e:
+            args.setdefault('error', str(e) or e.__class__.__name__)
+            raise
+        finally:
+            event = {'name' : name,
+                     'cat'  : cat,
+                     'ph'   : 'X',
+                     'ts'   : start,
+                     'dur'  : self._now() - start,
+                     'pid'  : self._pid,
+                     'tid'  : tid,
+                     'args' : args}
+            with self._lock:
+                self.events.append(event)
+
+    def event(self, name, cat='edalize', **args):
+        """ Record an instant event """
+        event = {'name' : name,
+                 'cat'  : cat,
+                 'ph'   : 'i',
+                 's'    : 't',
+                 'ts'   : self._now(),
+                 'pid'  : self._pid,
+                 'tid'  : self._tid(),
+                 'args' : args}
+        with self._lock:
+            self.events.append(event)
+
+    def to_dict(self):
+        with self._lock:
+            events = list(self.events)
+        return {'traceEvents'     : events,
+                'displayTimeUnit' : 'ms'}
+
+    def save(self, path):
+        """ Write the trace as Chrome trace event JSON """
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, default=str)
+
+_tracer = None
+
+def get_tracer():
+    """ Get the active tracer, or None if tracing is disabled """
+    return _tracer
+
+def enable(tracer=None):
+    """ Start recording spans into tracer (or a new Tracer) and return it """
+    global _tracer
+    _tracer = tracer or Tracer()
+    return _tracer
+
+def disable():
+    """ Stop recording spans. Returns the tracer that was active """
+    global _tracer
+    (tracer, _tracer) = (_tracer, None)
+    return tracer
+
+@contextmanager
+def span(name, cat='edalize', **args):
+    """ Record a span with the active tracer, if any """
+    if _tracer is None:
+        yield args
+    else:
+        with _tracer.span(name, cat, **args) as _args:
+            yield _args
+
+def event(name, cat='edalize', **args):
+    """ Record an instant event with the active tracer, if any """
+    if _tracer is not None:
+        _tracer.event(name, cat, **args)
+
+def _save_at_exit(path):
+    tracer = get_tracer()
+    if tracer is None or os.getpid() != tracer._pid:
+        return
+    path = path.replace('{pid}', str(tracer._pid))
+    try:
+        tracer.save(path)
+    except (IOError, OSError) as e:
+        logger.warning("Unable to write trace file {}: {}".format(path, e))
+
+if os.environ.get('EDALIZE_TRACE'):
+    enable()
+    atexit.register(_save_at_exit, os.environ['EDALIZE_TRACE'])
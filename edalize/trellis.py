@@ -4,7 +4,7 @@
 
 import os.path
 
-from edalize.edatool import Edatool
+from edalize.edatool import Edatool, NEXTPNR_PROGRESS_PATTERNS
 from edalize.yosys import Yosys
 from importlib import import_module
 
@@ -12,6 +12,8 @@ class Trellis(Edatool):
 
     argtypes = ['vlogdefine', 'vlogparam']
 
+    progress_patterns = NEXTPNR_PROGRESS_PATTERNS
+
     @classmethod
     def get_doc(cls, api_ver):
         if api_ver == 0:
@@ -38,9 +40,7 @@ class Trellis(Edatool):
                     'members' : combined_members,
                     'lists' : combined_lists}
 
-    def configure_main(self):
-        # Write yosys script file
-        (src_files, incdirs) = self._get_fileset_files()
+    def _yosys(self):
         yosys_synth_options = self.tool_options.get('yosys_synth_options', [])
         yosys_synth_options = ["-nomux"] + yosys_synth_options
         yosys_edam = {
@@ -56,30 +56,44 @@ class Trellis(Edatool):
                                 }
                 }
 
-        yosys = getattr(import_module("edalize.yosys"), 'Yosys')(yosys_edam, self.work_root)
-        yosys.configure()
-
-        lpf_files = []
-        for f in src_files:
-            if f.file_type == 'LPF':
-                lpf_files.append(f.name)
-            elif f.file_type == 'user':
-                pass
-
-        if not lpf_files:
-            lpf_files = ['empty.lpf']
-            with open(os.path.join(self.work_root, lpf_files[0]), 'a'):
-                os.utime(os.path.join(self.work_root, lpf_files[0]), None)
-        elif len(lpf_files) > 1:
+        return getattr(import_module("edalize.yosys"), 'Yosys')(yosys_edam, self.work_root)
+
+    def _lpf_file(self):
+        lpf_files = [f.name for f in self.fileset.files_of_type('LPF')]
+        if len(lpf_files) > 1:
             raise RuntimeError("trellis backend supports only one LPF file. Found {}".format(', '.join(lpf_files)))
+        return lpf_files[0] if lpf_files else 'empty.lpf'
+
+    def configure_main(self):
+        # Write yosys script file
+        self._configure_subtool(self._yosys())
+
+        lpf_file = self._lpf_file()
+        if lpf_file == 'empty.lpf':
+            with open(os.path.join(self.work_root, lpf_file), 'a'):
+                os.utime(os.path.join(self.work_root, lpf_file), None)
 
         # Write Makefile
         nextpnr_options     = self.tool_options.get('nextpnr_options', [])
         template_vars = {
             'name'                : self.name,
-            'lpf_file'            : lpf_files[0],
+            'lpf_file'            : lpf_file,
             'nextpnr_options'     : nextpnr_options,
         }
-        self.render_template('trellis-makefile.j2',
-                             'Makefile',
-                             template_vars)
+        self._write_graph_makefile(self._render('trellis-makefile.j2', template_vars))
+
+    def build_graph(self):
+        graph = self._yosys().build_graph()
+        lpf_file = self._lpf_file()
+        graph.add('pnr',
+                  ['nextpnr-ecp5', '-l', 'next.log'] + self.tool_options.get('nextpnr_options', []) +
+                  ['--lpf', lpf_file, '--json', self.name + '.json', '--textcfg', self.name + '.config'],
+                  inputs = [lpf_file, self.name + '.json'],
+                  outputs = [self.name + '.config'],
+                  description = 'Place and route with nextpnr')
+        graph.add('bitstream',
+                  ['ecppack', '--svf', self.name + '.svf', self.name + '.config', self.name + '.bit'],
+                  inputs = [self.name + '.config'],
+                  outputs = [self.name + '.bit', self.name + '.svf'],
+                  description = 'Generating bitstream')
+        return graph
@@ -5,6 +5,7 @@
 import os
 import logging
 
+from edalize.build_graph import BuildGraph
 from edalize.edatool import Edatool
 
 logger = logging.getLogger(__name__)
@@ -39,14 +40,10 @@ Example snippet of a CAPI2 description file for VCS:
 
     argtypes = ['plusarg', 'vlogdefine', 'vlogparam']
 
+    license_errors = [r'Failed to obtain \S+ license',
+                      r'FLEXnet Licensing error',
+                      r'License checkout failed']
 
-    def _filelist_has_filetype(self, file_list, string, match_type='prefix'):
-        for f in file_list:
-            if match_type == 'prefix' and f.file_type.startswith(string):
-                return True
-            elif match_type == 'exact' and f.file_type == string:
-                return True
-        return False
 
     def configure_main(self):
 
@@ -67,24 +64,33 @@ Example snippet of a CAPI2 description file for VCS:
             for key, value in self.plusarg.items():
                 plusargs += ['+{}={}'.format(key, self._param_value_str(value))]
 
-        vcs_options = self.tool_options.get('vcs_options', [])
-
-        (src_files, incdirs) = self._get_fileset_files(force_slash=True)
-        if self._filelist_has_filetype(src_files, 'systemVerilog', match_type = 'prefix'):
-            vcs_options.append('-sverilog')
-
-        if self._filelist_has_filetype(src_files, 'verilog2001', match_type = 'exact'):
-            vcs_options.append('+v2k')
-
         template_vars = {
             'name'              : self.name,
-            'vcs_options'       : vcs_options,
             'run_options'       : self.tool_options.get('run_options', []),
-            'toplevel'          : self.toplevel,
             'plusargs'          : plusargs
         }
 
-        self.render_template('Makefile.j2', 'Makefile', template_vars)
+        self._write_graph_makefile(self._render('Makefile.j2', template_vars))
+
+    def _vcs_options(self):
+        vcs_options = list(self.tool_options.get('vcs_options', []))
+
+        if self.fileset.has_file_type('systemVerilog', prefix=True):
+            vcs_options.append('-sverilog')
+
+        if self.fileset.has_file_type('verilog2001'):
+            vcs_options.append('+v2k')
+        return vcs_options
+
+    def build_graph(self):
+        graph = BuildGraph()
+        graph.add('compile',
+                  ['vcs', '-full64', '-top', self.toplevel, '-f', self.name + '.scr',
+                   '-o', self.name] + self._vcs_options(),
+                  inputs = [self.name + '.scr'],
+                  outputs = [self.name],
+                  description = 'Compiling simulation model')
+        return graph
 
     def run_main(self):
         args = ['run']
@@ -97,3 +103,9 @@ Example snippet of a CAPI2 description file for VCS:
             args.append('EXTRA_OPTIONS='+' '.join(plusargs))
 
         self._run_tool('make', args)
+
+    def run_command(self, run_dir):
+        args = [os.path.join(os.path.abspath(self.work_root), self.name), '-l', 'vcs.log']
+        for key, value in self.plusarg.items():
+            args.append('+{}={}'.format(key, self._param_value_str(value)))
+        return args + self.tool_options.get('run_options', [])
@@ -5,7 +5,6 @@
 import logging
 import re
 import os
-import subprocess
 
 from edalize.edatool import Edatool
 
@@ -56,12 +55,12 @@ class Veribleformat(Edatool):
             logger.debug("Running " + ' '.join(cmd))
 
             try:
-                res = subprocess.run(cmd, cwd = self.work_root, check=False)
+                (returncode, _, _) = self._run_process(cmd)
             except FileNotFoundError:
                 _s = "Command '{}' not found. Make sure it is in $PATH"
                 raise RuntimeError(_s.format(cmd[0]))
 
-            if res.returncode != 0:
+            if returncode != 0:
                 fail = True
         if fail:
             raise RuntimeError("Verible returned a non-zero exit code.")
@@ -5,7 +5,6 @@
 import logging
 import re
 import os
-import subprocess
 
 from edalize.edatool import Edatool
 
@@ -83,12 +82,12 @@ class Veriblelint(Edatool):
             logger.debug("Running " + ' '.join(cmd))
 
             try:
-                res = subprocess.run(cmd, cwd = self.work_root, check=False)
+                (returncode, _, _) = self._run_process(cmd)
             except FileNotFoundError:
                 _s = "Command '{}' not found. Make sure it is in $PATH"
                 raise RuntimeError(_s.format(cmd[0]))
 
-            if res.returncode != 0:
+            if returncode != 0:
                 lint_fail = True
         if lint_fail:
             raise RuntimeError("Lint failed")
@@ -41,6 +41,8 @@ class Verilator(Edatool):
 
     argtypes = ['cmdlinearg', 'plusarg', 'vlogdefine', 'vlogparam']
 
+    fatal_errors = [r'^%Error']
+
     @classmethod
     def get_doc(cls, api_ver):
         if api_ver == 0:
@@ -51,7 +53,10 @@ class Verilator(Edatool):
                          'desc' : 'Select compilation mode. Legal values are *cc* for C++ testbenches, *sc* for SystemC testbenches or *lint-only* to only perform linting on the Verilog code'},
                         {'name' : 'cli_parser',
                          'type' : 'String',
-                         'desc' : '**Deprecated: Use run_options instead** : Select whether FuseSoC should handle command-line arguments (*managed*) or if they should be passed directly to the verilated model (*raw*). Default is *managed*'}],
+                         'desc' : '**Deprecated: Use run_options instead** : Select whether FuseSoC should handle command-line arguments (*managed*) or if they should be passed directly to the verilated model (*raw*). Default is *managed*'},
+                        {'name' : 'jobs',
+                         'type' : 'Integer',
+                         'desc' : 'Number of parallel jobs when building the model. Defaults to the job slots of the jobserver if there is one, otherwise to twice the number of CPUs'}],
                     'lists' : [
                         {'name' : 'libs',
                          'type' : 'String',
@@ -88,7 +93,7 @@ class Verilator(Edatool):
 
         self.verilator_file = self.name + '.vc'
 
-        with open(os.path.join(self.work_root,self.verilator_file),'w') as f:
+        with self._open_output(self.verilator_file) as f:
             f.write('--Mdir .\n')
             modes = ['sc', 'cc', 'lint-only']
 
@@ -131,7 +136,7 @@ class Verilator(Edatool):
             f.write(''.join(['-G{}={}\n'.format(key, self._param_value_str(value, str_quote_style='\\"')) for key, value in self.vlogparam.items()]))
             f.write(''.join(['-D{}={}\n'.format(key, self._param_value_str(value)) for key, value in self.vlogdefine.items()]))
 
-        with open(os.path.join(self.work_root, 'Makefile'), 'w') as makefile:
+        with self._open_output('Makefile') as makefile:
             makefile.write(MAKEFILE_TEMPLATE)
 
         if 'verilator_options' in self.tool_options:
@@ -144,7 +149,7 @@ class Verilator(Edatool):
         else:
             make_options = ''
 
-        with open(os.path.join(self.work_root, 'config.mk'), 'w') as config_mk:
+        with self._open_output('config.mk') as config_mk:
             config_mk.write(CONFIG_MK_TEMPLATE.format(
                 top_module        = self.toplevel,
                 vc_file           = self.verilator_file,
@@ -156,15 +161,27 @@ class Verilator(Edatool):
         if not 'mode' in self.tool_options:
             self.tool_options['mode'] = 'cc'
 
-        # Do parallel builds with <number of cpus> * 2 jobs.
-        make_job_count = multiprocessing.cpu_count() * 2
-        args = ['-j', str(make_job_count)]
+        # Do parallel builds with the requested number of jobs, or with
+        # <number of cpus> * 2 jobs unless make takes its job slots from a
+        # jobserver
+        if 'jobs' in self.tool_options:
+            args = ['-j', str(self.tool_options['jobs'])]
+        elif self.jobserver:
+            args = []
+        else:
+            make_job_count = multiprocessing.cpu_count() * 2
+            args = ['-j', str(make_job_count)]
 
         if self.tool_options['mode'] == 'lint-only':
             args.append('V'+self.toplevel+'.mk')
         _s = os.path.join(self.work_root, 'verilator.{}.log')
         self._run_tool('make', args, quiet=True)
 
+    def build_artifacts(self):
+        if self.tool_options.get('mode', 'cc') == 'lint-only':
+            return []
+        return ['V' + self.toplevel]
+
     def run_main(self):
         self.check_managed_parser()
         self.args = []
@@ -182,3 +199,14 @@ class Verilator(Edatool):
             return
         logger.info("Running simulation")
         self._run_tool('./V' + self.toplevel, self.args)
+
+    def run_command(self, run_dir):
+        self.check_managed_parser()
+        if self.tool_options.get('mode', 'cc') == 'lint-only':
+            return None
+        args = [os.path.join(os.path.abspath(self.work_root), 'V' + self.toplevel)]
+        for key, value in self.plusarg.items():
+            args.append('+{}={}'.format(key, self._param_value_str(value)))
+        for key, value in self.cmdlinearg.items():
+            args.append('--{}={}'.format(key, self._param_value_str(value)))
+        return args + self.tool_options.get('run_options', [])
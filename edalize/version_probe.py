@@ -0,0 +1,143 @@
+# Copyright edalize contributors
+# Licensed under the 2-Clause BSD License, see LICENSE for details.
+# SPDX-License-Identifier: BSD-2-Clause
+
+""" Cached tool version probes
+
+Backends that need the version of a tool run it with a version option and
+parse the output. Some tools take seconds to start, so the output is
+cached, in memory and on disk in the edalize cache directory. The cache is
+keyed by the resolved path of the executable together with its inode,
+size and modification time and by the environment, so installing another
+version, changing $PATH to point to another installation or setting
+variables that the tool reads gives a new probe. Concurrent probes
+of the same command wait for the first one instead of starting the tool
+again.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+
+from edalize import get_cache_dir
+
+logger = logging.getLogger(__name__)
+
+# Variables that shells change between commands, but that don't change the
+# version a tool reports
+_VOLATILE_ENV = {'_', 'OLDPWD', 'PWD', 'SHLVL'}
+
+class VersionProbe(object):
+    """ Runs version commands and caches their output
+
+    The disk cache is kept in directory. None disables it
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._outputs = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _key(self, cmd, env):
+        env = os.environ if env is None else env
+        path = shutil.which(cmd[0], path=env.get('PATH'))
+        if path is None:
+            return None
+        path = os.path.realpath(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        key = [path, st.st_ino, st.st_size, st.st_mtime_ns, list(cmd[1:]),
+               sorted((k, v) for (k, v) in env.items() if not k in _VOLATILE_ENV)]
+        return hashlib.sha256(json.dumps(key).encode('utf-8')).hexdigest()
+
+    def output(self, cmd, env=None, timeout=60):
+        """ Get the standard output of cmd as a string
+
+        Returns None if the command can't be found or run
+        """
+        key = self._key(cmd, env)
+        if key is None:
+            return None
+        with self._lock:
+            if key in self._outputs:
+                return self._outputs[key]
+            pending = self._pending.get(key)
+            if pending is None:
+                self._pending[key] = threading.Event()
+        if pending:
+            pending.wait()
+            return self._outputs.get(key)
+
+        output = None
+        try:
+            output = self._load(key)
+            if output is None:
+                output = self._run(cmd, env, timeout)
+                if output is not None:
+                    self._save(key, cmd, output)
+        finally:
+            with self._lock:
+                self._outputs[key] = output
+                self._pending.pop(key).set()
+        return output
+
+    def _run(self, cmd, env, timeout):
+        logger.debug("Probing version with " + ' '.join(cmd))
+        try:
+            cp = subprocess.run(cmd,
+                                stdin = subprocess.DEVNULL,
+                                stdout = subprocess.PIPE,
+                                stderr = subprocess.DEVNULL,
+                                env = os.environ if env is None else env,
+                                timeout = timeout)
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.debug("Version probe failed: {}".format(e))
+            return None
+        return cp.stdout.decode(errors='replace')
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def _load(self, key):
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key)) as f:
+                return json.load(f)['output']
+        except (IOError, OSError, ValueError, KeyError):
+            return None
+
+    def _save(self, key, cmd, output):
+        if not self.directory:
+            return
+        try:
+            (fd, tmp) = tempfile.mkstemp(prefix='.tmp-', dir=self.directory)
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'cmd' : cmd, 'output' : output}, f)
+            os.replace(tmp, self._path(key))
+        except (IOError, OSError) as e:
+            logger.debug("Unable to cache version probe: {}".format(e))
+
+    def clear(self):
+        """ Forget the outputs kept in memory """
+        with self._lock:
+            self._outputs.clear()
+
+_version_probe = None
+_version_probe_lock = threading.Lock()
+
+def get_version_probe():
+    """ Get the VersionProbe shared by all backends """
+    global _version_probe
+    with _version_probe_lock:
+        if _version_probe is None:
+            _version_probe = VersionProbe(get_cache_dir('versions'))
+        return _version_probe
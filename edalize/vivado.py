@@ -6,9 +6,10 @@ import logging
 import os.path
 import platform
 import re
-import subprocess
 
 from edalize.edatool import Edatool
+from edalize.build_graph import BuildGraph
+from edalize.version_probe import get_version_probe
 from edalize.yosys import Yosys
 from importlib import import_module
 
@@ -29,6 +30,18 @@ class Vivado(Edatool):
 
     argtypes = ['vlogdefine', 'vlogparam', 'generic']
 
+    license_errors = [r'ERROR: \[Common 17-345\]',
+                      r'ERROR: \[Common 17-348\]',
+                      r'FLEXnet Licensing error']
+
+    fatal_errors = [r'^ERROR:']
+
+    # Directories of a project besides the project file, named after it
+    project_dirs = ['.srcs', '.runs', '.gen', '.cache', '.hw', '.ip_user_files']
+
+    progress_patterns = [r'^Phase (?P<step>\d+(?:\.\d+)* [^|]+?)(?: \|.*)?$',
+                         r'^Starting (?P<step>.+?) Task$']
+
     @classmethod
     def get_doc(cls, api_ver):
         if api_ver == 0:
@@ -63,20 +76,21 @@ class Vivado(Edatool):
     """ Get tool version
 
     This gets the Vivado version by running vivado -version and
-    parsing the output. If this command fails, "unknown" is returned
+    parsing the output. If this command fails, "unknown" is returned.
+    The output is cached as long as the vivado executable is unchanged
     """
     def get_version(self):
 
         version = "unknown"
-        try:
-            vivado_text = subprocess.Popen(["vivado", "-version"], stdout=subprocess.PIPE, env=os.environ).communicate()[0]
-            version_exp = r'Vivado.*(?P<version>v.*) \(.*'
-
-            match = re.search(version_exp, str(vivado_text))
-            if match is not None:
-                version = match.group('version')
-        except Exception:
+        vivado_text = get_version_probe().output(["vivado", "-version"])
+        if vivado_text is None:
             logger.warning("Unable to recognize Vivado version")
+            return version
+
+        version_exp = r'Vivado.*(?P<version>v.*) \(.*'
+        match = re.search(version_exp, vivado_text)
+        if match is not None:
+            version = match.group('version')
 
         return version
 
@@ -90,33 +104,16 @@ class Vivado(Edatool):
 
         self.jinja_env.filters["src_file_filter"] = self.src_file_filter
 
-        has_vhdl = "vhdlSource" in [x.file_type for x in src_files]
-        has_vhdl2008 = "vhdlSource-2008" in [x.file_type for x in src_files]
-        has_xci = "xci" in [x.file_type for x in src_files]
+        has_vhdl = self.fileset.has_file_type("vhdlSource")
+        has_vhdl2008 = self.fileset.has_file_type("vhdlSource-2008")
+        has_xci = self.fileset.has_file_type("xci")
 
         self.synth_tool = self.tool_options.get("synth", "vivado")
         if self.synth_tool == "yosys":
             if has_vhdl or has_vhdl2008:
                 logger.error("VHDL files are not supported in Yosys.")
 
-            yosys_synth_options = self.tool_options.get('yosys_synth_options', '')
-            yosys_edam = {
-                    'files'         : self.files,
-                    'name'          : self.name,
-                    'toplevel'      : self.toplevel,
-                    'parameters'    : self.parameters,
-                    'tool_options'  : {'yosys' : {
-                                            'arch' : 'xilinx',
-                                            'output_format' : 'edif',
-                                            'yosys_synth_options' : yosys_synth_options,
-                                            'yosys_as_subtool' : True,
-                                            'script_name'   : 'yosys.tcl',
-                                            }
-                                    }
-                    }
-
-            yosys = getattr(import_module("edalize.yosys"), 'Yosys')(yosys_edam, self.work_root)
-            yosys.configure()
+            self._configure_subtool(self._yosys())
 
 
         template_vars = {
@@ -133,9 +130,9 @@ class Vivado(Edatool):
         }
 
         if self.synth_tool == 'yosys':
-            xdc_file = next((f for f in src_files if f.file_type == 'xdc'), None)
+            xdc_file = next(iter(self.fileset.files_of_type('xdc')), None)
             if xdc_file is not None:
-                xdc_file = xdc_file.name
+                xdc_file = xdc_file.slash_name
             self.render_template('vivado-project-yosys.tcl.j2',
                                  self.name+'.tcl',
                                  {'name' : self.name,
@@ -173,18 +170,36 @@ class Vivado(Edatool):
         vivado_settings = self.tool_options.get('vivado-settings', None)
         vivado_command = "source {} && vivado".format(vivado_settings) if vivado_settings else "vivado"
 
-        self.render_template('vivado-makefile.j2',
-                             'Makefile',
-                             {'name' : self.name,
-                              'part' : self.tool_options.get('part', ""),
-                              'bitstream' : self.name+'.bit',
-                              'yosys' : True if self.synth_tool == 'yosys' else None,
-                              'vivado_command': vivado_command
-                              })
+        self._write_graph_makefile(
+            self._render('vivado-makefile.j2',
+                         {'name' : self.name,
+                          'part' : self.tool_options.get('part', ""),
+                          'bitstream' : self.name+'.bit',
+                          'vivado_command': vivado_command
+                          }))
 
         self.render_template('vivado-program.tcl.j2',
                              self.name+"_pgm.tcl")
 
+    def _yosys(self):
+        yosys_synth_options = self.tool_options.get('yosys_synth_options', '')
+        yosys_edam = {
+                'files'         : self.files,
+                'name'          : self.name,
+                'toplevel'      : self.toplevel,
+                'parameters'    : self.parameters,
+                'tool_options'  : {'yosys' : {
+                                        'arch' : 'xilinx',
+                                        'output_format' : 'edif',
+                                        'yosys_synth_options' : yosys_synth_options,
+                                        'yosys_as_subtool' : True,
+                                        'script_name'   : 'yosys.tcl',
+                                        }
+                                }
+                }
+
+        return getattr(import_module("edalize.yosys"), 'Yosys')(yosys_edam, self.work_root)
+
     def src_file_filter(self, f):
         def _vhdl_source(f):
             s = 'read_vhdl'
@@ -218,13 +233,62 @@ class Vivado(Edatool):
 
     def build_main(self):
         logger.info("Building")
-        args = []
+        target = None
         if 'pnr' in self.tool_options:
             if self.tool_options['pnr'] == 'vivado':
                 pass
             elif self.tool_options['pnr'] == 'none':
-                args.append('synth')
-        self._run_tool('make', args, quiet=True)
+                target = 'synth'
+        self._run_build(target)
+
+    def build_graph(self):
+        vivado_settings = self.tool_options.get('vivado-settings', None)
+        def _vivado(args):
+            if vivado_settings:
+                return ['bash', '-c', 'source {} && exec vivado "$@"'.format(vivado_settings), 'vivado'] + args
+            return ['vivado'] + args
+
+        xpr = self.name + '.xpr'
+        if self.tool_options.get('synth', 'vivado') == 'yosys':
+            graph = self._yosys().build_graph()
+            synth_outputs = [self.name + '.edif']
+        else:
+            graph = BuildGraph()
+            synth_outputs = [self.name + '.runs/synth_1/__synthesis_is_complete__']
+        graph.add('project',
+                  _vivado(['-notrace', '-mode', 'batch', '-source', self.name + '.tcl']),
+                  inputs = [self.name + '.tcl'],
+                  outputs = [xpr],
+                  description = 'Creating Vivado project')
+        if not 'synth' in graph.steps:
+            graph.add('synth',
+                      _vivado(['-notrace', '-mode', 'batch', '-source', self.name + '_synth.tcl', xpr]),
+                      inputs = [self.name + '_synth.tcl', xpr],
+                      outputs = synth_outputs,
+                      description = 'Synthesizing with Vivado')
+            # Like in the Makefile, the implementation run synthesizes
+            # again by itself
+            bitstream_inputs = []
+        else:
+            bitstream_inputs = synth_outputs
+        graph.add('bitstream',
+                  _vivado(['-notrace', '-mode', 'batch', '-source', self.name + '_run.tcl', xpr]),
+                  inputs = [self.name + '_run.tcl', xpr] + bitstream_inputs,
+                  outputs = [self.name + '.bit'],
+                  description = 'Implementing with Vivado')
+        graph.default = ['bitstream']
+        return graph
+
+    def build_artifacts(self):
+        # Nothing worth caching when only synthesizing. The whole project
+        # is cached, so that it can still be opened and rebuilt after a
+        # restore. The project file is restored first and the bitstream
+        # last, so that make sees everything as up to date
+        if self.tool_options.get('pnr') == 'none':
+            return []
+        project_dirs = [self.name + ext for ext in self.project_dirs
+                        if os.path.isdir(os.path.join(self.work_root, self.name + ext))]
+        return [self.name + '.xpr'] + project_dirs + [self.name + '.bit']
 
     """ Program the FPGA
 
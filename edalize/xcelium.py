@@ -49,6 +49,9 @@ run: $(VPI_MODULES)
 run-gui: $(VPI_MODULES)
 	$(XRUN_CALL) -gui -access rwc
 
+elaborate: $(VPI_MODULES)
+	$(XRUN_CALL) -elaborate
+
 clean: {clean_targets}
 """
 
@@ -71,6 +74,9 @@ class Xcelium(Edatool):
 
     argtypes = ['plusarg', 'vlogdefine', 'vlogparam', 'generic']
 
+    license_errors = [r'\*[EF],NOLICN',
+                      r'FLEXnet Licensing error']
+
     @classmethod
     def get_doc(cls, api_ver):
         if api_ver == 0:
@@ -91,7 +97,7 @@ class Xcelium(Edatool):
                         ]}
 
     def _write_build_rtl_f_file(self, tcl_main):
-        tcl_build_rtl  = open(os.path.join(self.work_root, "edalize_build_rtl.f"), 'w')
+        tcl_build_rtl  = self._open_output("edalize_build_rtl.f")
 
         (src_files, incdirs) = self._get_fileset_files()
         vlog_include_dirs = ['+incdir+'+d.replace('\\','/') for d in incdirs]
@@ -138,9 +144,10 @@ class Xcelium(Edatool):
                 args += [f.name.replace('\\','/')]
                 line = "-makelib {} {} -endlib".format(f.logical_name, ' '.join(args))
                 tcl_build_rtl.write(line + '\n')
+        tcl_build_rtl.close()
 
     def _write_makefile(self):
-        vpi_make = open(os.path.join(self.work_root, "Makefile"), 'w')
+        vpi_make = self._open_output("Makefile")
         _parameters = []
         for key, value in self.vlogparam.items():
             _parameters += ['{}={}'.format(key, self._param_value_str(value))]
@@ -178,7 +185,7 @@ class Xcelium(Edatool):
         vpi_make.close()
 
     def configure_main(self):
-        tcl_main = open(os.path.join(self.work_root, "edalize_main.f"), 'w')
+        tcl_main = self._open_output("edalize_main.f")
         tcl_main.write("-f edalize_build_rtl.f\n")
 
         self._write_build_rtl_f_file(tcl_main)
@@ -196,3 +203,24 @@ class Xcelium(Edatool):
             args.append('PLUSARGS='+' '.join(plusargs))
 
         self._run_tool('make', args)
+
+    def run_many_pre(self):
+        # xrun compiles and elaborates as part of the run, so the snapshot
+        # that the runs share is made here
+        self._run_tool('make', ['elaborate'])
+
+    def run_command(self, run_dir):
+        work_root = os.path.abspath(self.work_root)
+        args = ['xrun', '-R', '-q']
+        for m in self.vpi_modules:
+            args += ['-pli', os.path.join(work_root, m['name'])]
+        _xmsim_options = self.tool_options.get('xmsim_options', [])
+        if _xmsim_options:
+            args += ['-xmsimargs', ' '.join(_xmsim_options)]
+        for key, value in self.plusarg.items():
+            args.append('+{}={}'.format(key, self._param_value_str(value)))
+        return args
+
+    def run_links(self):
+        # xrun -R runs the last snapshot in xcelium.d of the working directory
+        return ['xcelium.d']
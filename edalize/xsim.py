@@ -68,7 +68,7 @@ XSIM_OPTIONS  = {xsim_options}
 
     def _write_config_files(self):
         mfc = self.tool_options.get('compilation_mode') == 'common'
-        with open(os.path.join(self.work_root, self.name+'.prj'),'w') as f:
+        with self._open_output(self.name+'.prj') as f:
             mfcu = []
             (src_files, self.incdirs) = self._get_fileset_files()
             for src_file in src_files:
@@ -98,7 +98,7 @@ XSIM_OPTIONS  = {xsim_options}
             if mfc:
                 f.write('sv work ' + ' '.join(mfcu))
 
-        with open(os.path.join(self.work_root, 'config.mk'), 'w') as f:
+        with self._open_output('config.mk') as f:
             vlog_defines  = ' '.join(['--define {}={}'.format(k,self._param_value_str(v)) for k,v, in self.vlogdefine.items()])
             vlog_includes = ' '.join(['-i '+k for k in self.incdirs])
 
@@ -128,7 +128,7 @@ XSIM_OPTIONS  = {xsim_options}
                                                    xelab_options = xelab_options,
                                                    xsim_options  = xsim_options))
 
-        with open(os.path.join(self.work_root, 'Makefile'), 'w') as f:
+        with self._open_output('Makefile') as f:
             f.write(self.MAKEFILE_TEMPLATE)
 
     def run_main(self):
@@ -139,3 +139,13 @@ XSIM_OPTIONS  = {xsim_options}
             args.append('EXTRA_OPTIONS='+' '.join([_s.format(k, v) for k,v in self.plusarg.items()]))
 
         self._run_tool('make', args)
+
+    def run_command(self, run_dir):
+        args = ['xsim', '-R'] + self.tool_options.get('xsim_options', []) + [self.name]
+        for key, value in self.plusarg.items():
+            args += ['--testplusarg', '{}={}'.format(key, value)]
+        return args
+
+    def run_links(self):
+        # xsim loads the snapshot from xsim.dir in the working directory
+        return ['xsim.dir']
@@ -5,6 +5,7 @@
 import logging
 import os.path
 
+from edalize.build_graph import BuildGraph
 from edalize.edatool import Edatool
 
 logger = logging.getLogger(__name__)
@@ -89,7 +90,6 @@ class Yosys(Edatool):
                 'synth_command'       : "synth_" + arch,
                 'synth_options'       : " ".join(self.tool_options.get('yosys_synth_options', '')),
                 'write_command'       : "write_" + output_format,
-                'default_target'      : output_format,
                 'edif_opts'           : '-pvector bra' if arch=='xilinx' else '',
                 'script_name'         : script_name,
                 'name'                : self.name
@@ -100,7 +100,28 @@ class Yosys(Edatool):
                              template_vars)
 
         makefile_name = self.name + '.mk' if part_of_toolchain else 'Makefile'
-        self.render_template('yosys-makefile.j2',
-                             makefile_name,
-                             template_vars)
-
+        self._write_graph_makefile(self._render('yosys-makefile.j2', template_vars),
+                             makefile_name)
+
+    def build_artifacts(self):
+        if self.tool_options.get('yosys_as_subtool', False):
+            return []
+        return [self.name + '.' + self.tool_options.get('output_format', 'blif')]
+
+    def build_graph(self, graph=None):
+        """ Get the build graph, or add the synthesis step to graph
+
+        Backends using Yosys as a sub-tool pass their own graph, so that
+        synthesis and the later stages end up in one flat graph
+        """
+        script_name = self.tool_options.get('script_name', self.name + '.tcl')
+        if graph is None:
+            graph = BuildGraph()
+        # The script always writes all three netlist formats
+        graph.add('synth',
+                  ['yosys', '-l', 'yosys.log', '-p', 'tcl ' + script_name],
+                  inputs = [script_name] + [f['name'] for f in self.files
+                                            if f.get('file_type', '').startswith(('verilogSource', 'systemVerilogSource', 'tclSource'))],
+                  outputs = [self.name + ext for ext in ['.blif', '.json', '.edif']],
+                  description = 'Synthesizing with Yosys')
+        return graph
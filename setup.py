@@ -32,7 +32,6 @@ setup(
         'templates/quartus/quartus-std-makefile.j2',
         'templates/quartus/quartus-pro-makefile.j2',
         'templates/trellis/trellis-makefile.j2',
-        'templates/ascentlint/Makefile.j2',
         'templates/ascentlint/run-ascentlint.tcl.j2',
         'templates/symbiflow/symbiflow-vpr-makefile.j2',
         'templates/libero/libero-project.tcl.j2',
@@ -59,6 +58,11 @@ setup(
         # https://github.com/pallets/jinja/issues/1138
         'Jinja2>=2.11.3',
     ],
+    entry_points={
+        'console_scripts': [
+            'edalize = edalize.server:main',
+        ],
+    },
     tests_require=[
         'pytest>=3.3.0',
         'vunit_hdl>=4.0.8'
@@ -67,6 +71,7 @@ setup(
     # all Edalize users.
     extras_require={
         "reporting": ["pyparsing", "pandas"],
+        "yaml": ["pyyaml"],
     },
     # Supported Python versions: 3.5+
     python_requires=">=3.5, <4",
@@ -0,0 +1,12 @@
+import pytest
+
+
+@pytest.fixture(scope='session')
+def edalize_cache_dir(tmp_path_factory):
+    return str(tmp_path_factory.mktemp('edalize-cache'))
+
+@pytest.fixture(autouse=True)
+def _isolated_cache_dir(monkeypatch, edalize_cache_dir):
+    #Keep the persistent caches (templates, tool registry, version probes
+    #etc) of the tests out of the cache directory of the user
+    monkeypatch.setenv('EDALIZE_CACHE_DIR', edalize_cache_dir)
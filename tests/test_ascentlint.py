@@ -15,3 +15,32 @@ def test_ascentlint_defaults(make_edalize_test):
     tf.backend.build()
 
     tf.compare_files(['ascentlint.cmd'])
+
+
+def test_ascentlint_build_graph(make_edalize_test):
+    """ Test running Ascent Lint with the python build runner """
+    import os
+    import pytest
+
+    tf = make_edalize_test('ascentlint',
+                           test_name='test_ascentlint',
+                           param_types=['vlogdefine', 'vlogparam'],
+                           ref_dir='defaults',
+                           tool_options={'build_runner' : 'python'})
+
+    tf.backend.configure()
+    tf.backend.build()
+    tf.compare_files(['ascentlint.cmd'])
+    assert [(r['name'], r['status']) for r in tf.backend.step_results] == \
+        [('ascentlint', 'built'), ('report-violations', 'built')]
+
+    #The check runs every time, like a phony target
+    tf.backend.build()
+    assert [(r['name'], r['status']) for r in tf.backend.step_results] == \
+        [('ascentlint', 'up-to-date'), ('report-violations', 'built')]
+
+    with open(os.path.join(tf.work_root, 'ascentlint.log'), 'w') as f:
+        f.write('Found 3 error lint violations\n')
+    step = tf.backend.build_graph().steps['report-violations']
+    with pytest.raises(RuntimeError):
+        tf.backend._run_build_step(step)
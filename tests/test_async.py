@@ -0,0 +1,67 @@
+import pytest
+
+
+def test_async_build_cancel(tmpdir):
+    import asyncio
+    import os.path
+    from edalize import get_edatool
+
+    if not os.path.exists('/proc/self/stat'):
+        pytest.skip("Requires /proc")
+
+    work_root = str(tmpdir)
+    hooks = {'pre_build' : [
+        {'cmd' : ['sh', '-c', 'sleep 60 & echo $! > child.pid; wait'],
+         'name' : 'sleeper'}]}
+    backend = get_edatool('icarus')(edam={'name' : 'test_async_build_cancel',
+                                          'hooks' : hooks},
+                                    work_root=work_root)
+    pid_file = os.path.join(work_root, 'child.pid')
+
+    async def main():
+        task = asyncio.ensure_future(backend.build_async())
+        while not os.path.exists(pid_file) or not open(pid_file).read():
+            await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(main())
+    finally:
+        loop.close()
+
+    #The grandchild was killed along with the hook script
+    pid = open(pid_file).read().strip()
+    try:
+        with open('/proc/{}/stat'.format(pid)) as f:
+            state = f.read().rsplit(')', 1)[1].split()[0]
+        assert state in ['Z', 'X']
+    except FileNotFoundError:
+        pass
+
+def test_async_tool_results(tmpdir):
+    import asyncio
+    import os
+    import sys
+    from edalize.edatool import Edatool
+
+    #Tools run when the phase calls them, so it gets their results
+    class Tool(Edatool):
+        tool_options = {}
+
+        def build_main(self):
+            result = self._run_tool(sys.executable, ['-c', 'print("built")'], quiet=True)
+            self.built = result[1]
+
+    backend = Tool(edam={'name' : 'test_async_tool_results'},
+                   work_root=str(tmpdir), verbose=False)
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(backend.build_async())
+    finally:
+        loop.close()
+    assert backend.built == b'built\n'
+    if hasattr(os, 'wait4'):
+        assert backend.metrics[0].user_time is not None
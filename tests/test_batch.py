@@ -0,0 +1,203 @@
+import os.path
+import signal
+
+
+def _job(tmpdir, name, **kwargs):
+    job = {'name'      : name,
+           'tool'      : 'icarus',
+           'edam'      : {'name' : name, 'toplevel' : 'top'},
+           'work_root' : str(tmpdir.join(name)),
+           'phases'    : ['configure', 'build']}
+    job.update(kwargs)
+    return job
+
+
+def test_batch_longest_first(monkeypatch, tmpdir):
+    from edalize.batch import run_batch
+    from edalize.history import History
+
+    from edalize_common import tests_dir
+
+    monkeypatch.setenv('PATH', os.path.join(tests_dir, 'mock_commands'), ':')
+
+    history = History(str(tmpdir.join('history.sqlite')))
+    for name, duration in [('short', 1), ('long', 100), ('medium', 10)]:
+        history.record(name, 'icarus', None, 'build', 0, duration, 1 << 30)
+
+    jobs = [_job(tmpdir, name) for name in ['short', 'medium', 'new', 'long']]
+    jobs.append(_job(tmpdir, 'urgent', priority=1))
+    jobs.append(_job(tmpdir, 'broken', tool='nosuchtool'))
+    results = run_batch(jobs, max_jobs=1, history=history)
+
+    assert [r['name'] for r in results] == ['short', 'medium', 'new', 'long', 'urgent', 'broken']
+    assert [r['status'] for r in results] == ['passed'] * 5 + ['failed']
+    assert results[3]['estimate'] == {'duration' : 100, 'max_rss' : 1 << 30}
+
+    #Higher priority first, then longest first with unknown jobs as the longest
+    started = sorted(results[:5], key=lambda r: r['start'])
+    assert [r['name'] for r in started] == ['urgent', 'new', 'long', 'medium', 'short']
+
+    #The phases of the jobs are recorded
+    entries = history.entries(core='new')
+    assert [(e['backend'], e['phase'], e['status']) for e in entries] == \
+        [('icarus', 'configure', 'passed'), ('icarus', 'build', 'passed')]
+    assert entries[0]['fingerprint'] == entries[1]['fingerprint']
+    assert history.estimate('new', 'icarus', entries[0]['fingerprint'], ['build'])
+
+
+def test_batch_memory_budget(tmpdir):
+    from edalize.batch import BatchScheduler, _BatchJob
+    from edalize.history import History
+
+    history = History(str(tmpdir.join('history.sqlite')))
+    for name in ['a', 'b', 'c']:
+        history.record(name, 'icarus', None, 'build', 0, 1, 6 << 30)
+
+    scheduler = BatchScheduler(max_jobs=4, history=history, memory=16 << 30)
+    queue = []
+    for name in ['a', 'b', 'c']:
+        b = _BatchJob(len(queue), _job(tmpdir, name))
+        scheduler._prepare(b)
+        queue.append(b)
+
+    assert scheduler._next_job(queue) is queue[0]
+    scheduler._running.append(queue[0])
+    assert scheduler._next_job(queue[1:]) is queue[1]
+    scheduler._running.append(queue[1])
+    #A third 6G job doesn't fit in 16G
+    assert scheduler._next_job(queue[2:]) is None
+
+
+def test_batch_admission(monkeypatch, tmpdir):
+    from edalize.batch import BatchScheduler, _BatchJob, run_batch
+
+    from edalize_common import tests_dir
+
+    monkeypatch.setenv('PATH', os.path.join(tests_dir, 'mock_commands'), ':')
+
+    #Jobs that need more than the whole budget are rejected up front
+    jobs = [_job(tmpdir, 'small'),
+            _job(tmpdir, 'huge', edam={'name' : 'huge',
+                                       'tool_options' : {'icarus' : {'memory_estimate' : '20G'}}})]
+    results = run_batch(jobs, max_jobs=2, memory='16G', interval=0.01)
+    assert [r['status'] for r in results] == ['passed', 'rejected']
+    assert results[1]['start'] is None
+
+    scheduler = BatchScheduler(max_jobs=4, cpus=4)
+    queue = []
+    for name, cpus in [('a', 3), ('b', 2), ('c', None)]:
+        b = _BatchJob(len(queue), _job(tmpdir, name, edam={'name' : name,
+                                                           'tool_options' : {'icarus' : {'cpu_estimate' : cpus}}}))
+        scheduler._prepare(b)
+        queue.append(b)
+    scheduler._running.append(queue[0])
+    #b needs two more CPUs, c the default of one
+    assert scheduler._next_job(queue[1:]) is queue[2]
+
+
+def _write_proc(proc, processes, available):
+    #processes maps pids to (ppid, rss in pages)
+    if proc.check():
+        proc.remove()
+    proc.ensure_dir()
+    for pid, (ppid, rss) in processes.items():
+        fields = ['S', ppid] + [0] * 19 + [rss]
+        proc.join(str(pid), 'stat').write('{} (tool (x)) {}\n'.format(pid, ' '.join(str(f) for f in fields)),
+                                          ensure=True)
+    proc.join('meminfo').write('MemTotal: 67108864 kB\nMemAvailable: {} kB\n'.format(available // 1024))
+
+
+def test_batch_memory_pressure(tmpdir):
+    from edalize.batch import BatchScheduler, _BatchJob
+
+    page = os.sysconf('SC_PAGE_SIZE')
+    gig = (1 << 30) // page
+    proc = tmpdir.join('proc')
+    #Job a runs 100 with a child 101, job b runs 200 and job c 300
+    _write_proc(proc, {100 : (1, 4*gig), 101 : (100, 2*gig), 200 : (1, 4*gig), 300 : (1, gig)},
+                8 << 30)
+
+    scheduler = BatchScheduler(reserve='4G')
+    scheduler.PROC = str(proc)
+    signals = []
+    scheduler._signal = lambda b, sig: signals.append((b.result['name'], sig))
+    for i, (name, priority, pid) in enumerate([('a', 1, 100), ('b', 0, 200), ('c', 0, 300)]):
+        b = _BatchJob(i, _job(tmpdir, name, priority=priority))
+        scheduler._prepare(b)
+        b.backend.processes.add(pid)
+        b.result['start'] = i
+        scheduler._running.append(b)
+
+    (a, b, c) = scheduler._running
+    scheduler._sample()
+    assert (a.rss, b.rss, c.rss) == (6 << 30, 4 << 30, 1 << 30)
+    assert signals == []
+    assert scheduler._can_start(_BatchJob(3, {}))
+
+    #Under pressure, the lowest priority job that started last is paused
+    #first, and no new jobs start
+    _write_proc(proc, {100 : (1, 8*gig), 200 : (1, 4*gig), 300 : (1, gig)}, 2 << 30)
+    scheduler._sample()
+    assert signals == [('c', signal.SIGSTOP)]
+    assert c.paused
+    assert a.peak_rss == 8 << 30
+    assert not scheduler._can_start(_BatchJob(3, {}))
+    assert not c.backend.start_gate.is_set()
+    assert b.backend.start_gate.is_set()
+    scheduler._sample()
+    assert signals[1:] == [('b', signal.SIGSTOP)]
+    #The highest priority job keeps running
+    scheduler._sample()
+    assert len(signals) == 2
+
+    #Commands that a paused job was just starting are stopped as well
+    c.backend.processes.add(301)
+    scheduler._sample()
+    assert signals[2:] == [('c', signal.SIGSTOP)]
+    scheduler._sample()
+    assert len(signals) == 3
+    c.backend.processes.discard(301)
+    del signals[2:]
+
+    #Paused jobs continue when the pressure is gone, highest priority first
+    _write_proc(proc, {200 : (1, 4*gig), 300 : (1, gig)}, 16 << 30)
+    scheduler._running.remove(a)
+    scheduler._sample()
+    assert signals[2:] == [('b', signal.SIGCONT)]
+    scheduler._sample()
+    assert signals[3:] == [('c', signal.SIGCONT)]
+    assert c.backend.start_gate.is_set()
+
+    #With on_pressure='reject', the job is killed instead
+    scheduler.on_pressure = 'reject'
+    _write_proc(proc, {200 : (1, 4*gig), 300 : (1, gig)}, 1 << 30)
+    scheduler._sample()
+    assert signals[4:] == [('c', signal.SIGKILL)]
+    assert c.rejected
+
+
+def test_batch_job_errors(monkeypatch, tmpdir):
+    from edalize.batch import run_batch
+
+    from edalize_common import tests_dir
+
+    monkeypatch.setenv('PATH', os.path.join(tests_dir, 'mock_commands'), ':')
+
+    #A hook script without a command makes the backend raise a KeyError
+    broken_hook = _job(tmpdir, 'broken_hook',
+                       edam={'name' : 'broken_hook',
+                             'toplevel' : 'top',
+                             'hooks' : {'pre_build' : [{'name' : 'nocmd'}]}})
+    jobs = [_job(tmpdir, 'good'), broken_hook]
+    results = run_batch(jobs, max_jobs=2)
+    assert [r['status'] for r in results] == ['passed', 'failed']
+    assert results[1]['error'].startswith('KeyError')
+
+    #Errors from any exception type are reported, not only RuntimeError
+    from edalize import get_edatool
+    def _raise(self):
+        raise AttributeError('broken backend')
+    monkeypatch.setattr(get_edatool('icarus'), 'build_main', _raise)
+    results = run_batch([_job(tmpdir, 'raises')])
+    assert results[0]['status'] == 'failed'
+    assert results[0]['error'] == 'AttributeError: broken backend'
@@ -0,0 +1,68 @@
+import pytest
+
+
+def test_build_graph(tmpdir):
+    import os.path
+    from edalize.build_graph import BuildGraph, run_graph
+
+    graph = BuildGraph()
+    graph.add('b', ['cat', 'a.txt'], inputs=['a.txt'], outputs=['b.txt'])
+    graph.add('a', ['gen', 'a.txt'], outputs=['a.txt'], env={'X' : '$y'})
+    graph.add('c', ['check'], depends=['a'])
+
+    #Steps come after the steps they depend on
+    assert graph.select(['b.txt']) == ['a', 'b']
+    assert graph.select() == ['a', 'b', 'c']
+    assert list(graph.dependencies()['b']) == ['a']
+    assert graph.to_makefile('run: b.txt\n\tcat b.txt\n') == """#Auto generated by Edalize
+
+all: b.txt a.txt c
+
+b.txt: a.txt
+\t$(EDALIZE_LAUNCHER) cat a.txt
+b: b.txt
+
+a.txt:
+\t$(EDALIZE_LAUNCHER) env 'X=$$y' gen a.txt
+a: a.txt
+
+c: a.txt
+\t$(EDALIZE_LAUNCHER) check
+
+.PHONY: all b a c
+
+run: b.txt
+\tcat b.txt
+"""
+
+    work_root = str(tmpdir)
+    ran = []
+    def run_step(step):
+        ran.append(step.name)
+        if step.name == 'a':
+            with open(os.path.join(work_root, 'a.txt'), 'w') as f:
+                f.write('a')
+        elif step.name == 'b':
+            with open(os.path.join(work_root, 'b.txt'), 'w') as f:
+                f.write('b')
+
+    results = run_graph(graph, run_step, work_root, jobs=2, state_file='state.json')
+    assert ran[0] == 'a' and sorted(ran) == ['a', 'b', 'c']
+    assert all(r['duration'] >= 0 for r in results)
+
+    #Steps without outputs always run
+    ran[:] = []
+    run_graph(graph, run_step, work_root, state_file='state.json')
+    assert ran == ['c']
+
+    #A modified output is rebuilt
+    with open(os.path.join(work_root, 'b.txt'), 'w') as f:
+        f.write('x')
+    ran[:] = []
+    results = run_graph(graph, run_step, work_root, targets=['b'], state_file='state.json')
+    assert ran == ['b']
+    assert [(r['name'], r['status']) for r in results] == [('a', 'up-to-date'), ('b', 'built')]
+
+    graph.add('d', ['x'], inputs=['b.txt'], outputs=['a.txt'])
+    with pytest.raises(RuntimeError):
+        graph.dependencies()
@@ -99,3 +99,250 @@ def test_edam_hooks(tmpdir):
                                     work_root=work_root)
     with pytest.raises(RuntimeError):
         backend.build()
+
+def test_configure_unchanged(tmpdir):
+    import os.path
+    from edalize import get_edatool
+
+    work_root = str(tmpdir)
+    edam = {'name' : 'test_configure_unchanged',
+            'toplevel' : 'top',
+            'parameters' : {'width' : {'datatype'  : 'int',
+                                       'default'   : 8,
+                                       'paramtype' : 'vlogparam'}}}
+
+    backend = get_edatool('icarus')(edam=edam, work_root=work_root)
+    backend.configure()
+
+    makefile = os.path.join(work_root, 'Makefile')
+    scr_file = os.path.join(work_root, 'test_configure_unchanged.scr')
+    for f in [makefile, scr_file]:
+        os.utime(f, (0, 0))
+
+    #Identical setup. Nothing is touched
+    backend = get_edatool('icarus')(edam=edam, work_root=work_root)
+    backend.configure()
+    assert os.path.getmtime(makefile) == 0
+    assert os.path.getmtime(scr_file) == 0
+
+    #Changed parameter. Only the file that depends on it is rewritten
+    edam['parameters']['width']['default'] = 16
+    backend = get_edatool('icarus')(edam=edam, work_root=work_root)
+    backend.configure()
+    assert os.path.getmtime(makefile) == 0
+    assert os.path.getmtime(scr_file) != 0
+    with open(scr_file) as f:
+        assert '+parameter+top.width=16\n' in f.read()
+
+    #Removed file. Configure runs again
+    os.remove(makefile)
+    backend = get_edatool('icarus')(edam=edam, work_root=work_root)
+    backend.configure()
+    assert os.path.exists(makefile)
+
+def test_configure_subtool_files(tmpdir):
+    import os.path
+    from edalize import get_edatool
+
+    work_root = str(tmpdir)
+    edam = {'name' : 'test_configure_subtool_files',
+            'toplevel' : 'top'}
+
+    backend = get_edatool('icestorm')(edam=edam, work_root=work_root)
+    backend.configure()
+
+    #Removed files written by the yosys sub-tool. Configure runs again
+    for f in ['test_configure_subtool_files.tcl', 'test_configure_subtool_files.mk']:
+        os.remove(os.path.join(work_root, f))
+    backend = get_edatool('icestorm')(edam=edam, work_root=work_root)
+    backend.configure()
+    for f in ['test_configure_subtool_files.tcl', 'test_configure_subtool_files.mk']:
+        assert os.path.exists(os.path.join(work_root, f))
+
+def test_shared_jinja_env(edalize_cache_dir, tmpdir):
+    import os.path
+    from edalize import get_edatool
+    from edalize.edatool import Edatool
+
+    edam = {'name' : 'test_shared_jinja_env'}
+    a = get_edatool('vivado')(edam=edam, work_root=str(tmpdir))
+    b = get_edatool('vivado')(edam=edam, work_root=str(tmpdir))
+
+    #Filters registered by one instance don't leak into others
+    a.jinja_env.filters['src_file_filter'] = a.src_file_filter
+    assert 'src_file_filter' not in b.jinja_env.filters
+    assert 'src_file_filter' not in Edatool._get_shared_jinja_env().filters
+
+    #Compiled template code is shared between instances
+    a.jinja_env.get_template('vivado/vivado-program.tcl.j2')
+    code_cache = Edatool._get_shared_jinja_env().bytecode_cache
+    n_codes = len(code_cache.codes)
+    b.jinja_env.get_template('vivado/vivado-program.tcl.j2')
+    assert len(code_cache.codes) == n_codes
+
+    #The code is stored in the cache directory of the tests
+    assert code_cache.fs_cache.directory == os.path.join(edalize_cache_dir, 'templates')
+
+def test_tool_registry(monkeypatch, tmpdir):
+    import os.path
+    import edalize
+
+    monkeypatch.setenv('EDALIZE_CACHE_DIR', str(tmpdir))
+    monkeypatch.setattr(edalize, '_tool_registry', None)
+
+    assert edalize.get_tool_names() == list(edalize.walk_tool_packages())
+    assert os.path.exists(os.path.join(str(tmpdir), 'registry', 'tools.json'))
+
+    #The second lookup is served from the cache without importing backends
+    monkeypatch.setattr(edalize, '_tool_registry', None)
+    monkeypatch.setattr(edalize, 'get_edatool', None)
+    doc = edalize.get_tool_doc('icarus')
+    assert doc['lists'][0]['name'] == 'iverilog_options'
+    assert edalize.get_tool_registry()['vivado']['class'] == 'Vivado'
+
+def test_fileset_index():
+    from edalize import get_edatool
+    files = [{'name' : 'a.v', 'file_type' : 'verilogSource'},
+             {'name' : 'sub\\inc.vh', 'file_type' : 'verilogSource',
+              'is_include_file' : True, 'include_path' : 'sub\\x'},
+             {'name' : 'b.vhd', 'file_type' : 'vhdlSource', 'logical_name' : 'libx'},
+             {'name' : 'sub/inc2.vh', 'file_type' : 'verilogSource',
+              'is_include_file' : True, 'include_path' : 'sub/x'},
+             {'name' : 'sub/inc3.vh', 'file_type' : 'verilogSource',
+              'is_include_file' : True, 'include_path' : 'sub/x'},
+             {'name' : 'dir\\c.sv', 'file_type' : 'systemVerilogSource'},
+             {'name' : 'd.v', 'file_type' : 'verilogSource'}]
+    backend = get_edatool('icarus')(edam={'files' : files,
+                                          'name' : 'test_fileset_index'})
+    index = backend.fileset
+    assert backend.fileset is index
+
+    assert [f.name for f in index.files_of_type('verilogSource')] == ['a.v', 'd.v']
+    assert [f.name for f in index.files_of_type('verilogSource', 'systemVerilogSource')] == \
+        ['a.v', 'dir\\c.sv', 'd.v']
+    assert index.files_of_type('xci') == []
+    assert index.has_file_type('vhdlSource')
+    assert not index.has_file_type('vhdl')
+    assert index.has_file_type('systemVerilog', prefix=True)
+    assert index.files_of_type('systemVerilogSource')[0].slash_name == 'dir/c.sv'
+
+    assert index.incdirs == ['sub\\x', 'sub/x']
+    (_, incdirs) = backend._get_fileset_files(force_slash=True)
+    assert incdirs == ['sub/x']
+
+def test_artifact_cache(tmpdir):
+    import os.path
+    from edalize import get_edatool
+    from edalize.artifact_cache import ArtifactCache, parse_size
+    from edalize.icarus import Icarus
+
+    class Counter(Icarus):
+        builds = 0
+        def build_main(self):
+            Counter.builds += 1
+            with open(os.path.join(self.work_root, 'out.bin'), 'w') as f:
+                f.write(open(os.path.join(self.work_root, 'src.v')).read() * 10)
+        def build_artifacts(self):
+            return ['out.bin']
+
+    cache = ArtifactCache(str(tmpdir.join('cache')), max_size=parse_size('1K'))
+
+    def build(work_root, src, tool_options={}):
+        os.makedirs(work_root, exist_ok=True)
+        with open(os.path.join(work_root, 'src.v'), 'w') as f:
+            f.write(src)
+        backend = Counter(edam={'name' : 'test_artifact_cache',
+                                'files' : [{'name' : 'src.v', 'file_type' : 'verilogSource'}],
+                                'tool_options' : {'counter' : tool_options}},
+                          work_root=work_root)
+        backend.artifact_cache = cache
+        backend.build()
+        with open(os.path.join(work_root, 'out.bin')) as f:
+            assert f.read() == src * 10
+
+    build(str(tmpdir.join('a')), 'x' * 40)
+    assert Counter.builds == 1
+    #Same sources in a fresh work root are restored from the cache
+    build(str(tmpdir.join('b')), 'x' * 40)
+    assert Counter.builds == 1
+    #Options that don't affect the outputs don't change the key
+    build(str(tmpdir.join('b2')), 'x' * 40, {'tool_timeout' : 100,
+                                             'abort_on_error' : True,
+                                             'memory_estimate' : '1G'})
+    assert Counter.builds == 1
+    #Changed sources are rebuilt
+    build(str(tmpdir.join('c')), 'y' * 40)
+    assert Counter.builds == 2
+    assert len(cache.entries()) == 2
+
+    #The least recently used entry is evicted to stay below the size limit
+    build(str(tmpdir.join('d')), 'z' * 40)
+    assert Counter.builds == 3
+    assert len(cache.entries()) == 2
+    build(str(tmpdir.join('e')), 'x' * 40)
+    assert Counter.builds == 4
+
+    assert parse_size('2M') == 2 * 1024 * 1024
+    assert parse_size('100') == 100
+
+    #Vivado caches the whole project, not only the bitstream
+    vivado = get_edatool('vivado')(edam={'name' : 'design'}, work_root=str(tmpdir))
+    for d in ['design.runs', 'design.srcs']:
+        tmpdir.mkdir(d)
+    assert vivado.build_artifacts() == ['design.xpr', 'design.srcs', 'design.runs', 'design.bit']
+
+def test_parameter_schema_cache(tmpdir):
+    from edalize import get_edatool
+    from edalize.edatool import Edatool
+
+    Icarus = get_edatool('icarus')
+    calls = []
+    get_doc = Icarus.get_doc.__func__
+
+    class Counter(Icarus):
+        @classmethod
+        def get_doc(cls, api_ver):
+            calls.append(api_ver)
+            return get_doc(cls, api_ver)
+
+    edam = {'name' : 'test_parameter_schema_cache',
+            'parameters' : {
+                'seed'  : {'datatype' : 'int', 'paramtype' : 'plusarg', 'default' : 1},
+                'width' : {'datatype' : 'int', 'paramtype' : 'vlogparam'}}}
+    backend = Counter(edam=edam, work_root=str(tmpdir))
+    for i in range(10):
+        args = backend.parse_args(['--seed={}'.format(i), '--iverilog_options=-g2012'],
+                                  backend.argtypes)
+        assert args == {'seed' : i, 'iverilog_options' : '-g2012'}
+        backend._apply_parameters(args)
+    assert backend.plusarg['seed'] == 9
+    assert backend.tool_options['iverilog_options'] == ['-g2012'] * 10
+    assert len(calls) == 1
+
+    #Backends with the same parameters share a parser
+    parsers = len(Edatool._parsers)
+    Counter(edam=edam, work_root=str(tmpdir)).parse_args([], Counter.argtypes)
+    assert len(Edatool._parsers) == parsers
+
+    #Changed parameters get a new one
+    edam['parameters']['seed']['default'] = 2
+    args = Counter(edam=edam, work_root=str(tmpdir)).parse_args([], Counter.argtypes)
+    assert args['seed'] == 2
+    assert len(Edatool._parsers) == parsers + 1
+
+
+def test_configure_fingerprint(monkeypatch, tmpdir):
+    from edalize import edatool, get_edatool
+    from edalize.vivado import Vivado
+
+    #Configure doesn't start the tool to get its version
+    def get_version(self):
+        raise AssertionError("get_version called")
+    monkeypatch.setattr(Vivado, 'get_version', get_version)
+    edam = {'name' : 'test_configure_fingerprint', 'toplevel' : 'top'}
+    backend = get_edatool('vivado')(edam=edam, work_root=str(tmpdir))
+    fingerprint = backend._configure_fingerprint()
+
+    #Another edalize version gives another fingerprint
+    monkeypatch.setattr(edatool, '_source_digest', 'other')
+    assert backend._configure_fingerprint() != fingerprint
@@ -0,0 +1,38 @@
+import pytest
+
+
+def test_fatal_errors(tmpdir):
+    import sys
+    import time
+    from edalize import get_edatool
+    from edalize.process import ToolError
+
+    script = ("import sys, time; "
+              "print('Compiling'); "
+              "print('%Error: top.v:3: syntax error'); "
+              "sys.stdout.flush(); "
+              "time.sleep(float(sys.argv[1])); "
+              "sys.exit(1)")
+
+    edam = {'name' : 'test_fatal_errors'}
+    backend = get_edatool('verilator')(edam=edam, work_root=str(tmpdir), verbose=False)
+    with pytest.raises(ToolError) as e:
+        backend._run_tool(sys.executable, ['-c', script, '0'], quiet=True)
+    assert e.value.returncode == 1
+    assert e.value.errors == ['%Error: top.v:3: syntax error']
+    assert 'syntax error' in str(e.value)
+
+    #Output that isn't collected anyway stays on the terminal
+    assert backend._open_collector(False) is None
+
+    #With abort_on_error, the tool is killed at the first error
+    edam['tool_options'] = {'verilator' : {'abort_on_error' : True}}
+    backend = get_edatool('verilator')(edam=edam, work_root=str(tmpdir), verbose=False)
+    start = time.time()
+    with pytest.raises(ToolError) as e:
+        backend._run_tool(sys.executable, ['-c', script, '30'], quiet=True)
+    assert time.time() - start < 10
+    assert e.value.returncode < 0
+    assert e.value.errors == ['%Error: top.v:3: syntax error']
+    assert 'stopped at the first error' in str(e.value)
+    assert backend._open_collector(False) is not None
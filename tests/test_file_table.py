@@ -0,0 +1,137 @@
+import pytest
+
+
+def test_file_table(tmpdir):
+    import json
+    import os.path
+    import pickle
+    from edalize import get_edatool
+    from edalize.edam import FileTable, load_edam
+
+    files = [{'name' : 'a.v', 'file_type' : 'verilogSource'},
+             {'name' : 'inc/b.vh', 'file_type' : 'verilogSource',
+              'is_include_file' : True, 'include_path' : 'inc'},
+             {'name' : 'c.vhd', 'file_type' : 'vhdlSource', 'logical_name' : 'lib',
+              'copyto' : 'x/c.vhd'}]
+    table = FileTable(iter(files))
+    assert len(table) == 3
+    assert table == files
+    assert table[1]['is_include_file'] is True
+    assert not 'logical_name' in table[0]
+    assert table[2].get('copyto') == 'x/c.vhd'
+    assert table.strings.count('verilogSource') == 1
+    assert [f['name'] for f in table.select(lambda f: f.get('file_type') == 'verilogSource')] == \
+        ['a.v', 'inc/b.vh']
+    assert table[1:] == files[1:]
+    assert pickle.loads(pickle.dumps(table)) == files
+
+    edam = {'name' : 'test_file_table', 'toplevel' : 'top', 'files' : files}
+    path = os.path.join(str(tmpdir), 'edam.json')
+    with open(path, 'w') as f:
+        json.dump(edam, f, indent=1)
+    loaded = load_edam(path)
+    assert isinstance(loaded['files'], FileTable)
+    assert loaded['files'] == files
+    assert {k : v for k, v in loaded.items() if k != 'files'} == \
+        {'name' : 'test_file_table', 'toplevel' : 'top'}
+
+    path = os.path.join(str(tmpdir), 'edam.yml')
+    with open(path, 'w') as f:
+        f.write('name: test_file_table\nfiles:\n  - name: a.v\n    file_type: verilogSource\n')
+    assert load_edam(path)['files'] == files[:1]
+
+    #Backends and their sub-tools share a table and its index
+    vivado = get_edatool('vivado')(edam={'name' : 'test_file_table',
+                                         'files' : table,
+                                         'tool_options' : {'vivado' : {'synth' : 'yosys'}}},
+                                   work_root=str(tmpdir))
+    yosys = vivado._yosys()
+    assert yosys.files is table
+    assert yosys.file_table is table
+    assert yosys.fileset is vivado.fileset
+    assert vivado.fileset.incdirs == ['inc']
+
+    with pytest.raises(RuntimeError):
+        FileTable([{'file_type' : 'verilogSource'}])
+
+
+def test_file_table_list_api(tmpdir):
+    import json
+    import os.path
+    from edalize import get_edatool
+    from edalize.edam import FileTable, dump_edam, dumps_edam, load_edam
+
+    files = [{'name' : 'a.v', 'file_type' : 'verilogSource'},
+             {'name' : 'inc/b.vh', 'file_type' : 'verilogSource',
+              'is_include_file' : True, 'include_path' : 'inc'}]
+    backend = get_edatool('icarus')(edam={'name' : 'test_file_table_list_api',
+                                          'files' : files},
+                                    work_root=str(tmpdir))
+    assert [f.name for f in backend.fileset.src_files] == ['a.v']
+
+    #Lists of files stay lists, with a table next to them
+    assert backend.files is files
+    assert json.loads(json.dumps(backend.files)) == files
+    backend.files = backend.files + [{'name' : 'c.v', 'file_type' : 'verilogSource'}]
+    assert isinstance(backend.file_table, FileTable)
+    assert [f.name for f in backend.fileset.src_files] == ['a.v', 'c.v']
+    backend.files.append({'name' : 'd.v', 'file_type' : 'verilogSource'})
+    assert [f.name for f in backend.fileset.src_files] == ['a.v', 'c.v', 'd.v']
+
+    #A table changes like the list of dicts it replaces, and the fileset
+    #follows the changes
+    backend.files = FileTable(files)
+    backend.files.append({'name' : 'c.v', 'file_type' : 'verilogSource', 'copyto' : 'x.v'})
+    backend.files[0]['name'] = 'a2.v'
+    backend.files[0]['logical_name'] = 'lib'
+    del backend.files[2]['copyto']
+    backend.files[1] = {'name' : 'd.v', 'file_type' : 'verilogSource'}
+    backend.files.insert(0, {'name' : 'e.sv', 'file_type' : 'systemVerilogSource'})
+    del backend.files[1]
+    expected = [{'name' : 'e.sv', 'file_type' : 'systemVerilogSource'},
+                {'name' : 'd.v', 'file_type' : 'verilogSource'},
+                {'name' : 'c.v', 'file_type' : 'verilogSource'}]
+    assert backend.files == expected
+    assert [f.name for f in backend.fileset.src_files] == ['e.sv', 'd.v', 'c.v']
+    assert backend.fileset.incdirs == []
+
+    with pytest.raises(RuntimeError):
+        del backend.files[0]['name']
+    with pytest.raises(KeyError):
+        del backend.files[0]['logical_name']
+
+    backend.files = files
+    assert [f.name for f in backend.fileset.src_files] == ['a.v']
+
+    #EDAMs with tables are written as JSON with dump_edam
+    edam = {'name' : 'test_file_table_list_api', 'files' : FileTable(expected)}
+    assert json.loads(dumps_edam(edam)) == dict(edam, files=expected)
+    path = os.path.join(str(tmpdir), 'edam.json')
+    dump_edam(edam, path, indent=2)
+    assert load_edam(path)['files'] == expected
+    assert json.loads(json.dumps(edam['files'].to_list())) == expected
+
+
+def test_load_edam_chunks(monkeypatch, tmpdir):
+    import json
+    import os.path
+    from edalize.edam import _JSONReader, load_edam
+
+    #Values and numbers split between chunks are read as a whole
+    monkeypatch.setattr(_JSONReader, 'CHUNK_SIZE', 3)
+    edam = {'name' : 'test_load_edam_chunks',
+            'files' : [{'name' : 'f{}.v'.format(i), 'file_type' : 'verilogSource'}
+                       for i in range(20)],
+            'parameters' : {'width' : {'datatype' : 'int', 'default' : 12345,
+                                       'paramtype' : 'vlogparam'}},
+            'toplevel' : 'top'}
+    path = os.path.join(str(tmpdir), 'edam.json')
+    with open(path, 'w') as f:
+        json.dump(edam, f, indent=1)
+    assert load_edam(path) == edam
+
+    with open(path, 'w') as f:
+        f.write('{"name" : "x", "files" : [{"name" : "a.v"} {"name" : "b.v"}]}')
+    with pytest.raises(RuntimeError) as excinfo:
+        load_edam(path)
+    assert "Expecting ',' delimiter at character 43" in str(excinfo.value)
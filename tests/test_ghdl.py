@@ -112,3 +112,55 @@ def test_ghdl_04(make_edalize_test):
 
     tf.backend.run()
     tf.compare_files(['elab-run.cmd'])
+
+
+def test_ghdl_build_graph(make_edalize_test):
+    tf = make_edalize_test('ghdl',
+                           ref_dir = "test02",
+                           test_name = "test_ghdl_02",
+                           param_types=['generic'],
+                           files = LOCAL_FILES,
+                           tool_options={
+                               'analyze_options': ['some', 'analyze_options'],
+                               'run_options': ['a', 'few', 'run_options'],
+                               'build_runner': 'python',
+                           })
+
+    for vhdl_file in ['vhdl_file.vhd', 'vhdl_lfile']:
+        with open(os.path.join(tf.work_root, vhdl_file), 'a'):
+            os.utime(os.path.join(tf.work_root, vhdl_file), None)
+
+    #The python runner imports the libraries like the Makefile does
+    tf.backend.configure()
+    tf.backend.build()
+    tf.compare_files(['analyze.cmd'])
+    assert [r['name'] for r in tf.backend.step_results] == \
+        ['libraries', 'import-work', 'import-libx']
+    assert os.path.isdir(os.path.join(tf.work_root, 'libx'))
+
+def test_ghdl_run_many(make_edalize_test):
+    tf = make_edalize_test('ghdl',
+                           test_name = 'test_ghdl_run_many',
+                           param_types=['generic'],
+                           files = LOCAL_FILES,
+                           tool_options={'run_options': ['a', 'few', 'run_options']})
+
+    for vhdl_file in ['vhdl_file.vhd', 'vhdl_lfile']:
+        with open(os.path.join(tf.work_root, vhdl_file), 'a'):
+            pass
+    tf.backend.configure()
+    tf.backend.build()
+
+    results = tf.backend.run_many([{'generic_int' : 3}, {}], jobs=2)
+    assert [r['status'] for r in results] == ['passed', 'passed']
+
+    #The model is elaborated once, before the runs
+    with open(os.path.join(tf.work_root, 'elab-run.cmd')) as f:
+        assert f.read() == '-m --std=93c -P./libx top_module\n'
+    for r, value in zip(results, ['3', '42']):
+        #Each run finds the libraries in its own directory
+        assert os.path.samefile(os.path.join(r['run_dir'], 'work-obj93c.cf'),
+                                os.path.join(tf.work_root, 'work-obj93c.cf'))
+        with open(os.path.join(r['run_dir'], 'elab-run.cmd')) as f:
+            assert f.read() == '-r --std=93c -P./libx top_module a few run_options ' \
+                '-ggeneric_bool=true -ggeneric_int={} -ggeneric_str=hello\n'.format(value)
@@ -0,0 +1,13 @@
+def test_runtime_regressions(tmpdir):
+    from edalize.history import History
+
+    history = History(str(tmpdir.join('history.sqlite')))
+    for i, duration in enumerate([10, 11, 9, 10, 30, 31, 29]):
+        history.record('soc', 'vivado', 'f', 'build', i, duration)
+        history.record('soc', 'vivado', 'f', 'configure', i, 1)
+    regressions = history.runtime_regressions(window=3)
+    assert len(regressions) == 1
+    assert regressions[0]['phase'] == 'build'
+    assert regressions[0]['baseline'] == 10
+    assert regressions[0]['recent'] == 30
+    assert history.runtime_regressions(window=3, since=4) == []
@@ -0,0 +1,40 @@
+import pytest
+
+
+def test_edam_hook_dependencies(tmpdir):
+    import os.path
+    from edalize import get_edatool
+
+    work_root = str(tmpdir)
+    #The first two scripts only finish if they run at the same time
+    wait_for = 'touch {}; for i in $(seq 100); do [ -e {} ] && exit 0; sleep 0.1; done; exit 1'
+    hooks = {'pre_build' : [
+        {'cmd' : ['sh', '-c', wait_for.format('a', 'b')],
+         'name' : 'a',
+         'depends' : [],
+         'outputs' : ['a']},
+        {'cmd' : ['sh', '-c', wait_for.format('b', 'a')],
+         'name' : 'b',
+         'depends' : [],
+         'outputs' : ['b']},
+        {'cmd' : ['sh', '-c', 'cat a b > c; echo x >> count'],
+         'name' : 'c',
+         'depends' : ['a', 'b'],
+         'inputs' : ['a', 'b'],
+         'outputs' : ['c']}]}
+
+    backend = get_edatool('icarus')(edam={'name' : 'test_edam_hook_dependencies',
+                                          'hooks' : hooks},
+                                    work_root=work_root)
+    backend.hook_jobs = 2
+    backend.build_pre()
+    backend.build_pre()
+
+    #Nothing runs the second time since all outputs are up to date
+    with open(os.path.join(work_root, 'count')) as f:
+        assert f.read() == 'x\n'
+
+    hooks['pre_build'][0]['depends'] = ['c']
+    with pytest.raises(RuntimeError) as excinfo:
+        backend.build_pre()
+    assert 'Circular dependencies' in str(excinfo.value)
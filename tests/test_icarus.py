@@ -24,6 +24,28 @@ def test_icarus(make_edalize_test):
     tf.compare_files(['vvp.cmd'])
 
 
+def test_icarus_async(make_edalize_test):
+    import asyncio
+
+    tf = make_edalize_test('icarus',
+                           test_name='test_icarus_0',
+                           tool_options={'iverilog_options': ['some', 'iverilog_options'],
+                                         'timescale': '1ns/1ns'},
+                           use_vpi=True)
+
+    async def main():
+        await tf.backend.configure_async()
+        await tf.backend.build_async()
+        await tf.backend.run_async()
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(main())
+    finally:
+        loop.close()
+    tf.compare_files(['iverilog.cmd', 'iverilog-vpi.cmd', 'vvp.cmd'])
+
+
 def test_icarus_minimal(tmpdir):
     import os
 
@@ -53,3 +75,89 @@ def test_icarus_minimal(tmpdir):
     backend.run()
 
     compare_files(ref_dir, work_root, ['vvp.cmd'])
+
+
+def test_icarus_metrics(make_edalize_test, monkeypatch):
+    import json
+    import os
+
+    #The metrics are only written to a file when it is configured
+    monkeypatch.setenv('EDALIZE_METRICS', 'edalize_metrics.jsonl')
+    tf = make_edalize_test('icarus',
+                           test_name='test_icarus_0',
+                           tool_options={'iverilog_options': ['some', 'iverilog_options'],
+                                         'timescale': '1ns/1ns'},
+                           use_vpi=True)
+    tf.backend.configure()
+    tf.backend.build()
+    tf.backend.run()
+
+    metrics = tf.backend.metrics
+    assert [m.cmd[:2] for m in metrics] == [['make'], ['make', 'run']]
+    for m in metrics:
+        assert m.returncode == 0
+        assert m.wall_time >= 0
+        if hasattr(os, 'wait4'):
+            assert m.user_time >= 0
+            assert m.max_rss > 0
+
+    with open(os.path.join(tf.work_root, 'edalize_metrics.jsonl')) as f:
+        records = [json.loads(l) for l in f]
+    assert [r['cmd'] for r in records] == [m.cmd for m in metrics]
+    assert records[0]['max_rss'] == metrics[0].max_rss
+
+
+def test_icarus_build_graph(make_edalize_test):
+    import os
+
+    tf = make_edalize_test('icarus',
+                           test_name='test_icarus_0',
+                           tool_options={'iverilog_options': ['some', 'iverilog_options'],
+                                         'timescale': '1ns/1ns',
+                                         'build_runner': 'python'},
+                           use_vpi=True)
+    tf.backend.build_jobs = 1
+    tf.backend.configure()
+    tf.backend.build()
+    tf.compare_files(['iverilog.cmd', 'iverilog-vpi.cmd'])
+    assert [(r['name'], r['status']) for r in tf.backend.step_results] == \
+        [('vpi1.vpi', 'built'), ('vpi2.vpi', 'built'), ('compile', 'built')]
+
+    #Nothing has changed
+    tf.backend.build()
+    assert all(r['status'] == 'up-to-date' for r in tf.backend.step_results)
+
+    #Only the model is rebuilt when its sources change
+    with open(os.path.join(tf.work_root, 'timescale.v'), 'a') as f:
+        f.write('//changed\n')
+    tf.backend.build()
+    assert [r['status'] for r in tf.backend.step_results] == \
+        ['up-to-date', 'up-to-date', 'built']
+
+def test_icarus_run_many(make_edalize_test):
+    import json
+    import os
+
+    tf = make_edalize_test('icarus',
+                           test_name='test_icarus_0',
+                           use_vpi=True)
+    tf.backend.configure()
+    tf.backend.build()
+    results = tf.backend.run_many([{'plusarg_int' : 3},
+                                   {'plusarg_str' : 'world'}],
+                                  jobs=2)
+
+    assert [(r['run'], r['status']) for r in results] == [(0, 'passed'), (1, 'passed')]
+    work_root = os.path.abspath(tf.work_root)
+    expected = [['+plusarg_int=3', '+plusarg_str=hello'],
+                #Parameters of one run don't leak into the next
+                ['+plusarg_int=42', '+plusarg_str=world']]
+    for r, plusargs in zip(results, expected):
+        with open(os.path.join(r['run_dir'], 'vvp.cmd')) as f:
+            args = f.read().split()
+        #The mock vvp echoes its arguments, which swallows -n
+        assert args[:4] == ['-M' + work_root, '-l', 'icarus.log', '-mvpi1']
+        assert all(p in args for p in plusargs)
+
+    with open(os.path.join(work_root, 'runs', 'runs.json')) as f:
+        assert [r['status'] for r in json.load(f)] == ['passed', 'passed']
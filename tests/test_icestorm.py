@@ -85,3 +85,32 @@ def test_icestorm_invalid_pnr(make_edalize_test):
     with pytest.raises(RuntimeError) as e:
         tf.backend.configure()
     assert "Invalid pnr option 'invalid'. Valid values are 'arachne' for Arachne-pnr, 'next' for nextpnr or 'none' to only perform synthesis" in str(e.value)
+
+
+def test_icestorm_build_graph(make_edalize_test):
+    tool_options = {
+        'yosys_synth_options': ['some', 'yosys_synth_options'],
+        'arachne_pnr_options': ['a', 'few', 'arachne_pnr_options'],
+        'build_runner': 'python',
+    }
+    tf = make_edalize_test('icestorm',
+                           param_types=['vlogdefine', 'vlogparam'],
+                           tool_options=tool_options)
+
+    #The python runner runs the same commands as the Makefile
+    run_icestorm_test(tf)
+    assert [r['name'] for r in tf.backend.step_results] == \
+        ['synth', 'pnr', 'bitstream']
+
+
+def test_icestorm_ninja(make_edalize_test):
+    tool_options = {
+        'yosys_synth_options': ['some', 'yosys_synth_options'],
+        'arachne_pnr_options': ['a', 'few', 'arachne_pnr_options'],
+        'build_runner': 'ninja',
+    }
+    tf = make_edalize_test('icestorm',
+                           param_types=['vlogdefine', 'vlogparam'],
+                           tool_options=tool_options)
+    tf.backend.configure()
+    tf.compare_files(['build.ninja'], ref_subdir='ninja')
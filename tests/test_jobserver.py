@@ -0,0 +1,110 @@
+import pytest
+
+
+def test_jobserver(tmpdir):
+    import os.path
+    import sys
+    from edalize import get_edatool
+    from edalize.jobserver import Jobserver
+
+    jobserver = Jobserver.create(2)
+    makeflags = jobserver.makeflags('k -j8')
+    assert makeflags == 'k -j2 --jobserver-auth={},{}'.format(*jobserver.fds)
+
+    attached = Jobserver.from_makeflags(makeflags)
+    assert attached.fds == jobserver.fds
+    assert attached.jobs == 2
+    assert Jobserver.from_makeflags('-j4') is None
+
+    #One implicit slot and one token
+    tokens = [jobserver.acquire(), jobserver.acquire()]
+    assert tokens == [None, b'+']
+    for token in tokens:
+        jobserver.release(token)
+
+    #Only jobserver pipes are used, not whatever file descriptors that
+    #make closed are reused for
+    with open(str(tmpdir.join('not_a_pipe')), 'w') as f:
+        fd = f.fileno()
+        assert Jobserver.from_makeflags('-j2 --jobserver-auth={0},{0}'.format(fd)) is None
+
+    #make gets the jobserver through MAKEFLAGS, other commands don't
+    work_root = str(tmpdir)
+    make = tmpdir.join('make')
+    make.write("#!{}\n"
+               "import os\n"
+               "open('makeflags', 'w').write(os.environ['MAKEFLAGS'])\n"
+               "open('token', 'wb').write(os.read({}, 1))\n".format(sys.executable, jobserver.read_fd))
+    make.chmod(0o755)
+    script = "import os; open('hook_makeflags', 'w').write(os.environ.get('MAKEFLAGS', ''))"
+    hooks = {'pre_build' : [
+        {'cmd' : [sys.executable, '-c', script],
+         'name' : 'hook'}]}
+    backend = get_edatool('icarus')(edam={'name' : 'test_jobserver',
+                                          'hooks' : hooks},
+                                    work_root=work_root, verbose=False)
+    backend.jobserver = jobserver
+    backend.build_pre()
+    backend._run_tool(str(make))
+    with open(os.path.join(work_root, 'makeflags')) as f:
+        assert f.read().split()[-2:] == makeflags.split()[-2:]
+    with open(os.path.join(work_root, 'token')) as f:
+        assert f.read() == '+'
+    with open(os.path.join(work_root, 'hook_makeflags')) as f:
+        assert not 'jobserver' in f.read()
+
+    #Verilator leaves the job count to the jobserver, unless it is set
+    for (tool_options, args) in [({}, []), ({'jobs' : 3}, ['-j', '3'])]:
+        backend = get_edatool('verilator')(edam={'name' : 'test_jobserver',
+                                                 'tool_options' : {'verilator' : tool_options}},
+                                           work_root=work_root)
+        backend.jobserver = jobserver
+        calls = []
+        backend._run_tool = lambda cmd, args=[], quiet=False: calls.append(args)
+        backend.build_main()
+        assert calls == [args]
+
+
+def test_jobserver_lazy(monkeypatch, tmpdir):
+    from edalize import process
+    from edalize import get_edatool
+
+    #Backends only look up the jobserver when they need it
+    calls = []
+    monkeypatch.setattr(process, 'get_jobserver', lambda: calls.append(1))
+    backend = get_edatool('icarus')(edam={'name' : 'test_jobserver_lazy'},
+                                    work_root=str(tmpdir))
+    assert calls == []
+    assert backend.jobserver is None
+    assert backend.jobserver is None
+    assert calls == [1]
+
+
+def test_jobserver_fifo(monkeypatch, tmpdir):
+    import os
+    from edalize import jobserver as _jobserver
+    from edalize.jobserver import Jobserver
+
+    #The first user of a fifo fills it, later ones join the pool
+    fifo = str(tmpdir.join('jobserver.fifo'))
+    first = Jobserver.create(3, fifo)
+    second = Jobserver.create(3, fifo)
+    implicit = [first.acquire(), second.acquire()]
+    tokens = [first.acquire(), second.acquire()]
+    assert implicit == [None, None]
+    assert tokens == [b'+', b'+']
+    os.set_blocking(second.read_fd, False)
+    with pytest.raises(BlockingIOError):
+        os.read(second.read_fd, 1)
+    os.set_blocking(second.read_fd, True)
+    for (jobserver, token) in zip([first, second] * 2, implicit + tokens):
+        jobserver.release(token)
+
+    #Commands find the fifo by its path if make supports it, and by its
+    #file descriptor otherwise
+    for (supported, auth, fds) in [(True, 'fifo:' + fifo, ()),
+                                   (False, '{0},{0}'.format(first.read_fd), (first.read_fd,))]:
+        monkeypatch.setattr(_jobserver, '_make_supports_fifo', lambda: supported)
+        first._fifo_auth = None
+        assert first.makeflags('-j8') == '-j3 --jobserver-auth=' + auth
+        assert first.fds == fds
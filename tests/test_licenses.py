@@ -0,0 +1,51 @@
+import pytest
+
+
+def test_license_pools(monkeypatch, tmpdir):
+    import os.path
+    import sys
+    from edalize import get_edatool
+    from edalize.process import LicenseError
+    from edalize.licenses import LicensePools
+
+    config = tmpdir.join('licenses.ini')
+    config.write("[pools]\nsiemens = 2\n\n[tools]\nicarus = siemens\n\n"
+                 "[retry]\nattempts = 2\nbackoff = 0\n")
+    lock_dir = str(tmpdir.mkdir('locks'))
+    pools = LicensePools.load(str(config), lock_dir)
+    assert pools.pool('vivado') is None
+    pool = pools.pool('icarus')
+    assert pool.tokens == 2
+    assert pools.delay(3) == 0
+
+    #Tokens are lock files, shared with other processes
+    tokens = [pool.acquire(), pool.acquire()]
+    assert not pool.available()
+    assert pool.acquire(blocking=False) is None
+    pool.release(tokens.pop())
+    assert pool.available()
+    pool.release(tokens.pop())
+
+    #A tool that fails with a license error is retried
+    work_root = str(tmpdir.mkdir('work'))
+    script = ("import os, sys; "
+              "n = len(os.listdir('.')); "
+              "open('attempt{}'.format(n), 'w').close(); "
+              "sys.exit(print('License checkout failed') or 1 if n < 2 else 0)")
+    Icarus = get_edatool('icarus')
+    monkeypatch.setattr(Icarus, 'license_errors', [r'License checkout failed'])
+    backend = Icarus(edam={'name' : 'test_license_pools'}, work_root=work_root, verbose=False)
+    backend.license_pools = pools
+    backend._licensed(backend._run_tool, sys.executable, ['-c', script])
+    assert sorted(os.listdir(work_root)) == ['attempt0', 'attempt1', 'attempt2']
+    assert pool.available()
+
+    #Until there are no attempts left
+    pools.attempts = 1
+    for f in os.listdir(work_root):
+        os.remove(os.path.join(work_root, f))
+    with pytest.raises(LicenseError) as e:
+        backend._licensed(backend._run_tool, sys.executable, ['-c', script])
+    assert e.value.message == 'License checkout failed'
+    assert e.value.returncode == 1
+    assert len(os.listdir(work_root)) == 2
@@ -3,7 +3,7 @@ import os
 from edalize_common import make_edalize_test, tests_dir
 
 
-def test_modelsim(make_edalize_test):
+def test_modelsim(make_edalize_test, monkeypatch):
     tool_options = {
         'vcom_options': ['various', 'vcom_options'],
         'vlog_options': ['some', 'vlog_options'],
@@ -20,19 +20,38 @@ def test_modelsim(make_edalize_test):
                       'edalize_build_rtl.tcl',
                       'edalize_main.tcl'])
 
-    orig_env = os.environ.copy()
-    try:
-        os.environ['MODEL_TECH'] = os.path.join(tests_dir, 'mock_commands')
+    monkeypatch.setenv('MODEL_TECH', os.path.join(tests_dir, 'mock_commands'))
 
-        tf.backend.build()
-        os.makedirs(os.path.join(tf.work_root, 'work'))
+    tf.backend.build()
+    os.makedirs(os.path.join(tf.work_root, 'work'))
 
-        tf.compare_files(['vsim.cmd'])
+    tf.compare_files(['vsim.cmd'])
 
-        tf.backend.run()
+    tf.backend.run()
 
-        assert filecmp.cmp(os.path.join(tf.ref_dir, 'vsim2.cmd'),
-                           os.path.join(tf.work_root, 'vsim.cmd'),
-                           shallow=False)
-    finally:
-        os.environ = orig_env
+    assert filecmp.cmp(os.path.join(tf.ref_dir, 'vsim2.cmd'),
+                       os.path.join(tf.work_root, 'vsim.cmd'),
+                       shallow=False)
+
+def test_modelsim_run_many(make_edalize_test, monkeypatch):
+    monkeypatch.setenv('MODEL_TECH', os.path.join(tests_dir, 'mock_commands'))
+    tf = make_edalize_test('modelsim',
+                           tool_options={'vsim_options' : ['a', 'few', 'vsim_options']},
+                           param_types=['plusarg', 'vlogparam'])
+    tf.backend.configure()
+    tf.backend.build()
+    for lib in ['work', 'libx']:
+        os.makedirs(os.path.join(tf.work_root, lib))
+
+    results = tf.backend.run_many([{'vlogparam_int' : 3}, {'plusarg_int' : 5}], jobs=2)
+    assert [r['status'] for r in results] == ['passed', 'passed']
+    for r, (param, plusarg) in zip(results, [('3', '42'), ('42', '5')]):
+        #Each run finds the compiled libraries in its own directory
+        for lib in ['work', 'libx']:
+            assert os.path.samefile(os.path.join(r['run_dir'], lib),
+                                    os.path.join(tf.work_root, lib))
+        with open(os.path.join(r['run_dir'], 'vsim.cmd')) as f:
+            cmd = f.read()
+        assert cmd.startswith('-do run -all; quit -code')
+        assert '-c a few vsim_options -gvlogparam_bool=1 -gvlogparam_int={} '.format(param) in cmd
+        assert cmd.endswith(' +plusarg_int={} +plusarg_str=hello top_module\n'.format(plusarg))
@@ -0,0 +1,40 @@
+def test_progress_events(tmpdir):
+    import sys
+    from edalize import get_edatool, trace
+    from edalize.history import History
+
+    script = ("print('Step: elaborate'); "
+              "print('Time: 100 ns'); "
+              "print('Step: simulate 50%')")
+    edam = {'name' : 'test_progress_events',
+            'tool_options' : {'icarus' : {'progress_patterns' : [
+                r'^Step: (?P<step>\w+)(?: (?P<percent>\d+)%)?',
+                r'^Time: (?P<time>\d+ \w+)']}}}
+    backend = get_edatool('icarus')(edam=edam, work_root=str(tmpdir), verbose=False)
+    events = []
+    backend.progress_callback = events.append
+
+    #Tools that don't report a percentage get one from the runtime history
+    backend.history = History(str(tmpdir.join('history.sqlite')))
+    backend.history.record('test_progress_events', 'icarus', backend._history_key(),
+                           'build', 0, 1000)
+
+    tracer = trace.enable(trace.Tracer())
+    try:
+        with backend._progress_phase('build'):
+            backend._run_tool(sys.executable, ['-c', script], quiet=True)
+    finally:
+        trace.disable()
+
+    assert [(e['phase'], e['step'], e['line']) for e in events] == \
+        [('build', 'elaborate', 'Step: elaborate'),
+         ('build', 'elaborate', 'Time: 100 ns'),
+         ('build', 'simulate', 'Step: simulate 50%')]
+    assert 0 <= events[0]['percent'] < 1
+    assert events[1]['time'] == '100 ns'
+    assert events[2]['percent'] == 50
+    assert all(e['elapsed'] >= 0 for e in events)
+
+    instants = [e for e in tracer.events if e['ph'] == 'i']
+    assert [e['args']['step'] for e in instants] == ['elaborate', 'elaborate', 'simulate']
+    assert instants[0]['name'] == 'progress'
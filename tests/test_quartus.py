@@ -1,4 +1,5 @@
 import os
+import pytest
 from edalize_common import make_edalize_test
 
 qsys_file = """<?xml version="1.0" encoding="UTF-8"?>
@@ -23,8 +24,10 @@ test_sets = {"Standard": {"Quartus": ['ip-generate.cmd', 'quartus_asm.cmd', 'qua
              "Pro"     : {"Quartus": ['qsys-generate.cmd', 'quartus_asm.cmd', 'quartus_fit.cmd', 'quartus_syn.cmd', 'quartus_sh.cmd', 'quartus_sta.cmd'],
                           "DSE"    : ['qsys-generate.cmd', 'quartus_syn.cmd', 'quartus_sh.cmd', 'quartus_dse.cmd']}}
 
-def test_quartus(make_edalize_test):
+@pytest.mark.parametrize("build_runner", ["make", "python"])
+def test_quartus(make_edalize_test, build_runner):
     tool_options = {
+        'build_runner'    : build_runner,
         'family'          : 'Cyclone V',
         'device'          : '5CSXFC6D6F31C8ES',
         'quartus_options' : ['some', 'quartus_options'],
@@ -59,3 +62,26 @@ def test_quartus(make_edalize_test):
 
             tf.backend.build()
             tf.compare_files(test_sets[edition][pnr])
+            if build_runner == 'python':
+                assert [r['name'] for r in tf.backend.step_results] == \
+                    {'Quartus' : ['project', 'qsys0', 'qsys1', 'syn', 'fit', 'asm', 'sta'] if edition == 'Standard' else
+                                 ['project', 'qsys0', 'syn', 'fit', 'asm', 'sta'],
+                     'DSE'     : ['project', 'qsys0', 'qsys1', 'syn', 'dse'] if edition == 'Standard' else
+                                 ['project', 'qsys0', 'syn', 'dse']}[pnr]
+
+
+def test_quartus_edition(monkeypatch, tmpdir):
+    from edalize import get_edatool
+    from edalize_common import tests_dir
+
+    monkeypatch.setenv('PATH', os.path.join(tests_dir, 'mock_commands'), ':')
+    monkeypatch.setenv('FUSESOC_QUARTUS_EDITION', 'Pro')
+    backend = get_edatool('quartus')(edam={'name' : 'test_quartus_edition'},
+                                     work_root=str(tmpdir))
+    assert backend.isPro
+
+    #The edition can still be set, e.g. to generate a project for the other
+    #edition
+    backend.isPro = False
+    assert not backend.isPro
+    assert backend.quartus_version['edition'] == 'Pro'
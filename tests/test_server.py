@@ -0,0 +1,99 @@
+import os.path
+import stat
+import threading
+
+
+def test_server(monkeypatch, tmpdir):
+    import asyncio
+    from edalize.server import Server, submit
+
+    from edalize_common import tests_dir
+
+    monkeypatch.setenv('PATH', os.path.join(tests_dir, 'mock_commands'), ':')
+
+    path = str(tmpdir.join('edalize.sock'))
+    server = Server(path, jobs=2, tool_limits={'icarus' : 1})
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(server.start())
+    thread = threading.Thread(target=loop.run_forever)
+    thread.start()
+    try:
+        jobs = []
+        for i in range(3):
+            jobs.append({'id'        : i,
+                         'tool'      : 'icarus',
+                         'edam'      : {'name' : 'test_server_{}'.format(i),
+                                        'toplevel' : 'top'},
+                         'work_root' : str(tmpdir.join('build_{}'.format(i))),
+                         'phases'    : ['configure', 'build']})
+        jobs.append({'id' : 'bad', 'tool' : 'nosuchtool', 'edam' : {},
+                     'work_root' : str(tmpdir)})
+        #Errors other than RuntimeError in a job must still finish it
+        jobs.append({'id'        : 'broken',
+                     'tool'      : 'icarus',
+                     'edam'      : {'name' : 'test_server_broken',
+                                    'toplevel' : 'top',
+                                    'tool_options' : {'icarus' : {'iverilog_options' : 5}}},
+                     'work_root' : str(tmpdir.join('build_broken')),
+                     'phases'    : ['configure']})
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+        events = list(submit(path, jobs))
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.run_until_complete(server.close())
+        loop.close()
+
+    finished = {e['id'] : e for e in events if e['event'] == 'finished'}
+    assert sorted(finished, key=str) == [0, 1, 2, 'bad', 'broken']
+    for i in range(3):
+        assert finished[i]['status'] == 'passed'
+        assert [m['cmd'][0] for m in finished[i]['metrics']] == ['make']
+        assert os.path.exists(str(tmpdir.join('build_{}'.format(i), 'test_server_{}.scr'.format(i))))
+        assert [e['phase'] for e in events if e['id'] == i and e['event'] == 'phase'] == \
+            ['configure', 'build']
+    assert finished['bad']['status'] == 'failed'
+    assert "Unknown tool 'nosuchtool'" in finished['bad']['error']
+    assert finished['broken']['status'] == 'failed'
+    assert finished['broken']['error'].startswith('TypeError')
+
+    #The icarus limit lets only one icarus job run at a time
+    running = 0
+    for e in events:
+        if e['id'] in range(3):
+            if e['event'] == 'started':
+                running += 1
+                assert running == 1
+            elif e['event'] == 'finished':
+                running -= 1
+
+    assert not os.path.exists(path)
+
+def test_server_socket(tmpdir):
+    import asyncio
+    import pytest
+    import socket
+    from edalize.server import Server
+
+    path = str(tmpdir.join('edalize.sock'))
+
+    #A socket nobody listens on is replaced
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()
+
+    server = Server(path)
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(server.start())
+
+        #The socket of a running server is kept
+        with pytest.raises(RuntimeError):
+            loop.run_until_complete(Server(path).start())
+        assert stat.S_ISSOCK(os.stat(path).st_mode)
+        #Let the server see the probe connection close
+        loop.run_until_complete(asyncio.sleep(0.1))
+    finally:
+        loop.run_until_complete(server.close())
+        loop.close()
+    assert not os.path.exists(path)
@@ -34,3 +34,22 @@ def test_spyglass_tooloptions(make_edalize_test):
                            ref_dir='tooloptions',
                            tool_options=tool_options)
     run_spyglass_test(tf)
+
+
+def test_spyglass_build_graph(make_edalize_test):
+    """ Test running the goals with the python build runner """
+    tool_options = {
+        'methodology': 'GuideWare/latest/block/rtl_somethingelse',
+        'goals': ['lint/lint_rtl', 'some/othergoal'],
+        'spyglass_options': ['handlememory yes'],
+        'rule_parameters': ['handle_static_caselabels yes'],
+        'build_runner': 'python',
+    }
+    tf = make_edalize_test('spyglass',
+                           param_types=['vlogdefine', 'vlogparam'],
+                           ref_dir='tooloptions',
+                           tool_options=tool_options)
+    tf.backend.build_jobs = 1
+    run_spyglass_test(tf)
+    assert [r['name'] for r in tf.backend.step_results] == \
+        ['run-goal-design_read', 'run-goal-lint_lint_rtl', 'run-goal-some_othergoal']
@@ -0,0 +1,24 @@
+import pytest
+
+
+def test_run_tool_output_tail(tmpdir):
+    import os.path
+    import sys
+    from edalize import get_edatool
+
+    work_root = str(tmpdir)
+    backend = get_edatool('icarus')(edam={'name' : 'test_run_tool_output_tail'},
+                                    work_root=work_root)
+    backend.verbose = False
+    backend.log_tail_lines = 10
+    backend.log_file = 'tool.log'
+
+    script = "import sys\nfor i in range(1000): print('line', i)\nsys.exit(3)"
+    with pytest.raises(RuntimeError) as excinfo:
+        backend._run_tool(sys.executable, ['-c', script], quiet=True)
+    assert 'exited with an error: 3' in str(excinfo.value)
+    assert 'line 999' in str(excinfo.value)
+    assert 'line 989\n' not in str(excinfo.value)
+
+    with open(os.path.join(work_root, 'tool.log')) as f:
+        assert len(f.readlines()) == 1000
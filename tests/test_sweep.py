@@ -0,0 +1,90 @@
+import os.path
+
+import pytest
+
+
+def test_sweep(monkeypatch, tmpdir):
+    from edalize.sweep import run_sweep
+
+    from edalize_common import tests_dir
+
+    monkeypatch.setenv('PATH', os.path.join(tests_dir, 'mock_commands'), ':')
+
+    edam = {'name' : 'test_sweep_0',
+            'toplevel' : 'top',
+            'parameters' : {
+                'width' : {'datatype' : 'int', 'paramtype' : 'vlogparam'},
+                'seed'  : {'datatype' : 'int', 'paramtype' : 'plusarg'}}}
+    work_root = str(tmpdir)
+
+    results = run_sweep('icarus', edam, work_root,
+                        {'width' : [8, 16], 'seed' : [1, 2]},
+                        jobs=2)
+
+    assert [r['variant'] for r in results] == [0, 1, 2, 3]
+    assert all(r['status'] == 'passed' for r in results)
+
+    #Variants that only differ in plusargs share a build and run in
+    #separate directories below it
+    assert [os.path.relpath(r['work_root'], work_root) for r in results] == \
+        [os.path.join('build_0', 'runs', 'run_0'),
+         os.path.join('build_0', 'runs', 'run_1'),
+         os.path.join('build_1', 'runs', 'run_0'),
+         os.path.join('build_1', 'runs', 'run_1')]
+
+    for n, width in enumerate([8, 16]):
+        build_dir = os.path.join(work_root, 'build_{}'.format(n))
+        with open(os.path.join(build_dir, 'test_sweep_0.scr')) as f:
+            assert '+parameter+top.width={}\n'.format(width) in f.read()
+        for i, seed in enumerate([1, 2]):
+            run_dir = os.path.join(build_dir, 'runs', 'run_{}'.format(i))
+            with open(os.path.join(run_dir, 'vvp.cmd')) as f:
+                assert '+seed={}'.format(seed) in f.read()
+
+    assert os.path.exists(os.path.join(work_root, 'sweep.json'))
+
+
+def test_sweep_unknown_parameter(tmpdir):
+    from edalize.sweep import run_sweep
+
+    with pytest.raises(RuntimeError):
+        run_sweep('icarus', {'name' : 'test_sweep_1'}, str(tmpdir),
+                  {'width' : [8, 16]})
+
+
+def test_sweep_errors(monkeypatch, tmpdir, capfd):
+    import json
+    import sys
+    from edalize.sweep import _run_group, run_sweep
+
+    from edalize_common import tests_dir
+
+    monkeypatch.setenv('PATH', os.path.join(tests_dir, 'mock_commands'), ':')
+
+    #Errors other than RuntimeError fail the variants instead of the sweep
+    edam = {'name' : 'test_sweep_2',
+            'toplevel' : 'top',
+            'tool_options' : {'icarus' : {'iverilog_options' : 5}},
+            'parameters' : {
+                'width' : {'datatype' : 'int', 'paramtype' : 'vlogparam'}}}
+    work_root = str(tmpdir)
+
+    results = run_sweep('icarus', edam, work_root, {'width' : [8, 16]}, jobs=2)
+    assert [r['status'] for r in results] == ['failed', 'failed']
+    assert all(r['phase'] == 'build' for r in results)
+    assert all(r['error'].startswith('TypeError') for r in results)
+    with open(os.path.join(work_root, 'sweep.json')) as f:
+        assert len(json.load(f)) == 2
+
+    #Tool output goes to the log, and the streams of the process are left alone
+    del edam['tool_options']
+    stdout = sys.stdout
+    build_dir = str(tmpdir.join('build'))
+    capfd.readouterr()
+    results = _run_group('icarus', edam, build_dir, [('width', 8)],
+                         [(0, {'width' : 8})], False)
+    assert results[0]['status'] == 'passed'
+    assert sys.stdout is stdout
+    assert not 'iverilog' in capfd.readouterr().out
+    with open(os.path.join(build_dir, 'build.log')) as f:
+        assert 'iverilog' in f.read()
@@ -33,6 +33,7 @@ def test_symbiflow(pnr_tool):
     edam = {
         "files": files,
         "name": name,
+        "toplevel": "top",
         "tool_options": {"symbiflow": tool_options},
     }
 
@@ -49,3 +50,37 @@ def test_symbiflow(pnr_tool):
         config_file_list.append(name + "-nextpnr.mk")
 
     compare_files(ref_dir, work_root, config_file_list)
+
+
+def test_symbiflow_build_graph(tmpdir):
+    from edalize import get_edatool
+
+    tool_options = {
+        "part": "xc7a35t",
+        "package": "csg324-1",
+        "vendor": "xilinx",
+        "pnr": "vtr",
+        "vpr_options": "--fake_option 1000",
+        "environment_script": "env.sh",
+    }
+    edam = {
+        "files": [{"name": "top.v", "file_type": "verilogSource"},
+                  {"name": "top.xdc", "file_type": "xdc"}],
+        "name": "test_symbiflow_build_graph",
+        "toplevel": "top",
+        "tool_options": {"symbiflow": tool_options},
+    }
+    backend = get_edatool("symbiflow")(edam=edam, work_root=str(tmpdir))
+    graph = backend.build_graph()
+
+    #The same commands and chain of files as in the Makefile
+    assert graph.select() == ["synth", "pack", "place", "route", "fasm", "bitstream"]
+    assert graph.steps["synth"].cmd == [
+        "bash", "-c", 'source env.sh && exec "$@"', "bash",
+        "symbiflow_synth", "-t", "top", "-v", "top.v", "-d", "artix7",
+        "-p", "xc7a35tcsg324-1", "-x", "top.xdc"]
+    assert graph.steps["place"].cmd[4:] == [
+        "symbiflow_place", "-e", "top.eblif", "-d", "xc7a50t_test", "-n", "top.net",
+        "-P", "xc7a35tcsg324-1",
+        "--additional_vpr_options", "--fake_option 1000"]
+    assert graph.steps["bitstream"].outputs == ["top.bit"]
@@ -0,0 +1,80 @@
+import pytest
+
+
+def test_tool_timeout(tmpdir):
+    import asyncio
+    import os.path
+    import time
+    from edalize import get_edatool
+    from edalize.process import ToolTimeout
+
+    work_root = str(tmpdir)
+    #The background sleep keeps the output pipes open unless the whole
+    #process group is killed
+    hooks = {'pre_build' : [
+        {'cmd' : ['sh', '-c', 'echo started; sleep 30 & sleep 30'],
+         'name' : 'hang'}]}
+    edam = {'name' : 'test_tool_timeout',
+            'hooks' : hooks,
+            'tool_options' : {'icarus' : {'tool_timeouts' : {'sh' : 0.5}}}}
+
+    backend = get_edatool('icarus')(edam=edam, work_root=work_root, verbose=False)
+    backend.log_file = 'build.log'
+    start = time.monotonic()
+    with pytest.raises(ToolTimeout) as excinfo:
+        backend.build_pre()
+    assert time.monotonic() - start < 10
+    assert excinfo.value.timeout == 0.5
+    assert 'timed out after 0.5 seconds' in str(excinfo.value)
+    assert 'started' in str(excinfo.value)
+
+    #The output until the timeout is kept in the log
+    with open(os.path.join(work_root, 'build.log')) as f:
+        assert f.read() == 'started\n'
+
+    #Phase timeouts limit all invocations of a phase together
+    backend = get_edatool('icarus')(edam={'name' : 'test_tool_timeout',
+                                          'hooks' : hooks},
+                                    work_root=work_root, verbose=False)
+    backend.phase_timeouts['build'] = 0.5
+    start = time.monotonic()
+    loop = asyncio.new_event_loop()
+    try:
+        with pytest.raises(ToolTimeout):
+            loop.run_until_complete(backend.build_async())
+    finally:
+        loop.close()
+    assert time.monotonic() - start < 10
+    assert backend._phase_deadline is None
+
+def test_tool_timeout_terminate(monkeypatch, tmpdir):
+    import os
+    import subprocess
+    import sys
+    import time
+    from edalize import process
+    from edalize.process import run_streaming, OutputCollector
+
+    #Commands get their own process group in the session of the caller
+    collector = OutputCollector()
+    run_streaming([sys.executable, '-c', 'import os; print(os.getsid(0), os.getpgid(0))'],
+                  collector, echo=False)
+    (sid, pgid) = collector.tail('stdout').split()
+    assert int(sid) == os.getsid(0)
+    assert int(pgid) != os.getpgid(0)
+
+    #Timed out commands get SIGTERM first
+    monkeypatch.setattr(process, 'TERMINATE_GRACE', 0.5)
+    cmd = ['sh', '-c', 'trap "echo terminated; exit 1" TERM; sleep 30 & wait']
+    collector = OutputCollector()
+    with pytest.raises(subprocess.TimeoutExpired) as excinfo:
+        run_streaming(cmd, collector, echo=False, timeout=0.5)
+    assert excinfo.value.output == b'terminated\n'
+
+    #and SIGKILL if they are still running after the grace period
+    cmd = ['sh', '-c', 'trap "" TERM; echo started; sleep 30']
+    collector = OutputCollector()
+    start = time.monotonic()
+    with pytest.raises(subprocess.TimeoutExpired):
+        run_streaming(cmd, collector, echo=False, timeout=0.5)
+    assert time.monotonic() - start < 10
@@ -0,0 +1,46 @@
+import os
+from edalize_common import make_edalize_test
+
+
+def test_icestorm_trace(make_edalize_test):
+    import json
+    from edalize import trace
+
+    tool_options = {
+        'yosys_synth_options': ['some', 'yosys_synth_options'],
+        'arachne_pnr_options': ['a', 'few', 'arachne_pnr_options']
+    }
+    tf = make_edalize_test('icestorm',
+                           param_types=['vlogdefine', 'vlogparam'],
+                           tool_options=tool_options)
+
+    tracer = trace.enable()
+    try:
+        tf.backend.configure()
+        with open(os.path.join(tf.work_root, 'pcf_file.pcf'), 'a'):
+            pass
+        tf.backend.build()
+    finally:
+        trace.disable()
+
+    trace_file = os.path.join(tf.work_root, 'trace.json')
+    tracer.save(trace_file)
+    with open(trace_file) as f:
+        events = json.load(f)['traceEvents']
+    spans = {e['name'] : e for e in events if e['ph'] == 'X'}
+
+    for phase in ['configure_pre', 'configure_main', 'configure_post',
+                  'build_pre', 'build_main', 'build_post']:
+        assert 'icestorm ' + phase in spans
+
+    #The sub-tool is configured inside the configure_main phase
+    parent = spans['icestorm configure_main']
+    child = spans['yosys configure_main']
+    assert child['tid'] == parent['tid']
+    assert parent['ts'] <= child['ts']
+    assert child['ts'] + child['dur'] <= parent['ts'] + parent['dur']
+
+    make = spans['icestorm make']
+    assert make['args']['cmd'][0] == 'make'
+    assert make['args']['returncode'] == 0
+    assert spans['icestorm build_main']['ts'] <= make['ts']
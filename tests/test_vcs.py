@@ -58,3 +58,16 @@ def test_vcs_minimal(tmpdir):
 
     compare_files(ref_dir, work_root, ['run.cmd'])
 
+
+def test_vcs_build_graph(make_edalize_test):
+    tool_options = {
+        'vcs_options'  : [ '-debug_access+pp', '-debug_access+all' ],
+        'run_options'  : [ '-licqueue' ],
+        'build_runner' : 'python',
+    }
+    tf = make_edalize_test('vcs',
+                           test_name='test_vcs_tool_options_0',
+                           ref_dir='tool_options',
+                           tool_options=tool_options)
+    run_vcs_test(tf)
+    assert [r['name'] for r in tf.backend.step_results] == ['compile']
@@ -0,0 +1,49 @@
+def test_version_probe(monkeypatch, tmpdir):
+    import os
+    import threading
+    from edalize.version_probe import VersionProbe
+
+    bin_dir = str(tmpdir.mkdir('bin'))
+    tool = os.path.join(bin_dir, 'tool')
+    count = str(tmpdir.join('count'))
+    with open(tool, 'w') as f:
+        f.write('#!/bin/sh\necho x >> {}\nsleep 0.2\necho "Tool v1.0"\n'.format(count))
+    os.chmod(tool, 0o755)
+    monkeypatch.setenv('PATH', bin_dir, prepend=os.pathsep)
+
+    def _runs():
+        with open(count) as f:
+            return len(f.readlines())
+
+    cache_dir = str(tmpdir.mkdir('cache'))
+    probe = VersionProbe(cache_dir)
+    outputs = []
+    threads = [threading.Thread(target=lambda: outputs.append(probe.output(['tool', '--version'])))
+               for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    #Concurrent probes share one run of the tool
+    assert outputs == ['Tool v1.0\n'] * 4
+    assert _runs() == 1
+
+    #A new process finds the output in the disk cache
+    assert VersionProbe(cache_dir).output(['tool', '--version']) == 'Tool v1.0\n'
+    assert _runs() == 1
+
+    #The tool is probed again when the executable changes
+    with open(tool, 'a') as f:
+        f.write('echo "Tool v1.1"\n')
+    assert VersionProbe(cache_dir).output(['tool', '--version']) == 'Tool v1.0\nTool v1.1\n'
+    assert _runs() == 2
+
+    #and when the environment changes, but not for shell bookkeeping
+    monkeypatch.setenv('TOOL_EDITION', 'pro')
+    assert probe.output(['tool', '--version']) == 'Tool v1.0\nTool v1.1\n'
+    assert _runs() == 3
+    monkeypatch.setenv('SHLVL', '42')
+    assert probe.output(['tool', '--version']) == 'Tool v1.0\nTool v1.1\n'
+    assert _runs() == 3
+
+    assert probe.output(['nosuchtool', '--version']) is None
@@ -67,3 +67,26 @@ def test_vivado_minimal(params, tmpdir):
 
     backend.build()
     compare_files(ref_dir, work_root, build_file_list)
+
+
+@pytest.mark.parametrize("synth_tool", ["vivado", "yosys"])
+def test_vivado_build_graph(synth_tool, tmpdir):
+    from edalize import get_edatool
+
+    edam = {'name' : 'test_vivado_build_graph',
+            'files' : [{'name' : 'top.v', 'file_type' : 'verilogSource'}],
+            'tool_options' : {'vivado' : {'part' : 'xc7a35tcsg324-1',
+                                          'synth' : synth_tool}}}
+    backend = get_edatool('vivado')(edam=edam, work_root=str(tmpdir))
+    graph = backend.build_graph()
+
+    #The steps depend on the same files as the targets of the Makefile
+    name = 'test_vivado_build_graph'
+    assert graph.steps['project'].inputs == [name + '.tcl']
+    if synth_tool == 'yosys':
+        assert graph.steps['bitstream'].inputs == [name + '_run.tcl', name + '.xpr', name + '.edif']
+    else:
+        assert graph.steps['synth'].inputs == [name + '_synth.tcl', name + '.xpr']
+        assert graph.steps['bitstream'].inputs == [name + '_run.tcl', name + '.xpr']
+    assert graph.select() == (['synth', 'project', 'bitstream'] if synth_tool == 'yosys'
+                              else ['project', 'bitstream'])
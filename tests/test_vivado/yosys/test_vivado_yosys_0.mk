@@ -1,16 +1,19 @@
 #Auto generated by Edalize
 
-TARGET   := test_vivado_yosys_0
+all: test_vivado_yosys_0.blif
+
+test_vivado_yosys_0.blif: yosys.tcl
+	$(EDALIZE_LAUNCHER) yosys -l yosys.log -p 'tcl yosys.tcl'
+test_vivado_yosys_0.json test_vivado_yosys_0.edif: test_vivado_yosys_0.blif
+synth: test_vivado_yosys_0.blif
 
-all: $(TARGET).edif
+yosys.tcl:
 
+.PHONY: all synth
 
-%.blif: yosys.tcl
-	$(EDALIZE_LAUNCHER) yosys -l yosys.log -p "tcl $?"
-%.json: yosys.tcl
-	$(EDALIZE_LAUNCHER) yosys -l yosys.log -p "tcl $?"
-%.edif: yosys.tcl
-	$(EDALIZE_LAUNCHER) yosys -l yosys.log -p "tcl $?"
+TARGET   := test_vivado_yosys_0
 
 clean:
 	rm -f $(TARGET).blif $(TARGET).json $(TARGET).edif
+
+.PHONY: clean
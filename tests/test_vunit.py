@@ -53,7 +53,7 @@ def test_vunit_hooks(tmpdir):
         else:
             return original_impl(args, **kwargs)
 
-    with mock.patch('edalize.edatool.run', new=subprocess_intercept):
+    with mock.patch('edalize.process.run_streaming', new=subprocess_intercept):
         backend.configure()
 
         with mock.patch('edalize.vunit_hooks.VUnitRunner') as hooks_constructor:
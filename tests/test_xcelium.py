@@ -2,7 +2,7 @@ import os
 from edalize_common import make_edalize_test, tests_dir
 
 
-def test_xcelium(make_edalize_test):
+def test_xcelium(make_edalize_test, monkeypatch):
     tool_options = {
         'xmvhdl_options' : ['various', 'xmvhdl_options'],
         'xmvlog_options' : ['some', 'xmvlog_options'],
@@ -18,20 +18,34 @@ def test_xcelium(make_edalize_test):
                       'edalize_build_rtl.f',
                       'edalize_main.f'])
 
-    orig_env = os.environ.copy()
-    try:
-        os.environ['PATH'] = '{}:{}'.format(os.path.join(tests_dir, 'mock_commands/xcelium'),
-                                            os.environ['PATH'])
+    monkeypatch.setenv('PATH', os.path.join(tests_dir, 'mock_commands/xcelium'), ':')
 
-        # For some strange reason, writing to os.environ['PATH'] doesn't update the environment. This
-        # leads to test fails, but only when running multiple tests. When running this test by itself,
-        # everything works fine without the 'putenv'.
-        os.putenv('PATH', os.environ['PATH'])
+    tf.backend.build()
+    os.makedirs(os.path.join(tf.work_root, 'work'))
 
-        tf.backend.build()
-        os.makedirs(os.path.join(tf.work_root, 'work'))
+    tf.backend.run()
+    tf.compare_files(['xrun.cmd'])
 
-        tf.backend.run()
-        tf.compare_files(['xrun.cmd'])
-    finally:
-        os.environ = orig_env
+def test_xcelium_run_many(make_edalize_test, monkeypatch):
+    xcelium_dir = os.path.join(tests_dir, 'mock_commands', 'xcelium')
+    monkeypatch.setenv('PATH', xcelium_dir, ':')
+    monkeypatch.setenv('PATH', os.path.join(xcelium_dir, 'tools', 'bin'), ':')
+    tf = make_edalize_test('xcelium',
+                           tool_options={'xmsim_options' : ['a', 'few', 'xmsim_options']},
+                           param_types=['plusarg'])
+    tf.backend.configure()
+    tf.backend.build()
+    os.makedirs(os.path.join(tf.work_root, 'xcelium.d'))
+
+    results = tf.backend.run_many([{'plusarg_int' : 3}, {}], jobs=2)
+    assert [r['status'] for r in results] == ['passed', 'passed']
+
+    #The snapshot is elaborated once, before the runs
+    with open(os.path.join(tf.work_root, 'xrun.cmd')) as f:
+        assert f.read().rstrip().endswith('-top top_module -elaborate')
+    for r, value in zip(results, ['3', '42']):
+        assert os.path.samefile(os.path.join(r['run_dir'], 'xcelium.d'),
+                                os.path.join(tf.work_root, 'xcelium.d'))
+        with open(os.path.join(r['run_dir'], 'xrun.cmd')) as f:
+            assert f.read() == "-R -q -xmsimargs 'a few xmsim_options' " \
+                "+plusarg_bool=1 +plusarg_int={} +plusarg_str=hello\n".format(value)
@@ -50,3 +50,24 @@ def test_xsim_mfc(make_edalize_test):
     tf.compare_files(['xsim.cmd'])
 
     
+
+def test_xsim_run_many(make_edalize_test):
+    tool_options = {'xsim_options' : ['a', 'few', 'xsim_options']}
+
+    tf = make_edalize_test('xsim',
+                           tool_options=tool_options,
+                           param_types=['plusarg'])
+    tf.backend.configure()
+    tf.backend.build()
+    os.makedirs(os.path.join(tf.work_root, 'xsim.dir', tf.test_name))
+
+    results = tf.backend.run_many([{'plusarg_int' : 3}, {}], jobs=2)
+    assert [r['status'] for r in results] == ['passed', 'passed']
+    for r, value in zip(results, ['3', '42']):
+        #Each run finds the snapshot in its own directory
+        assert os.path.samefile(os.path.join(r['run_dir'], 'xsim.dir'),
+                                os.path.join(tf.work_root, 'xsim.dir'))
+        with open(os.path.join(r['run_dir'], 'xsim.cmd')) as f:
+            args = f.read().split()
+        assert args[:5] == ['-R', 'a', 'few', 'xsim_options', tf.test_name]
+        assert 'plusarg_int=' + value in args